@@ -0,0 +1,124 @@
+# HTTP responses for stored artifacts: ETags, compression negotiation and byte ranges
+
+import re
+from typing import List, Mapping, Optional, Tuple
+from fastapi import HTTPException
+from fastapi.responses import Response
+from app.artifacts.store import Artifact, ArtifactStore
+
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)$")
+
+# Generated pages run their own scripts; keep them off the API's origin
+HTML_SANDBOX = "sandbox allow-scripts allow-forms allow-popups"
+
+
+def etag(artifact: Artifact, encoding: Optional[str] = None) -> str:
+    # Each encoding is a different representation, so it gets its own strong ETag
+    return f'"{artifact.id}-{encoding}"' if encoding else f'"{artifact.id}"'
+
+
+def etag_matches(header: Optional[str], tag: str) -> bool:
+    """If-None-Match comparison, which is weak: W/ prefixes are ignored"""
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or tag in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+def negotiate_encoding(accept_encoding: Optional[str], available: List[str]) -> Optional[str]:
+    """The first of `available` the client accepts with a non-zero q-value"""
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        match = re.search(r"q=([0-9.]+)", params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    for encoding in available:
+        if accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """(start, end) inclusive for a single "bytes=" range
+
+    Returns None for headers to ignore (several ranges, other units), which
+    then get the whole body. Raises HTTPException 416 when the range lies
+    outside the body.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match or match.group(1) == match.group(2) == "":
+        return None
+    first, last = match.groups()
+    if first == "":
+        # Suffix range: the final `last` bytes
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    if start >= size or size == 0:
+        raise HTTPException(
+            status_code=416,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+def artifact_response(
+    store: ArtifactStore, artifact_id: str, headers: Mapping[str, str]
+) -> Response:
+    """An artifact honouring the request's If-None-Match, Accept-Encoding and Range
+
+    Raises HTTPException 404 for unknown ids.
+    """
+    artifact = store.get(artifact_id)
+    if artifact is None:
+        raise HTTPException(status_code=404, detail="Unknown artifact")
+
+    range_header = headers.get("range")
+    if range_header and headers.get("if-range") not in (None, etag(artifact)):
+        # The client's partial copy is of something else; send it all
+        range_header = None
+    # Ranges are served from the stored bytes, never from a compressed copy
+    encoding = None
+    if not range_header and artifact.compressible:
+        encoding = negotiate_encoding(headers.get("accept-encoding"), list(store.encodings))
+
+    response_headers = {
+        "ETag": etag(artifact, encoding),
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+        "X-Content-Type-Options": "nosniff",
+    }
+    if artifact.content_type.startswith("text/html"):
+        response_headers["Content-Security-Policy"] = HTML_SANDBOX
+    if etag_matches(headers.get("if-none-match"), response_headers["ETag"]):
+        return Response(status_code=304, headers=response_headers)
+
+    body = store.read(artifact, encoding)
+    if body is None:
+        raise HTTPException(status_code=404, detail="Artifact content missing")
+    if encoding:
+        response_headers["Content-Encoding"] = encoding
+
+    byte_range = parse_range(range_header, len(body)) if range_header else None
+    if byte_range is None:
+        return Response(body, media_type=artifact.content_type, headers=response_headers)
+    start, end = byte_range
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+    return Response(
+        body[start:end + 1],
+        status_code=206,
+        media_type=artifact.content_type,
+        headers=response_headers,
+    )
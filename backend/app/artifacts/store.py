@@ -0,0 +1,274 @@
+# content-addressed store for generated documents, stage outputs and screenshots
+
+import gzip
+import hashlib
+import importlib.util
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_ID_RE = re.compile(r"[0-9a-f]{64}")
+
+# Already compressed formats are served as stored
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+MIN_COMPRESS_BYTES = 1024
+# Writes re-check the age limit at most this often, in seconds
+PRUNE_INTERVAL = 3600
+
+
+class Artifact:
+    def __init__(self, id: str, content_type: str, size: int, kind: str, created_at: float):
+        self.id = id
+        self.content_type = content_type
+        self.size = size
+        self.kind = kind
+        self.created_at = created_at
+
+    @property
+    def compressible(self) -> bool:
+        return self.size >= MIN_COMPRESS_BYTES and self.content_type.startswith(
+            COMPRESSIBLE_TYPES
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "content_type": self.content_type,
+            "size": self.size,
+            "kind": self.kind,
+            "created_at": self.created_at,
+        }
+
+
+class ArtifactBackend:
+    """Where artifact bytes live; keys are artifact ids plus a suffix"""
+
+    name = ""
+
+    def read(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def write(self, key: str, data: bytes):
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def entries(self) -> Iterator[Tuple[str, int, float]]:
+        """(key, size, modified time) of everything stored"""
+        raise NotImplementedError
+
+
+class LocalDiskBackend(ArtifactBackend):
+    """Files under `root`, sharded by the first two characters of the key"""
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written under a temporary name and renamed, so readers never see half a file
+        fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(temporary, path)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    def delete(self, key: str):
+        try:
+            os.unlink(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def entries(self) -> Iterator[Tuple[str, int, float]]:
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                # Skip writes still in progress
+                if entry.name.startswith(".tmp-"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                yield entry.name, stat.st_size, stat.st_mtime
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+
+BACKENDS = {"local": LocalDiskBackend}
+
+
+class ContentEncoding:
+    """A Content-Encoding the store can produce; `module` must be importable to use it"""
+
+    name = ""
+    module = ""
+
+    def available(self) -> bool:
+        return not self.module or importlib.util.find_spec(self.module) is not None
+
+    def compress(self, data: bytes) -> bytes:
+        raise NotImplementedError
+
+
+class BrotliEncoding(ContentEncoding):
+    name = "br"
+    module = "brotli"
+
+    def compress(self, data: bytes) -> bytes:
+        import brotli
+
+        return brotli.compress(data, quality=9)
+
+
+class GzipEncoding(ContentEncoding):
+    name = "gzip"
+
+    def compress(self, data: bytes) -> bytes:
+        # mtime=0 keeps the output, and so its ETag, the same every time
+        return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+# In order of preference when a client accepts several
+ENCODINGS = [encoding for encoding in (BrotliEncoding(), GzipEncoding()) if encoding.available()]
+
+
+class ArtifactStore:
+    """Stores bytes under their SHA-256, so identical outputs are kept once
+
+    Each artifact has a small JSON record of its content type and kind next
+    to it. Compressed copies for Content-Encoding are made on first request
+    and kept alongside the original. Artifacts older than `max_age` seconds
+    are pruned, then the oldest ones until everything stored fits in
+    `max_bytes`; 0 disables either limit. Pruning runs from prune(), and on
+    write once the store passes `max_bytes` or PRUNE_INTERVAL has elapsed.
+    """
+
+    def __init__(self, backend: ArtifactBackend, max_bytes: int = 0, max_age: float = 0):
+        self.backend = backend
+        self.encodings = {encoding.name: encoding for encoding in ENCODINGS}
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        # Bytes stored as of the last prune plus those written since
+        self._stored_bytes: Optional[int] = None
+        self._pruned_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes, content_type: str, kind: str = "") -> Artifact:
+        artifact_id = hashlib.sha256(data).hexdigest()
+        existing = self.get(artifact_id)
+        if existing is not None:
+            return existing
+        artifact = Artifact(artifact_id, content_type, len(data), kind, time.time())
+        record = json.dumps(artifact.to_dict()).encode()
+        self.backend.write(artifact_id, data)
+        # The record goes last: an artifact with a record always has its bytes
+        self.backend.write(f"{artifact_id}.json", record)
+        self._written(len(data) + len(record))
+        return artifact
+
+    def get(self, artifact_id: str) -> Optional[Artifact]:
+        if not ARTIFACT_ID_RE.fullmatch(artifact_id):
+            return None
+        record = self.backend.read(f"{artifact_id}.json")
+        return Artifact(**json.loads(record)) if record is not None else None
+
+    def read(self, artifact: Artifact, encoding: Optional[str] = None) -> Optional[bytes]:
+        """The artifact's bytes, or its compressed copy for `encoding`"""
+        if encoding is None:
+            return self.backend.read(artifact.id)
+        key = f"{artifact.id}.{encoding}"
+        encoded = self.backend.read(key)
+        if encoded is None:
+            data = self.backend.read(artifact.id)
+            if data is None:
+                return None
+            encoded = self.encodings[encoding].compress(data)
+            self.backend.write(key, encoded)
+            self._written(len(encoded))
+        return encoded
+
+    def prune(self) -> int:
+        """Delete artifacts past the age and size limits; returns how many went"""
+        with self._lock:
+            # Group the bytes, record and compressed copies of each artifact
+            artifacts: Dict[str, Tuple[List[str], int, float]] = {}
+            for key, size, modified in self.backend.entries():
+                artifact_id = key[:64]
+                if not ARTIFACT_ID_RE.fullmatch(artifact_id):
+                    continue
+                keys, total, created = artifacts.get(artifact_id, ([], 0, modified))
+                artifacts[artifact_id] = ([*keys, key], total + size, min(created, modified))
+
+            stored = sum(total for _, total, _ in artifacts.values())
+            cutoff = time.time() - self.max_age if self.max_age else None
+            pruned = 0
+            for artifact_id, (keys, total, created) in sorted(
+                artifacts.items(), key=lambda item: item[1][2]
+            ):
+                expired = cutoff is not None and created < cutoff
+                if not expired and not (self.max_bytes and stored > self.max_bytes):
+                    break
+                # The record goes first, so a half-deleted artifact is simply unknown
+                for key in sorted(keys, key=lambda key: not key.endswith(".json")):
+                    self.backend.delete(key)
+                stored -= total
+                pruned += 1
+            self._stored_bytes = stored
+            self._pruned_at = time.monotonic()
+
+        if pruned:
+            logger.info(f"Pruned {pruned} artifacts, {stored} bytes stored")
+        return pruned
+
+    def _written(self, size: int):
+        if not self.max_bytes and not self.max_age:
+            return
+        with self._lock:
+            if self._stored_bytes is not None:
+                self._stored_bytes += size
+            due = (
+                self._pruned_at is None
+                or bool(self.max_bytes and self._stored_bytes > self.max_bytes)
+                or (self.max_age and time.monotonic() - self._pruned_at > PRUNE_INTERVAL)
+            )
+        if due:
+            self.prune()
+
+
+def create_store(
+    backend: str, path: str, max_bytes: int = 0, max_age: float = 0
+) -> ArtifactStore:
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown artifact backend {backend!r}, expected one of {list(BACKENDS)}")
+    return ArtifactStore(BACKENDS[backend](path), max_bytes, max_age)
@@ -0,0 +1,171 @@
+# pool of pre-warmed headless Chrome drivers shared by every scrape
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional, Tuple
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from app.metrics.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class PooledDriver:
+    """A Chrome driver plus the bookkeeping needed to recycle it"""
+
+    def __init__(self, driver: webdriver.Chrome):
+        self.driver = driver
+        self.pages = 0
+
+
+class BrowserPool:
+    def __init__(
+        self,
+        options_factory: Callable[[], Options],
+        size: int = 2,
+        max_pages: int = 50,
+        lease_timeout: float = 60,
+        window_size: Tuple[int, int] = (1920, 1080),
+    ):
+        self.options_factory = options_factory
+        self.size = size
+        self.max_pages = max_pages
+        self.lease_timeout = lease_timeout
+        self.window_size = window_size
+
+        self._idle: "queue.LifoQueue[PooledDriver]" = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._total = 0
+        self._closed = False
+
+    def start(self):
+        """Pre-warm drivers up to the configured pool size"""
+        self._closed = False
+        while self._reserve_slot():
+            try:
+                self._idle.put(self._launch())
+            except Exception as e:
+                self._release_slot()
+                logger.error(f"Browser pre-warm failed: {e}")
+                break
+        logger.info(f"Browser pool ready with {self._idle.qsize()} warm drivers")
+
+    def drain(self):
+        """Quit every idle driver; leased drivers are quit when returned"""
+        self._closed = True
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(pooled)
+        logger.info("Browser pool drained")
+
+    def acquire(self) -> PooledDriver:
+        """Block until a driver is free; pair every call with release()"""
+        if self._closed:
+            raise RuntimeError("Browser pool is closed")
+
+        deadline = time.monotonic() + self.lease_timeout
+        while True:
+            try:
+                return self._idle.get_nowait()
+            except queue.Empty:
+                pass
+
+            if self._reserve_slot():
+                try:
+                    return self._launch()
+                except Exception:
+                    self._release_slot()
+                    raise
+
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("Timed out waiting for a browser from the pool")
+            # Poll so that a slot freed by a recycled driver is noticed too
+            try:
+                return self._idle.get(timeout=min(remaining, 0.5))
+            except queue.Empty:
+                continue
+
+    def try_acquire(self) -> Optional[PooledDriver]:
+        """A free or newly launched driver, or None at once when the pool is at capacity"""
+        if self._closed:
+            return None
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        if self._reserve_slot():
+            try:
+                return self._launch()
+            except Exception:
+                self._release_slot()
+                raise
+        return None
+
+    def release(self, pooled: PooledDriver, healthy: bool = True):
+        """Give a driver back, resetting it or recycling it when worn out or broken"""
+        pooled.pages += 1
+        if healthy and not self._closed and pooled.pages < self.max_pages:
+            try:
+                self._reset(pooled.driver)
+                self._idle.put(pooled)
+                return
+            except Exception as e:
+                logger.warning(f"Browser reset failed, recycling driver: {e}")
+        self._discard(pooled)
+
+    def _launch(self) -> PooledDriver:
+        with span("browser_launch"):
+            driver = webdriver.Chrome(options=self.options_factory())
+            driver.set_window_size(*self.window_size)
+        return PooledDriver(driver)
+
+    def _reserve_slot(self) -> bool:
+        with self._lock:
+            if self._closed or self._total >= self.size:
+                return False
+            self._total += 1
+            return True
+
+    def _release_slot(self):
+        with self._lock:
+            self._total -= 1
+
+    def _discard(self, pooled: PooledDriver):
+        self._release_slot()
+        try:
+            pooled.driver.quit()
+        except Exception as e:
+            logger.warning(f"Browser quit failed: {e}")
+
+    def _reset(self, driver: webdriver.Chrome):
+        """Clear cookies, storage and extra windows so the next lease starts clean"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+
+        try:
+            driver.execute_script(
+                "window.localStorage.clear(); window.sessionStorage.clear();"
+            )
+        except WebDriverException:
+            # Opaque origins (about:blank, data:) have no storage to clear
+            pass
+
+        origin = driver.execute_script("return window.location.origin")
+        if origin and origin != "null":
+            driver.execute_cdp_cmd(
+                "Storage.clearDataForOrigin",
+                {"origin": origin, "storageTypes": "all"},
+            )
+        driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        driver.get("about:blank")
+        driver.set_window_size(*self.window_size)
@@ -0,0 +1,154 @@
+# page readiness detection that replaces fixed sleeps after navigation
+
+import logging
+import time
+from typing import Dict, Optional
+from selenium import webdriver
+from selenium.common.exceptions import JavascriptException
+
+logger = logging.getLogger(__name__)
+
+# Installed before any page script runs so in-flight fetch/XHR calls are counted
+TRACKER_SCRIPT = """
+(function () {
+    if (window.__nuvioReadiness) return;
+    const state = { pending: 0, lastNetwork: performance.now(), lastMutation: performance.now() };
+    window.__nuvioReadiness = state;
+    const touch = () => { state.lastNetwork = performance.now(); };
+
+    const originalFetch = window.fetch;
+    if (originalFetch) {
+        window.fetch = function () {
+            state.pending++;
+            touch();
+            return originalFetch.apply(this, arguments).finally(() => { state.pending--; touch(); });
+        };
+    }
+    const originalSend = XMLHttpRequest.prototype.send;
+    XMLHttpRequest.prototype.send = function () {
+        state.pending++;
+        touch();
+        this.addEventListener('loadend', () => { state.pending--; touch(); }, { once: true });
+        return originalSend.apply(this, arguments);
+    };
+
+    const observe = () => new MutationObserver(() => { state.lastMutation = performance.now(); })
+        .observe(document.documentElement, { childList: true, subtree: true, attributes: true, characterData: true });
+    if (document.documentElement) observe();
+    else document.addEventListener('DOMContentLoaded', observe);
+})();
+"""
+
+PROBE_SCRIPT = TRACKER_SCRIPT + """
+const state = window.__nuvioReadiness;
+const now = performance.now();
+let lastResource = 0;
+for (const entry of performance.getEntriesByType('resource')) {
+    lastResource = Math.max(lastResource, entry.responseEnd);
+}
+const images = Array.from(document.images).filter(img => img.loading !== 'lazy');
+return {
+    readyState: document.readyState,
+    pendingRequests: state.pending,
+    networkIdleMs: now - Math.max(state.lastNetwork, lastResource),
+    domQuietMs: now - state.lastMutation,
+    fontsLoaded: !document.fonts || document.fonts.status === 'loaded',
+    imagesLoaded: images.every(img => img.complete),
+};
+"""
+
+
+class ReadinessOptions:
+    """Thresholds for deciding a page has settled; all durations in seconds"""
+
+    FIELDS = (
+        "max_wait",
+        "network_idle",
+        "dom_quiet",
+        "poll_interval",
+        "wait_for_fonts",
+        "wait_for_images",
+    )
+
+    def __init__(
+        self,
+        max_wait: float = 15,
+        network_idle: float = 0.5,
+        dom_quiet: float = 0.5,
+        poll_interval: float = 0.1,
+        wait_for_fonts: bool = True,
+        wait_for_images: bool = True,
+    ):
+        self.max_wait = max_wait
+        self.network_idle = network_idle
+        self.dom_quiet = dom_quiet
+        self.poll_interval = poll_interval
+        self.wait_for_fonts = wait_for_fonts
+        self.wait_for_images = wait_for_images
+
+    def merged(self, overrides: Optional[Dict] = None) -> "ReadinessOptions":
+        """Copy with per-request overrides applied, ignoring unknown or empty keys"""
+        values = {name: getattr(self, name) for name in self.FIELDS}
+        for key, value in (overrides or {}).items():
+            if key in values and value is not None:
+                values[key] = value
+        return ReadinessOptions(**values)
+
+
+class ReadinessEngine:
+    def __init__(self, options: ReadinessOptions):
+        self.options = options
+
+    def install(self, driver: webdriver.Chrome) -> Optional[str]:
+        """Register the tracker for every new document; returns the script id"""
+        try:
+            result = driver.execute_cdp_cmd(
+                "Page.addScriptToEvaluateOnNewDocument", {"source": TRACKER_SCRIPT}
+            )
+            return result.get("identifier")
+        except Exception as e:
+            # The probe installs the tracker lazily, minus early network activity
+            logger.warning(f"Readiness tracker install failed: {e}")
+            return None
+
+    def uninstall(self, driver: webdriver.Chrome, identifier: Optional[str]):
+        if identifier:
+            driver.execute_cdp_cmd(
+                "Page.removeScriptToEvaluateOnNewDocument", {"identifier": identifier}
+            )
+
+    def wait(
+        self, driver: webdriver.Chrome, options: Optional[ReadinessOptions] = None
+    ) -> Dict:
+        """Poll until the page is ready or the deadline passes; reports the time spent"""
+        options = options or self.options
+        start = time.monotonic()
+        deadline = start + options.max_wait
+        signals: Dict = {}
+        ready = False
+
+        while True:
+            try:
+                signals = driver.execute_script(PROBE_SCRIPT) or {}
+                ready = self._is_ready(signals, options)
+            except JavascriptException:
+                # The document can be swapped out mid-probe by a redirect
+                ready = False
+            if ready or time.monotonic() >= deadline:
+                break
+            time.sleep(options.poll_interval)
+
+        waited = round(time.monotonic() - start, 3)
+        if not ready:
+            logger.info(f"Page not settled after {waited}s, continuing: {signals}")
+        return {"waited_seconds": waited, "timed_out": not ready, "signals": signals}
+
+    def _is_ready(self, signals: Dict, options: ReadinessOptions) -> bool:
+        return (
+            signals.get("readyState") == "complete"
+            and signals.get("pendingRequests", 0) <= 0
+            and signals.get("networkIdleMs", 0) >= options.network_idle * 1000
+            and signals.get("domQuietMs", 0) >= options.dom_quiet * 1000
+            and (signals.get("fontsLoaded", True) or not options.wait_for_fonts)
+            and (signals.get("imagesLoaded", True) or not options.wait_for_images)
+        )
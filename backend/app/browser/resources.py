@@ -0,0 +1,213 @@
+# resource policy: DevTools URL blocking of trackers and heavy assets while a page loads
+
+import fnmatch
+import json
+import logging
+from collections import Counter
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from app.metrics.registry import registry
+
+logger = logging.getLogger(__name__)
+
+BLOCKED_REQUESTS = registry.counter(
+    "nuvio_blocked_requests_total",
+    "Requests blocked during capture by resource profile and type",
+    ("profile", "type"),
+)
+
+# Analytics, advertising, session recording and chat widget hosts
+TRACKER_DOMAINS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "googlesyndication.com",
+    "doubleclick.net",
+    "adservice.google.com",
+    "connect.facebook.net",
+    "analytics.tiktok.com",
+    "snap.licdn.com",
+    "static.ads-twitter.com",
+    "bat.bing.com",
+    "clarity.ms",
+    "hotjar.com",
+    "fullstory.com",
+    "mixpanel.com",
+    "cdn.segment.com",
+    "api.segment.io",
+    "amplitude.com",
+    "heapanalytics.com",
+    "js-agent.newrelic.com",
+    "bam.nr-data.net",
+    "optimizely.com",
+    "amazon-adsystem.com",
+    "taboola.com",
+    "outbrain.com",
+    "criteo.com",
+    "criteo.net",
+    "widget.intercom.io",
+    "js.intercomcdn.com",
+    "js.driftt.com",
+    "client.crisp.chat",
+    "static.zdassets.com",
+    "embed.tawk.to",
+    "js.hs-scripts.com",
+    "js.hs-analytics.net",
+)
+
+# Network.setBlockedURLs matches URLs, not resource types, so types are
+# blocked by file extension; extensionless images and fonts still load
+TYPE_EXTENSIONS = {
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "avif", "svg", "ico", "bmp"),
+    "media": ("mp4", "webm", "ogg", "ogv", "mov", "m4v", "m3u8", "mp3", "wav", "m4a"),
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+}
+
+# Typical transfer size per DevTools resource type, from HTTP Archive medians,
+# for estimating what blocking saved (a blocked request has no size)
+TYPICAL_BYTES = {
+    "Image": 25_000,
+    "Media": 500_000,
+    "Font": 30_000,
+    "Script": 20_000,
+    "Stylesheet": 10_000,
+    "Document": 30_000,
+}
+TYPICAL_OTHER_BYTES = 1_000
+
+
+class ResourceStats:
+    """Blocked and loaded requests seen on one or more page loads"""
+
+    def __init__(self, profile: str):
+        self.profile = profile
+        self.requests = 0
+        self.blocked = 0
+        self.blocked_types: Counter = Counter()
+        self.blocked_domains: Counter = Counter()
+        self.estimated_bytes_saved = 0
+        self.transferred_bytes = 0
+
+    def merge(self, other: "ResourceStats"):
+        self.requests += other.requests
+        self.blocked += other.blocked
+        self.blocked_types.update(other.blocked_types)
+        self.blocked_domains.update(other.blocked_domains)
+        self.estimated_bytes_saved += other.estimated_bytes_saved
+        self.transferred_bytes += other.transferred_bytes
+
+    def summary(self) -> Dict:
+        return {
+            "profile": self.profile,
+            "requests": self.requests,
+            "blocked": self.blocked,
+            "blocked_types": dict(self.blocked_types),
+            "blocked_domains": dict(self.blocked_domains.most_common(10)),
+            "estimated_bytes_saved": self.estimated_bytes_saved,
+            "transferred_bytes": self.transferred_bytes,
+        }
+
+
+class ResourceProfile:
+    """One set of blocked resource types and domains, applied per page load"""
+
+    def __init__(self, name: str, blocked_types: Iterable[str], blocked_domains: Iterable[str]):
+        self.name = name
+        self.blocked_types = [kind for kind in blocked_types if kind in TYPE_EXTENSIONS]
+        self.blocked_domains = list(blocked_domains)
+
+    def patterns(self, page_url: str) -> List[str]:
+        """URL patterns to block, minus any that would block the page itself"""
+        patterns = []
+        for domain in self.blocked_domains:
+            patterns += [f"*://{domain}/*", f"*://*.{domain}/*"]
+        for kind in self.blocked_types:
+            for extension in TYPE_EXTENSIONS[kind]:
+                patterns += [f"*.{extension}", f"*.{extension}?*"]
+        # DevTools only treats * as a wildcard; fnmatch would also expand ?
+        return [
+            pattern
+            for pattern in patterns
+            if not fnmatch.fnmatchcase(page_url, pattern.replace("?", "[?]"))
+        ]
+
+    def apply(self, driver: webdriver.Chrome, page_url: str) -> bool:
+        """Block this profile's URLs on the driver; False if DevTools refused"""
+        try:
+            # Drop events left over from the previous page on this driver
+            driver.get_log("performance")
+        except WebDriverException:
+            # Without the performance log nothing is counted, but blocking still works
+            pass
+        try:
+            driver.execute_cdp_cmd("Network.enable", {})
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": self.patterns(page_url)})
+            return True
+        except WebDriverException as e:
+            logger.warning(f"Resource policy {self.name} not applied: {e}")
+            return False
+
+    def collect(self, driver: webdriver.Chrome) -> ResourceStats:
+        """Count blocked and loaded requests from the driver's performance log"""
+        stats = ResourceStats(self.name)
+        try:
+            entries = driver.get_log("performance")
+        except WebDriverException as e:
+            logger.warning(f"Performance log unavailable: {e}")
+            return stats
+
+        requests: Dict[str, Dict] = {}
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, TypeError, ValueError):
+                continue
+            method, params = message.get("method"), message.get("params") or {}
+            if method == "Network.requestWillBeSent":
+                if params.get("requestId") not in requests:
+                    stats.requests += 1
+                requests[params.get("requestId")] = {
+                    "url": (params.get("request") or {}).get("url", ""),
+                    "type": params.get("type") or "Other",
+                }
+            elif method == "Network.loadingFinished":
+                stats.transferred_bytes += int(params.get("encodedDataLength") or 0)
+            elif method == "Network.loadingFailed" and params.get("blockedReason") == "inspector":
+                request = requests.get(params.get("requestId"), {})
+                kind = params.get("type") or request.get("type") or "Other"
+                stats.blocked += 1
+                stats.blocked_types[kind] += 1
+                stats.blocked_domains[urlsplit(request.get("url", "")).hostname or "unknown"] += 1
+                stats.estimated_bytes_saved += TYPICAL_BYTES.get(kind, TYPICAL_OTHER_BYTES)
+                BLOCKED_REQUESTS.inc(self.name, kind)
+        return stats
+
+    def clear(self, driver: webdriver.Chrome):
+        """Unblock everything so the pooled driver starts the next lease clean"""
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": []})
+
+
+class ResourcePolicy:
+    """The extraction and screenshot profiles
+
+    A page loaded only for DOM extraction skips images, media and fonts as
+    well as trackers; one that is also screenshotted keeps visual assets.
+    """
+
+    def __init__(
+        self,
+        extraction_types: Iterable[str],
+        screenshot_types: Iterable[str],
+        blocked_domains: Iterable[str] = (),
+        block_trackers: bool = True,
+    ):
+        domains = (list(TRACKER_DOMAINS) if block_trackers else []) + list(blocked_domains)
+        self.profiles = {
+            "extraction": ResourceProfile("extraction", extraction_types, domains),
+            "screenshots": ResourceProfile("screenshots", screenshot_types, domains),
+        }
+
+    def profile(self, name: str) -> Optional[ResourceProfile]:
+        return self.profiles.get(name)
@@ -0,0 +1,92 @@
+# captured screenshots kept as raw PNG bytes, decoded and re-encoded only on demand
+
+import io
+import logging
+import threading
+from typing import Dict, List, Tuple
+from PIL import Image
+from app.metrics.tracing import span
+
+logger = logging.getLogger(__name__)
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+
+
+class Screenshot:
+    """PNG bytes from Chrome; model-sized variants are built once and kept
+
+    Cached captures share these objects, so a variant encoded for one request
+    is reused by every later request for the same page. The decoded bitmap,
+    many times the PNG's size, is only held while encoding or cropping.
+    """
+
+    def __init__(self, png: bytes, name: str = "", viewport: Tuple[int, int] = (0, 0)):
+        self.png = png
+        self.name = name
+        self.viewport = viewport
+        self._variants: Dict[Tuple, bytes] = {}
+        self._lock = threading.Lock()
+
+    def decode(self) -> Image.Image:
+        image = Image.open(io.BytesIO(self.png))
+        image.load()
+        return image
+
+    @property
+    def nbytes(self) -> int:
+        """Encoded bytes held: the PNG plus every model variant built so far"""
+        return len(self.png) + sum(len(variant) for variant in self._variants.values())
+
+    def for_model(
+        self, max_dimension: int = 1536, image_format: str = "JPEG", quality: int = 80
+    ) -> bytes:
+        """Downscaled and recompressed copy sized for a vision model"""
+        image_format = image_format.upper()
+        key = (max_dimension, image_format, quality)
+        variant = self._variants.get(key)
+        if variant is not None:
+            return variant
+
+        with self._lock:
+            if key in self._variants:
+                return self._variants[key]
+            with span("screenshot_encode", image_format.lower()):
+                image = self.decode()
+                resized = image.convert("RGB")
+                if max(resized.size) > max_dimension:
+                    resized.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+                buffer = io.BytesIO()
+                resized.save(buffer, format=image_format, quality=quality)
+                variant = buffer.getvalue()
+            self._variants[key] = variant
+
+        logger.info(
+            f"Encoded {self.name or 'screenshot'} {image.size[0]}x{image.size[1]} "
+            f"({len(self.png)} bytes PNG) as {resized.size[0]}x{resized.size[1]} "
+            f"{image_format} ({len(variant)} bytes)"
+        )
+        return variant
+
+    def crops(self, bands: List[Tuple[int, int, str]]) -> List["Screenshot"]:
+        """Full-width horizontal bands (top, height, name), e.g. page sections
+
+        The PNG is decoded once for all of them.
+        """
+        image = self.decode()
+        crops = []
+        for top, height, name in bands:
+            top = max(0, min(top, image.size[1] - 1))
+            bottom = max(top + 1, min(top + height, image.size[1]))
+            buffer = io.BytesIO()
+            image.crop((0, top, image.size[0], bottom)).save(buffer, format="PNG")
+            crops.append(Screenshot(buffer.getvalue(), name, (image.size[0], bottom - top)))
+        return crops
+
+    def model_part(
+        self, max_dimension: int = 1536, image_format: str = "JPEG", quality: int = 80
+    ) -> Dict:
+        """Inline blob accepted by generate_content, so the SDK does not re-encode it"""
+        return {
+            "mime_type": MIME_TYPES[image_format.upper()],
+            "data": self.for_model(max_dimension, image_format, quality),
+        }
@@ -0,0 +1,283 @@
+# single page load shared by DOM extraction and every viewport screenshot
+
+import base64
+import logging
+from typing import Dict, List, Optional, Tuple
+from selenium import webdriver
+from app.browser.readiness import ReadinessEngine, ReadinessOptions
+from app.browser.resources import ResourceProfile, ResourceStats
+from app.browser.screenshot import Screenshot
+from app.clone.analysis import SECTION_LIMIT
+from app.metrics.tracing import span
+from app.parsing.html_parser import HTMLParser, ParsedPage
+
+logger = logging.getLogger(__name__)
+
+VIEWPORTS: Dict[str, Tuple[int, int]] = {
+    "desktop": (1920, 1080),
+    "tablet": (768, 1024),
+    "mobile": (375, 667),
+}
+
+# One getComputedStyle call per visible element, grouped by style signature.
+# Groups are ranked by the on-screen area they cover, weighted towards landmark
+# and above-the-fold elements, and scanning stops once the budget is spent.
+JS_ANALYSIS_SCRIPT = """
+    const options = arguments[0] || {};
+    const budgetMs = options.budgetMs || 250;
+    const maxSamples = options.maxSamples || 50;
+    const maxSections = options.maxSections || 25;
+    const start = performance.now();
+    const viewportHeight = window.innerHeight;
+    const properties = [
+        'display', 'position', 'backgroundColor', 'color', 'fontSize',
+        'fontFamily', 'margin', 'padding', 'border', 'borderRadius',
+    ];
+    const skipped = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'TEMPLATE', 'META', 'LINK', 'BR']);
+    const important = new Set([
+        'HEADER', 'NAV', 'MAIN', 'SECTION', 'FOOTER', 'ASIDE',
+        'H1', 'H2', 'H3', 'BUTTON', 'A', 'IMG', 'INPUT',
+    ]);
+
+    const groups = new Map();
+    const elements = document.body ? document.body.getElementsByTagName('*') : [];
+    let scanned = 0;
+    let sampled = 0;
+    let truncated = false;
+    let hasFixedElements = false;
+
+    for (let i = 0; i < elements.length; i++) {
+        if ((i & 63) === 0 && performance.now() - start > budgetMs) {
+            truncated = true;
+            break;
+        }
+        const el = elements[i];
+        scanned++;
+        if (skipped.has(el.tagName)) continue;
+        const rect = el.getBoundingClientRect();
+        const area = rect.width * rect.height;
+        if (area < 1) continue;
+
+        const style = getComputedStyle(el);
+        if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0') continue;
+        if (style.position === 'fixed') hasFixedElements = true;
+        sampled++;
+
+        const values = properties.map(name => style[name]);
+        const signature = values.join('|');
+        const weight = (important.has(el.tagName) ? 2 : 1) * (rect.top < viewportHeight ? 1.5 : 1);
+        const score = area * weight;
+
+        let group = groups.get(signature);
+        if (!group) {
+            group = { values, count: 0, area: 0, score: 0, best: 0, el: null };
+            groups.set(signature, group);
+        }
+        group.count++;
+        group.area += area;
+        group.score += score;
+        if (score > group.best) {
+            group.best = score;
+            group.el = el;
+        }
+    }
+
+    const ranked = Array.from(groups.values()).sort((a, b) => b.score - a.score);
+
+    // Page position of the elements the DOM analysis reports as content
+    // sections, in the same document order, so each can be cropped later
+    const sectionBoxes = Array.from(
+        document.querySelectorAll('section[class], article[class], div[class]')
+    ).slice(0, maxSections).map(el => {
+        const rect = el.getBoundingClientRect();
+        return {
+            tag: el.tagName.toLowerCase(),
+            className: el.getAttribute('class') || '',
+            top: Math.round(rect.top + window.scrollY),
+            height: Math.round(rect.height),
+        };
+    });
+    return {
+        viewportWidth: window.innerWidth,
+        viewportHeight: viewportHeight,
+        scrollHeight: document.body ? document.body.scrollHeight : 0,
+        documentHeight: document.documentElement.scrollHeight,
+        hasFixedElements: hasFixedElements,
+        computedStyles: ranked.slice(0, maxSamples).map(group => ({
+            tag: group.el.tagName.toLowerCase(),
+            className: group.el.getAttribute('class') || '',
+            count: group.count,
+            area: Math.round(group.area),
+            computedStyle: Object.fromEntries(properties.map((name, i) => [name, group.values[i]])),
+        })),
+        sampling: {
+            elementsTotal: elements.length,
+            elementsScanned: scanned,
+            elementsSampled: sampled,
+            uniqueStyles: groups.size,
+            elapsedMs: Math.round(performance.now() - start),
+            truncated: truncated,
+        },
+        sectionBoxes: sectionBoxes,
+    };
+"""
+
+
+class CaptureSession:
+    """Loads a URL once and serves page source, JS analysis and screenshots from it"""
+
+    def __init__(
+        self,
+        driver: webdriver.Chrome,
+        url: str,
+        readiness: ReadinessEngine,
+        load_options: Optional[ReadinessOptions] = None,
+        resize_options: Optional[ReadinessOptions] = None,
+        html_parser: Optional[HTMLParser] = None,
+        style_budget_ms: int = 250,
+        style_samples: int = 50,
+        resources: Optional[ResourceProfile] = None,
+    ):
+        self.driver = driver
+        self.url = str(url)
+        self.readiness = readiness
+        self.load_options = load_options or readiness.options
+        self.resize_options = resize_options or self.load_options
+        self.html_parser = html_parser or HTMLParser("html.parser")
+        self.style_options = {
+            "budgetMs": style_budget_ms,
+            "maxSamples": style_samples,
+            "maxSections": SECTION_LIMIT,
+        }
+        self.waits: Dict[str, Dict] = {}
+        # Set when a capture timed out mid-command, so the driver is not reused
+        self.abandoned = False
+        self.resources = resources
+        self.resource_stats: Optional[ResourceStats] = None
+        # Added by spare-browser loads of the same page for other viewports
+        self.lane_resource_stats: List[ResourceStats] = []
+
+        self._page_source: Optional[str] = None
+        self._js_analysis: Optional[Dict] = None
+        self._document: Optional[ParsedPage] = None
+        self._tracker_id: Optional[str] = None
+
+    def open(self) -> "CaptureSession":
+        """Navigate to the URL; this is the only navigation of the session"""
+        self._tracker_id = self.readiness.install(self.driver)
+        if self.resources is not None:
+            self.resources.apply(self.driver, self.url)
+        with span("navigation"):
+            self.driver.get(self.url)
+        with span("readiness_wait", "load"):
+            self.waits["load"] = self.readiness.wait(self.driver, self.load_options)
+        return self
+
+    def close(self):
+        self.readiness.uninstall(self.driver, self._tracker_id)
+        self._tracker_id = None
+        if self.resources is not None:
+            self.resource_stats = self.resources.collect(self.driver)
+            self.resources.clear(self.driver)
+
+    def resource_summary(self) -> Optional[Dict]:
+        """Requests blocked by the resource profile, once the session is closed"""
+        if self.resource_stats is None:
+            return None
+        total = ResourceStats(self.resource_stats.profile)
+        for stats in [self.resource_stats, *self.lane_resource_stats]:
+            total.merge(stats)
+        return {**total.summary(), "page_loads": 1 + len(self.lane_resource_stats)}
+
+    def wait_summary(self) -> Dict:
+        """Time actually spent waiting for the page to settle, for response metadata"""
+        return {
+            "page_load_seconds": self.waits.get("load", {}).get("waited_seconds", 0),
+            "viewport_seconds": {
+                name: wait["waited_seconds"]
+                for name, wait in self.waits.items()
+                if name != "load"
+            },
+            "total_seconds": round(
+                sum(wait["waited_seconds"] for wait in self.waits.values()), 3
+            ),
+            "timed_out": any(wait["timed_out"] for wait in self.waits.values()),
+        }
+
+    def page_source(self) -> str:
+        if self._page_source is None:
+            self._page_source = self.driver.page_source
+        return self._page_source
+
+    def document(self) -> ParsedPage:
+        """page_source parsed once, with the backend used and the parse time"""
+        if self._document is None:
+            self._document = self.html_parser.parse(self.page_source())
+        return self._document
+
+    def parse_summary(self) -> Optional[Dict]:
+        return self._document.summary() if self._document is not None else None
+
+    def js_analysis(self) -> Dict:
+        if self._js_analysis is None:
+            with span("style_sampling"):
+                self._js_analysis = self.driver.execute_script(
+                    JS_ANALYSIS_SCRIPT, self.style_options
+                ) or {}
+            sampling = self._js_analysis.get("sampling", {})
+            logger.info(
+                f"Sampled {sampling.get('elementsSampled')} of {sampling.get('elementsTotal')} "
+                f"elements into {sampling.get('uniqueStyles')} styles "
+                f"in {sampling.get('elapsedMs')}ms"
+                + (" (budget hit)" if sampling.get("truncated") else "")
+            )
+        return self._js_analysis
+
+    def screenshot(self, name: str, width: int, height: int) -> bytes:
+        """PNG of the loaded document emulated at the given viewport size"""
+        self.driver.execute_cdp_cmd(
+            "Emulation.setDeviceMetricsOverride",
+            {
+                "width": width,
+                "height": height,
+                "deviceScaleFactor": 1,
+                "mobile": width < 768,
+            },
+        )
+        try:
+            # Media queries and responsive images re-layout after the resize
+            with span("readiness_wait", name):
+                self.waits[name] = self.readiness.wait(self.driver, self.resize_options)
+            with span("screenshot", name):
+                return self.driver.get_screenshot_as_png()
+        finally:
+            self.driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+
+    def viewport_screenshot(self, name: str, width: int, height: int) -> Screenshot:
+        return Screenshot(self.screenshot(name, width, height), name, (width, height))
+
+    def full_page_screenshot(self, width: int, height: int, max_height: int) -> Screenshot:
+        """PNG of the whole document laid out at width x height, cut off at max_height"""
+        self.driver.execute_cdp_cmd(
+            "Emulation.setDeviceMetricsOverride",
+            {"width": width, "height": height, "deviceScaleFactor": 1, "mobile": False},
+        )
+        try:
+            with span("readiness_wait", "full_page"):
+                self.waits["full_page"] = self.readiness.wait(self.driver, self.resize_options)
+            document_height = self.driver.execute_script(
+                "return document.documentElement.scrollHeight"
+            ) or height
+            page_height = max(1, min(int(document_height), max_height))
+            with span("screenshot", "full_page"):
+                result = self.driver.execute_cdp_cmd(
+                    "Page.captureScreenshot",
+                    {
+                        "format": "png",
+                        "captureBeyondViewport": True,
+                        "clip": {"x": 0, "y": 0, "width": width, "height": page_height, "scale": 1},
+                    },
+                )
+            return Screenshot(base64.b64decode(result["data"]), "full_page", (width, page_height))
+        finally:
+            self.driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
@@ -0,0 +1,151 @@
+# in-memory cache of extracted design context and screenshots, keyed by URL
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import aiohttp
+from app.browser.screenshot import Screenshot
+from app.utils.urls import normalize_url
+
+logger = logging.getLogger(__name__)
+
+
+class CachedCapture:
+    def __init__(
+        self, design_context: Dict, screenshots: Dict[str, Screenshot], validators: Dict
+    ):
+        self.design_context = design_context
+        self.screenshots = screenshots
+        self.validators = validators
+        self.stored_at = time.monotonic()
+        # Serialised size is a rough stand-in for the dicts' memory footprint
+        self.context_bytes = len(json.dumps(design_context, default=str))
+
+    @property
+    def size(self) -> int:
+        """Estimated bytes held, counting screenshot variants encoded since it was stored"""
+        screenshot_bytes = sum(screenshot.nbytes for screenshot in self.screenshots.values())
+        return self.context_bytes + screenshot_bytes
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.stored_at
+
+
+class DesignContextCache:
+    """LRU cache with a fresh window, then conditional revalidation until the TTL
+
+    Entries younger than `fresh_for` are served as-is. Older entries are only
+    served after a HEAD request shows the page is unchanged (304, or matching
+    ETag / Last-Modified), and entries older than `ttl` are always dropped.
+    Least-recently-used entries are evicted past `max_entries` or once their
+    estimated size exceeds `max_bytes`; screenshots dominate that size.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 64,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 3600,
+        fresh_for: float = 60,
+        revalidate_timeout: float = 5,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.fresh_for = fresh_for
+        self.revalidate_timeout = revalidate_timeout
+        self._entries: "OrderedDict[str, CachedCapture]" = OrderedDict()
+
+    def key(self, url: str, viewports: Dict[str, Tuple[int, int]]) -> str:
+        viewport_set = json.dumps(sorted(viewports.items()))
+        digest = hashlib.sha256(viewport_set.encode()).hexdigest()[:12]
+        return f"{normalize_url(url)}#{digest}"
+
+    async def lookup(self, key: str, url: str) -> Tuple[Optional[CachedCapture], str]:
+        """Return (entry, status) where status is hit, revalidated, stale or miss"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None, "miss"
+        if entry.age > self.ttl:
+            self._entries.pop(key, None)
+            return None, "miss"
+        if entry.age <= self.fresh_for:
+            self._entries.move_to_end(key)
+            return entry, "hit"
+
+        if await self._still_valid(url, entry.validators):
+            entry.stored_at = time.monotonic()
+            self._entries.move_to_end(key)
+            return entry, "revalidated"
+
+        self._entries.pop(key, None)
+        return None, "stale"
+
+    def put(
+        self,
+        key: str,
+        design_context: Dict,
+        screenshots: Dict[str, Screenshot],
+        validators: Optional[Dict] = None,
+    ):
+        self._entries[key] = CachedCapture(design_context, screenshots, validators or {})
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+        total = sum(entry.size for entry in self._entries.values())
+        # The newest entry is kept even when it alone is over the limit
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted.size
+
+    async def fetch_validators(self, url: str) -> Dict:
+        """ETag / Last-Modified of the page, fetched alongside the Chrome capture"""
+        try:
+            status, headers = await self._head(url, {})
+        except Exception as e:
+            logger.info(f"Validator fetch failed for {url}: {e}")
+            return {}
+        if status >= 400:
+            return {}
+        return self._validators_from(headers)
+
+    async def _still_valid(self, url: str, validators: Dict) -> bool:
+        if not validators:
+            return False
+
+        conditional = {}
+        if validators.get("etag"):
+            conditional["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            conditional["If-Modified-Since"] = validators["last_modified"]
+
+        try:
+            status, headers = await self._head(url, conditional)
+        except Exception as e:
+            logger.info(f"Revalidation failed for {url}: {e}")
+            return False
+
+        if status == 304:
+            return True
+        # Plenty of servers ignore conditional HEADs, so compare validators too
+        current = self._validators_from(headers)
+        return status < 400 and bool(current) and current == validators
+
+    async def _head(self, url: str, headers: Dict) -> Tuple[int, Dict]:
+        timeout = aiohttp.ClientTimeout(total=self.revalidate_timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.head(str(url), headers=headers, allow_redirects=True) as response:
+                return response.status, response.headers.copy()
+
+    def _validators_from(self, headers: Dict) -> Dict:
+        validators = {}
+        if headers.get("ETag"):
+            validators["etag"] = headers["ETag"]
+        if headers.get("Last-Modified"):
+            validators["last_modified"] = headers["Last-Modified"]
+        return validators
@@ -0,0 +1,158 @@
+# disk-backed HTTP cache for fetched stylesheets, honouring max-age and validators
+
+import logging
+import os
+import re
+import sqlite3
+import time
+from typing import Dict, Optional
+from app.cache.sqlite import ClosingConnection, connect
+
+logger = logging.getLogger(__name__)
+
+MAX_AGE_RE = re.compile(r"max-age=(\d+)")
+
+
+class CachedResponse:
+    def __init__(
+        self,
+        body: bytes,
+        content_type: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+        expires: float,
+    ):
+        self.body = body
+        self.content_type = content_type
+        self.etag = etag
+        self.last_modified = last_modified
+        self.expires = expires
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires
+
+    def conditional_headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class HTTPCache:
+    """SQLite store of response bodies keyed by URL
+
+    Responses are fresh for their Cache-Control max-age, or `default_ttl`
+    seconds without one; stale entries with an ETag or Last-Modified are
+    revalidated with a conditional GET by the caller. no-store and private
+    responses are never written, as the cache is shared by every request.
+    Entries are evicted least-recently-used past `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 128 * 1024 * 1024, default_ttl: float = 300):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS http_responses (
+                    url TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    content_type TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    expires REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS http_responses_last_used ON http_responses (last_used)"
+            )
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT body, content_type, etag, last_modified, expires "
+                "FROM http_responses WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE http_responses SET last_used = ? WHERE url = ?", (time.time(), url)
+            )
+            return CachedResponse(*row)
+
+    def put(self, url: str, body: bytes, headers: Dict[str, str]) -> Optional[CachedResponse]:
+        cache_control = headers.get("Cache-Control", "").lower()
+        if "no-store" in cache_control or "private" in cache_control:
+            return None
+        entry = CachedResponse(
+            body,
+            headers.get("Content-Type", ""),
+            headers.get("ETag"),
+            headers.get("Last-Modified"),
+            time.time() + self._freshness(cache_control),
+        )
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO http_responses "
+                "(url, body, content_type, etag, last_modified, expires, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    body,
+                    entry.content_type,
+                    entry.etag,
+                    entry.last_modified,
+                    entry.expires,
+                    len(body),
+                    time.time(),
+                ),
+            )
+            self._evict(conn)
+        return entry
+
+    def refresh(self, url: str, headers: Dict[str, str]):
+        """Extend a revalidated entry's freshness after a 304"""
+        expires = time.time() + self._freshness(headers.get("Cache-Control", "").lower())
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE http_responses SET expires = ?, last_used = ? WHERE url = ?",
+                (expires, time.time(), url),
+            )
+
+    def _freshness(self, cache_control: str) -> float:
+        if "no-cache" in cache_control:
+            return 0
+        match = MAX_AGE_RE.search(cache_control)
+        return int(match.group(1)) if match else self.default_ttl
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM http_responses"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for url, size in conn.execute(
+            "SELECT url, size FROM http_responses ORDER BY last_used ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM http_responses WHERE url = ?", (url,))
+            total -= size
+            evicted += 1
+        logger.info(f"HTTP cache evicted {evicted} entries")
+
+    def _connect(self) -> ClosingConnection:
+        return connect(self.path)
@@ -0,0 +1,112 @@
+# disk-backed cache of model responses, shared by every uvicorn worker
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Optional
+from app.cache.sqlite import ClosingConnection, connect
+
+logger = logging.getLogger(__name__)
+
+
+class LLMResponseCache:
+    """SQLite store of response text keyed by model, config, prompt and images
+
+    SQLite in WAL mode handles locking between worker processes, and entries
+    are evicted least-recently-used once the stored text exceeds `max_bytes`.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)"
+            )
+
+    def key(self, model_name: str, contents, generation_config=None) -> str:
+        digest = hashlib.sha256()
+        digest.update(model_name.encode())
+        digest.update(json.dumps(self._config_dict(generation_config), sort_keys=True).encode())
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        for part in parts:
+            digest.update(self._part_digest(part).encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT text FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            return row[0]
+
+    def put(self, key: str, text: str):
+        size = len(text.encode())
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, text, size, time.time()),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute(
+            "SELECT key, size FROM responses ORDER BY last_used ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.info(f"LLM response cache evicted {evicted} entries")
+
+    def _connect(self) -> ClosingConnection:
+        return connect(self.path)
+
+    def _config_dict(self, generation_config) -> dict:
+        if generation_config is None:
+            return {}
+        if dataclasses.is_dataclass(generation_config):
+            return dataclasses.asdict(generation_config)
+        return dict(generation_config)
+
+    def _part_digest(self, part) -> str:
+        if isinstance(part, str):
+            return "text:" + hashlib.sha256(part.encode()).hexdigest()
+        if isinstance(part, bytes):
+            return "bytes:" + hashlib.sha256(part).hexdigest()
+        if isinstance(part, dict) and isinstance(part.get("data"), bytes):
+            # Inline blobs such as encoded screenshots
+            return f"blob:{part.get('mime_type')}:" + hashlib.sha256(part["data"]).hexdigest()
+        if hasattr(part, "tobytes"):
+            # PIL images: hash the decoded pixels plus their geometry
+            header = f"{part.mode}:{part.size}".encode()
+            return "image:" + hashlib.sha256(header + part.tobytes()).hexdigest()
+        return "repr:" + hashlib.sha256(repr(part).encode()).hexdigest()
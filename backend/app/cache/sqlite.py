@@ -0,0 +1,27 @@
+# short-lived SQLite connections shared by the disk-backed caches
+
+import sqlite3
+
+
+class ClosingConnection:
+    """sqlite3's own context manager commits but never closes; this does both"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+
+
+def connect(path: str) -> ClosingConnection:
+    # One short-lived connection per call keeps callers safe across threads too
+    return ClosingConnection(sqlite3.connect(path, timeout=10))
@@ -0,0 +1,565 @@
+# single-pass DOM analysis producing the design_context consumed by the prompts
+
+import re
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from bs4.element import CData, NavigableString, Tag
+from app.metrics.tracing import span
+
+SECTION_TAGS = ("section", "article", "div")
+SECTION_LIMIT = 25
+GRID_TERMS = ("grid", "col", "row")
+RESPONSIVE_TERMS = ("responsive", "mobile", "tablet", "desktop", "sm", "md", "lg", "xl")
+HEADING_TAGS = ("h1", "h2", "h3", "h4", "h5", "h6")
+
+BACKGROUND_COLOR_RE = re.compile(r"background-color:\s*([^;]+)")
+TEXT_COLOR_RE = re.compile(r"(?<![a-z])color:\s*([^;]+)")
+
+DEFAULT_STRING_TYPES = getattr(Tag, "MAIN_CONTENT_STRING_TYPES", (NavigableString, CData))
+
+
+def classify_content_type(classes: str, text_lower: str, has_heading: bool) -> str:
+    """Classify a content section from its class string, lowered text and h1-h3 presence"""
+    classes_lower = classes.lower()
+
+    if any(term in classes_lower for term in ["hero", "banner", "jumbotron"]):
+        return "hero"
+    elif any(term in classes_lower for term in ["card", "feature", "service"]):
+        return "feature_card"
+    elif any(term in classes_lower for term in ["testimonial", "review"]):
+        return "testimonial"
+    elif any(term in classes_lower for term in ["contact", "form"]):
+        return "contact"
+    elif any(term in text_lower for term in ["about", "mission", "vision"]):
+        return "about"
+    elif has_heading:
+        return "content_section"
+    else:
+        return "generic"
+
+
+def estimate_section_importance(classes: str, has_h1_or_h2: bool, text_length: int) -> int:
+    # Simple importance scoring based on position and content
+    score = 0
+    if has_h1_or_h2:
+        score += 3
+    if any(term in classes.lower() for term in ["hero", "main", "primary"]):
+        score += 5
+    if text_length > 100:
+        score += 2
+    return score
+
+
+class Subtree:
+    """What get_text()/find_all() would report for one element, filled in by the walk"""
+
+    def __init__(self, tag: Tag, raw_text: bool = False, name_limit: int = 0):
+        self.tag = tag
+        self.closed = False
+        self.string_types = tag.interesting_string_types or DEFAULT_STRING_TYPES
+        self.stripped: List[str] = []
+        self.raw: Optional[List[str]] = [] if raw_text else None
+        self.name_limit = name_limit
+        self.names: List[str] = []
+        self.seen_headings = set()
+        self.background_image = False
+        self.sections_and_divs = 0
+
+    def add_tag(self, tag: Tag):
+        name = tag.name
+        if len(self.names) < self.name_limit:
+            self.names.append(name)
+        if name == "section" or name == "div":
+            self.sections_and_divs += 1
+        elif name in ("h1", "h2", "h3"):
+            self.seen_headings.add(name)
+        if not self.background_image:
+            style = tag.attrs.get("style")
+            if style and "background-image" in str(style):
+                self.background_image = True
+
+    def add_string(self, string: NavigableString):
+        types = self.string_types
+        if isinstance(types, type):
+            if type(string) is not types:
+                return
+        elif types is not None and type(string) not in types:
+            return
+        if self.raw is not None:
+            self.raw.append(string)
+        stripped = string.strip()
+        if stripped:
+            self.stripped.append(stripped)
+
+    def text(self) -> str:
+        return "".join(self.stripped)
+
+    def raw_text(self) -> str:
+        return "".join(self.raw or [])
+
+
+class Visitor:
+    """Receives every tag (with its lowered class string, or None) and string once"""
+
+    def __init__(self, engine: "DomAnalysisEngine"):
+        self.engine = engine
+
+    def enter(self, tag: Tag, class_text: Optional[str]):
+        pass
+
+    def text(self, string: NavigableString):
+        pass
+
+    def result(self):
+        raise NotImplementedError
+
+
+class BasicInfoVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.title = None
+        self.meta_description = None
+        self.html = None
+
+    def enter(self, tag, class_text):
+        name = tag.name
+        if name == "title" and self.title is None:
+            self.title = tag
+        elif name == "meta" and self.meta_description is None:
+            if tag.attrs.get("name") == "description":
+                self.meta_description = tag
+        elif name == "html" and self.html is None:
+            self.html = tag
+
+    def result(self):
+        return {
+            "title": str(self.title.string or "") if self.title is not None else "",
+            "meta_description": (
+                self.meta_description.get("content", "")
+                if self.meta_description is not None
+                else ""
+            ),
+            "lang": self.html.get("lang") if self.html is not None else "en",
+        }
+
+
+class LayoutVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        # First <tag> and first div whose class mentions it, per landmark
+        self.landmarks: Dict[str, Dict[str, Optional[Subtree]]] = {
+            name: {"tag": None, "div": None}
+            for name in ("header", "main", "footer")
+        }
+        self.has_sidebar = False
+        self.sidebar_structure = False
+        self.grid_count = 0
+        self.grid_classes: List[str] = []
+        self.container_count = 0
+        self.has_grid_class = False
+        self.has_flex_class = False
+
+    def enter(self, tag, class_text):
+        name = tag.name
+        if name in self.landmarks and self.landmarks[name]["tag"] is None:
+            self.landmarks[name]["tag"] = self.engine.track(Subtree(tag))
+        elif name == "aside":
+            self.has_sidebar = True
+
+        if not class_text:
+            return
+
+        if name == "div":
+            for landmark, found in self.landmarks.items():
+                if found["div"] is None and landmark in class_text:
+                    found["div"] = self.engine.track(Subtree(tag))
+            if "sidebar" in class_text:
+                self.has_sidebar = True
+        if (name == "div" or name == "aside") and "sidebar" in class_text:
+            self.sidebar_structure = True
+
+        if any(term in class_text for term in GRID_TERMS):
+            self.grid_count += 1
+            if len(self.grid_classes) < 5:
+                self.grid_classes.append(" ".join(tag.get("class", [])))
+        if "container" in class_text:
+            self.container_count += 1
+        if "grid" in class_text:
+            self.has_grid_class = True
+        if "flex" in class_text:
+            self.has_flex_class = True
+
+    def _landmark(self, name: str) -> Optional[Subtree]:
+        found = self.landmarks[name]
+        return found["tag"] or found["div"]
+
+    def result(self):
+        if self.has_grid_class:
+            structure_type = "grid"
+        elif self.has_flex_class:
+            structure_type = "flexbox"
+        elif self.sidebar_structure:
+            structure_type = "sidebar"
+        else:
+            structure_type = "standard"
+
+        header = self._landmark("header")
+        main = self._landmark("main")
+        footer = self._landmark("footer")
+        return {
+            "structure_type": structure_type,
+            "header": {
+                "exists": header is not None,
+                "content": header.text()[:200] if header else "",
+            },
+            "main_content": {
+                "exists": main is not None,
+                "sections": main.sections_and_divs if main else 0,
+            },
+            "sidebar": {"exists": self.has_sidebar},
+            "footer": {
+                "exists": footer is not None,
+                "content": footer.text()[:200] if footer else "",
+            },
+            "grid_systems": {"count": self.grid_count, "classes": self.grid_classes},
+            "container_patterns": {"count": self.container_count},
+        }
+
+
+class ContentSectionsVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.sections: List[Subtree] = []
+
+    def enter(self, tag, class_text):
+        if (
+            len(self.sections) < SECTION_LIMIT
+            and tag.name in SECTION_TAGS
+            and class_text is not None
+        ):
+            self.sections.append(
+                self.engine.track(Subtree(tag, raw_text=True, name_limit=10))
+            )
+
+    def result(self):
+        sections = []
+        for section in self.sections:
+            classes = section.tag.get("class", [])
+            class_string = " ".join(classes)
+            text = section.text()
+            sections.append(
+                {
+                    "tag": section.tag.name,
+                    "classes": classes,
+                    "content_type": classify_content_type(
+                        class_string,
+                        section.raw_text().lower(),
+                        bool(section.seen_headings),
+                    ),
+                    "text_content": text[:300],
+                    "child_elements": section.names,
+                    "has_background_image": section.background_image,
+                    "estimated_importance": estimate_section_importance(
+                        class_string,
+                        bool(section.seen_headings & {"h1", "h2"}),
+                        len(text),
+                    ),
+                }
+            )
+        return sections
+
+
+class NavigationVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.navs: List[Subtree] = []
+        self.links: Dict[int, List[Subtree]] = {}
+
+    def enter(self, tag, class_text):
+        name = tag.name
+        if name == "a":
+            link = None
+            for index, nav in enumerate(self.navs):
+                if not nav.closed and len(self.links[index]) < 10:
+                    # Nested navs share one text collector per link
+                    link = link or self.engine.track(Subtree(tag))
+                    self.links[index].append(link)
+        elif (
+            (name == "nav" or name == "div")
+            and class_text
+            and "nav" in class_text
+            and len(self.navs) < 3
+        ):
+            self.links[len(self.navs)] = []
+            self.navs.append(self.engine.track(Subtree(tag)))
+
+    def result(self):
+        return [
+            {
+                "classes": nav.tag.get("class", []),
+                "links": [
+                    {"text": link.text(), "href": link.tag.get("href", "")}
+                    for link in self.links[index]
+                ],
+            }
+            for index, nav in enumerate(self.navs)
+        ]
+
+
+class VisualElementsVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.images: List[Tag] = []
+
+    def enter(self, tag, class_text):
+        if tag.name == "img" and len(self.images) < 10:
+            self.images.append(tag)
+
+    def result(self):
+        return {
+            "images": [
+                {
+                    "src": urljoin(self.engine.base_url, img.get("src", "")),
+                    "alt": img.get("alt", ""),
+                    "classes": img.get("class", []),
+                }
+                for img in self.images
+            ]
+        }
+
+
+class TypographyVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.headings: Dict[str, List[Subtree]] = {name: [] for name in HEADING_TAGS}
+
+    def enter(self, tag, class_text):
+        found = self.headings.get(tag.name)
+        if found is not None and len(found) < 3:
+            found.append(self.engine.track(Subtree(tag)))
+
+    def result(self):
+        typography = {
+            "headings": {},
+            "body_text": [],
+            "font_families": set(),
+            "font_sizes": set(),
+            "text_colors": set(),
+        }
+        for level in HEADING_TAGS:
+            if self.headings[level]:
+                typography["headings"][level] = [
+                    {
+                        "text": heading.text(),
+                        "classes": heading.tag.get("class", []),
+                        "style": heading.tag.get("style", ""),
+                    }
+                    for heading in self.headings[level]
+                ]
+        return typography
+
+
+class ColorVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.background_colors: List[str] = []
+        self.text_colors: List[str] = []
+
+    def enter(self, tag, class_text):
+        if "style" not in tag.attrs:
+            return
+        style = tag.get("style", "")
+
+        bg_match = BACKGROUND_COLOR_RE.search(style)
+        if bg_match:
+            self.background_colors.append(bg_match.group(1).strip())
+
+        color_match = TEXT_COLOR_RE.search(style)
+        if color_match:
+            self.text_colors.append(color_match.group(1).strip())
+
+    def result(self):
+        return {
+            "background_colors": self.background_colors,
+            "text_colors": self.text_colors,
+            "border_colors": [],
+            "dominant_palette": [],
+        }
+
+
+class ResponsiveVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.count = 0
+
+    def enter(self, tag, class_text):
+        if class_text and any(term in class_text for term in RESPONSIVE_TERMS):
+            self.count += 1
+
+    def result(self):
+        return {"count": self.count}
+
+
+class FormVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.forms: List[Subtree] = []
+        self.inputs: Dict[int, List[Tag]] = {}
+
+    def enter(self, tag, class_text):
+        name = tag.name
+        if name == "input":
+            for index, form in enumerate(self.forms):
+                if not form.closed:
+                    self.inputs[index].append(tag)
+        elif name == "form" and len(self.forms) < 3:
+            self.inputs[len(self.forms)] = []
+            self.forms.append(self.engine.track(Subtree(tag)))
+
+    def result(self):
+        return [
+            {
+                "action": form.tag.get("action", ""),
+                "inputs": [
+                    {"type": inp.get("type", ""), "name": inp.get("name", "")}
+                    for inp in self.inputs[index]
+                ],
+            }
+            for index, form in enumerate(self.forms)
+        ]
+
+
+class InteractiveVisitor(Visitor):
+    def __init__(self, engine):
+        super().__init__(engine)
+        self.counts = {"buttons": 0, "links": 0, "modals": 0, "dropdowns": 0}
+
+    def enter(self, tag, class_text):
+        name = tag.name
+        if name == "button":
+            self.counts["buttons"] += 1
+        elif name == "a":
+            self.counts["links"] += 1
+        if class_text:
+            if "modal" in class_text:
+                self.counts["modals"] += 1
+            if "dropdown" in class_text:
+                self.counts["dropdowns"] += 1
+
+    def result(self):
+        return dict(self.counts)
+
+
+class DomAnalysisEngine:
+    """Walks the parsed document once and lets every visitor update its state
+
+    Visitors that need per-element text or descendant details (section text,
+    header content, nav link text, form inputs) register a Subtree; the walk
+    feeds it every descendant until the element closes, so nothing is
+    re-scanned afterwards.
+    """
+
+    def __init__(self, base_url: str = ""):
+        self.base_url = base_url
+        self._open: List[Subtree] = []
+        self.basic_info = BasicInfoVisitor(self)
+        self.layout = LayoutVisitor(self)
+        self.content_sections = ContentSectionsVisitor(self)
+        self.navigation = NavigationVisitor(self)
+        self.visual_elements = VisualElementsVisitor(self)
+        self.typography = TypographyVisitor(self)
+        self.colors = ColorVisitor(self)
+        self.responsive = ResponsiveVisitor(self)
+        self.forms = FormVisitor(self)
+        self.interactive = InteractiveVisitor(self)
+        self.visitors: List[Visitor] = [
+            self.basic_info,
+            self.layout,
+            self.content_sections,
+            self.navigation,
+            self.visual_elements,
+            self.typography,
+            self.colors,
+            self.responsive,
+            self.forms,
+            self.interactive,
+        ]
+
+    def track(self, subtree: Subtree) -> Subtree:
+        self._open.append(subtree)
+        return subtree
+
+    def walk(self, soup: BeautifulSoup):
+        enters = [visitor.enter for visitor in self.visitors]
+        texts = [
+            visitor.text
+            for visitor in self.visitors
+            if type(visitor).text is not Visitor.text
+        ]
+        open_subtrees = self._open
+
+        stack = [iter(soup.contents)]
+        parents: List[Tag] = []
+        while stack:
+            node = next(stack[-1], None)
+            if node is None:
+                stack.pop()
+                if parents:
+                    closing = parents.pop()
+                    while open_subtrees and open_subtrees[-1].tag is closing:
+                        open_subtrees.pop().closed = True
+                continue
+
+            if isinstance(node, Tag):
+                # Descendant of every open subtree; the tag's own subtree opens below
+                for subtree in open_subtrees:
+                    subtree.add_tag(node)
+                classes = node.attrs.get("class")
+                if classes is None:
+                    class_text = None
+                elif isinstance(classes, str):
+                    class_text = classes.lower()
+                else:
+                    class_text = " ".join(classes).lower()
+                for enter in enters:
+                    enter(node, class_text)
+                parents.append(node)
+                stack.append(iter(node.contents))
+            elif isinstance(node, NavigableString):
+                for subtree in open_subtrees:
+                    subtree.add_string(node)
+                for text in texts:
+                    text(node)
+
+    def analyze(self, soup: BeautifulSoup, js_analysis: Optional[Dict] = None) -> Dict:
+        with span("dom_walk"):
+            self.walk(soup)
+        extractors = {
+            "basic_info": self.basic_info,
+            "layout_analysis": self.layout,
+            "content_sections": self.content_sections,
+            "navigation_structure": self.navigation,
+            "visual_elements": self.visual_elements,
+            "typography_system": self.typography,
+            "color_analysis": self.colors,
+            "responsive_indicators": self.responsive,
+            "js_analysis": None,
+            "form_elements": self.forms,
+            "interactive_elements": self.interactive,
+        }
+        design_context = {}
+        for key, visitor in extractors.items():
+            if visitor is None:
+                design_context[key] = js_analysis
+                continue
+            with span("extractor", key):
+                design_context[key] = visitor.result()
+        return design_context
+
+
+def analyze_design_context(
+    soup: BeautifulSoup, base_url: str, js_analysis: Optional[Dict] = None
+) -> Dict:
+    """Build the design_context dict from a parsed page in a single traversal"""
+    return DomAnalysisEngine(base_url).analyze(soup, js_analysis)
@@ -4,22 +4,54 @@ from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, HttpUrl
 import aiohttp
-from bs4 import BeautifulSoup
-import base64
-from urllib.parse import urljoin, urlparse
-import json
-import os
-from typing import Optional, Dict, List
-from selenium import webdriver
+from urllib.parse import urlparse
+from typing import AsyncIterator, Optional, Dict, List, Tuple
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
-import google.generativeai as genai
 import logging
 from dotenv import load_dotenv
-import re
+import asyncio
+from contextlib import asynccontextmanager
+from selenium.common.exceptions import WebDriverException
+from app.browser.pool import BrowserPool
+from app.browser.readiness import ReadinessEngine, ReadinessOptions
+from app.browser.resources import ResourcePolicy
+from app.browser.screenshot import Screenshot
+from app.browser.session import CaptureSession, VIEWPORTS
+from app.artifacts.store import create_store
+from app.cache.context_cache import DesignContextCache
+from app.metrics.tracing import record_cache, span
+from app.clone.analysis import analyze_design_context
+from app.clone.sections import (
+    SECTIONS_CONTAINER_ID,
+    PlannedSection,
+    placeholder_section,
+    plan_sections,
+    section_crops,
+    shared_css,
+    stitch,
+)
+from app.clone.site import (
+    assemble_page,
+    discover_pages,
+    page_filename,
+    page_sections,
+    page_slug,
+    split_shell,
+)
+from app.cache.http_cache import HTTPCache
+from app.cache.response_cache import LLMResponseCache
+from app.config.config import settings
+from app.executor.executor import ExecutionLayer
+from app.fetch.static_page import check_rendering
+from app.fetch.stylesheets import StylesheetFetcher
+from app.llm.gateway import LLMGateway, RetryBudget
+from app.llm.models import ModelRegistry
+from app.llm.prompt_budget import PromptBudget
+from app.parsing.html_parser import HTMLParser, ParsedPage
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -28,8 +60,89 @@ logger = logging.getLogger(__name__)
 
 class EnchancedWebsiteScraper:
     def __init__(self):
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        self.gemini_model = genai.GenerativeModel("gemini-2.0-flash")
+        self.models = ModelRegistry(
+            default_model=settings.llm_model,
+            stage_models=settings.llm_stage_models,
+            stage_configs=settings.llm_stage_configs,
+            stub_latency=settings.llm_stub_latency,
+        )
+        # Read by get_chrome_options, so set before the pool launches drivers
+        self.resource_policy = (
+            ResourcePolicy(
+                extraction_types=settings.resource_extraction_blocked_types,
+                screenshot_types=settings.resource_screenshot_blocked_types,
+                blocked_domains=settings.resource_blocked_domains,
+                block_trackers=settings.resource_block_trackers,
+            )
+            if settings.resource_policy_enabled
+            else None
+        )
+        self.browser_pool = BrowserPool(
+            options_factory=self.get_chrome_options,
+            size=settings.browser_pool_size,
+            max_pages=settings.browser_max_pages,
+            lease_timeout=settings.browser_lease_timeout,
+        )
+        self.executor = ExecutionLayer(
+            browser_workers=settings.browser_workers, cpu_workers=settings.cpu_workers
+        )
+        self.llm = LLMGateway(
+            max_concurrency=settings.llm_max_concurrency,
+            default_deadline=settings.llm_default_deadline,
+            stage_deadlines=settings.llm_stage_deadlines,
+            max_attempts=settings.llm_max_attempts,
+            retry_budget=RetryBudget(capacity=settings.llm_retry_budget),
+            response_cache=(
+                LLMResponseCache(
+                    settings.llm_cache_path,
+                    max_bytes=settings.llm_cache_max_mb * 1024 * 1024,
+                )
+                if settings.llm_cache_enabled
+                else None
+            ),
+        )
+        self.context_cache = DesignContextCache(
+            max_entries=settings.context_cache_entries,
+            max_bytes=settings.context_cache_max_mb * 1024 * 1024,
+            ttl=settings.context_cache_ttl,
+            fresh_for=settings.context_cache_fresh,
+        )
+        self.html_parser = HTMLParser(settings.html_parser)
+        # Also fetches page HTML for the static fast path
+        self.stylesheets = StylesheetFetcher(
+            cache=HTTPCache(
+                settings.http_cache_path,
+                max_bytes=settings.http_cache_max_mb * 1024 * 1024,
+            ),
+            max_connections=settings.stylesheet_max_connections,
+            per_host=settings.stylesheet_per_host,
+            max_bytes=settings.stylesheet_max_kb * 1024,
+            max_sheets=settings.stylesheet_max_sheets,
+            timeout=settings.stylesheet_timeout,
+        )
+        self.artifacts = (
+            create_store(
+                settings.artifact_backend,
+                settings.artifact_path,
+                max_bytes=settings.artifact_max_mb * 1024 * 1024,
+                max_age=settings.artifact_max_age,
+            )
+            if settings.artifacts_enabled
+            else None
+        )
+        # Captures in progress, so concurrent requests for one page share a browser;
+        # keyed by (cache key, full_page, fast_path, screenshots)
+        self._captures: Dict[Tuple[str, bool, bool, bool], asyncio.Task] = {}
+        self.prompt_budget = PromptBudget(
+            settings.prompt_token_budgets, settings.prompt_default_token_budget
+        )
+        self.readiness = ReadinessEngine(
+            ReadinessOptions(
+                max_wait=settings.readiness_max_wait,
+                network_idle=settings.readiness_network_idle,
+                dom_quiet=settings.readiness_dom_quiet,
+            )
+        )
 
     def get_chrome_options(self):
         """Configure Chrome options for headless browsing"""
@@ -42,223 +155,474 @@ class EnchancedWebsiteScraper:
         chrome_options.add_argument(
             "--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
         )
+        if self.resource_policy is not None:
+            # Network events in the performance log are how blocked requests are counted
+            chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
         return chrome_options
 
-    async def capture_multiple_screenshots(self, url: str) -> Dict[str, str]:
-        """Capture multiple screenshots at different viewport sizes"""
-        screenshots = {}
-        viewports = {
-            "desktop": (1920, 1080),
-            "tablet": (768, 1024),
-            "mobile": (375, 667),
-        }
+    @asynccontextmanager
+    async def capture_session(
+        self, url: str, readiness: Optional[Dict] = None, profile: str = "screenshots"
+    ):
+        """Lease a browser and load the URL once for extraction and screenshots
+
+        `readiness` holds per-request overrides of the ReadinessOptions fields.
+        `profile` names the resource policy profile the page loads with:
+        "screenshots" keeps visual assets, "extraction" also blocks them.
+        """
+        load_options = self.readiness.options.merged(readiness)
+        resize_options = load_options.merged(
+            {"max_wait": min(load_options.max_wait, settings.readiness_resize_max_wait)}
+        )
 
+        # Waiting for a free driver must not tie up a browser worker thread
+        pooled = await asyncio.to_thread(self.browser_pool.acquire)
+        healthy = True
+        session = CaptureSession(
+            pooled.driver,
+            url,
+            self.readiness,
+            load_options,
+            resize_options,
+            html_parser=self.html_parser,
+            style_budget_ms=settings.style_sample_budget_ms,
+            style_samples=settings.style_sample_max,
+            resources=self.resource_policy.profile(profile) if self.resource_policy else None,
+        )
         try:
-            options = self.get_chrome_options()
-            driver = webdriver.Chrome(options=options)
+            await self.executor.run_browser(session.open)
+            yield session
+        except BaseException:
+            # Besides driver errors this covers cancellation and timeouts: the
+            # worker thread cannot be stopped and may still be driving Chrome,
+            # so the driver is never handed to another capture
+            healthy = False
+            raise
+        finally:
+            healthy = healthy and not session.abandoned
+            if healthy:
+                try:
+                    await self.executor.run_browser(session.close)
+                except WebDriverException:
+                    healthy = False
+            # Shielded so a second cancellation cannot skip the release
+            await asyncio.shield(
+                self.executor.run_browser(self.browser_pool.release, pooled, healthy)
+            )
 
-            for name, (width, height) in viewports.items():
-                driver.set_window_size(width, height)
-                driver.get(str(url))
-                time.sleep(3)
+    async def capture_page(
+        self,
+        url: str,
+        readiness: Optional[Dict] = None,
+        use_cache: bool = True,
+        full_page: bool = False,
+        fast_path: Optional[bool] = None,
+        screenshots: bool = True,
+    ) -> Tuple[Dict, Dict[str, Screenshot], Dict]:
+        """Design context and screenshots for a URL, reusing a cached capture when valid
+
+        Returns (design_context, screenshots, capture_info) where capture_info
+        records the cache status, how long the page took to settle, which
+        parser backend built the tree in how long and the capture path. With
+        `full_page` the screenshots also include a "full_page" capture of the
+        whole document; a cached capture without one is taken again.
+        Concurrent cache misses for the same page share one capture, reported
+        as cache status "shared".
+
+        With `fast_path` (default STATIC_FAST_PATH) the page is fetched over
+        plain HTTP first and, when it does not need JavaScript to render,
+        the design context is built from that HTML; Chrome then only takes
+        the screenshots, or is not started at all without `screenshots`.
+        """
+        if fast_path is None:
+            fast_path = settings.static_fast_path
+        key = self.context_cache.key(url, VIEWPORTS)
+        entry, status = None, "bypass"
+        if use_cache:
+            entry, status = await self.context_cache.lookup(key, url)
+            if entry is not None and not self._capture_covers(
+                entry.design_context, entry.screenshots, full_page, fast_path, screenshots
+            ):
+                entry, status = None, "miss"
+        if entry is not None:
+            record_cache("design_context", status)
+            logger.info(f"Design context cache {status} for {url}")
+            return (
+                entry.design_context,
+                entry.screenshots,
+                {
+                    "cache_status": status,
+                    "readiness_wait": None,
+                    "parse": None,
+                    "capture_path": entry.design_context.get("capture_path", "browser"),
+                    "render_check": entry.design_context.get("render_check"),
+                    "resources": None,
+                },
+            )
 
-                screenshot = driver.get_screenshot_as_png()
-                screenshots[name] = base64.b64encode(screenshot).decode()
+        flight = (key, full_page, fast_path, screenshots)
+        shared = self._captures.get(flight) if use_cache else None
+        if shared is not None:
+            try:
+                design_context, screenshots, capture_info = await asyncio.shield(shared)
+                record_cache("design_context", "shared")
+                logger.info(f"Shared an in-flight capture of {url}")
+                return design_context, screenshots, {**capture_info, "cache_status": "shared"}
+            except asyncio.CancelledError:
+                # Capture ourselves if only the request that started it went away
+                if asyncio.current_task().cancelling() or not shared.cancelled():
+                    raise
+
+        record_cache("design_context", status)
+        capture = asyncio.create_task(
+            self._capture_fresh(url, key, status, readiness, full_page, fast_path, screenshots)
+        )
+        if use_cache:
+            self._captures[flight] = capture
+            capture.add_done_callback(
+                lambda done: self._captures.pop(flight, None)
+                if self._captures.get(flight) is done
+                else None
+            )
+        return await capture
+
+    async def _capture_fresh(
+        self,
+        url: str,
+        key: str,
+        status: str,
+        readiness: Optional[Dict],
+        full_page: bool,
+        fast_path: bool,
+        with_screenshots: bool,
+    ) -> Tuple[Dict, Dict[str, Screenshot], Dict]:
+        # Validators are fetched while Chrome loads the page so a later
+        # lookup can revalidate without launching a browser
+        validators_task = asyncio.create_task(self.context_cache.fetch_validators(url))
+        stylesheets_task = None
+        session = None
+        design_context: Dict = {}
+        screenshots: Dict[str, Screenshot] = {}
+        render_check, parsed = None, None
+        screenshot_error = None
+        try:
+            if fast_path:
+                design_context, render_check, parsed = await self._capture_static(
+                    url, use_cache=status != "bypass"
+                )
+            if design_context:
+                capture_path = "static+screenshots" if with_screenshots else "static"
+                stylesheets_task = self._start_stylesheets(url, parsed)
+                if with_screenshots:
+                    try:
+                        async with self.capture_session(url, readiness) as session:
+                            screenshots = await self._session_screenshots(
+                                url, session, full_page
+                            )
+                    except Exception as e:
+                        # The static design context stands on its own; only the screenshots are lost
+                        logger.warning(f"Screenshots of {url} failed on the static path: {e}")
+                        capture_path = "static"
+                        screenshot_error = f"{type(e).__name__}: {e}"
+            else:
+                capture_path = "browser"
+                profile = "screenshots" if with_screenshots else "extraction"
+                async with self.capture_session(url, readiness, profile) as session:
+                    # Parse the loaded page first so its stylesheets are fetched while
+                    # styles are sampled and the DOM analysed; extraction reuses the parse
+                    try:
+                        document = await self.executor.run_browser(session.document)
+                        stylesheets_task = self._start_stylesheets(url, document)
+                    except Exception as e:
+                        logger.warning(f"Early parse of {url} failed: {e}")
+                    design_context = await self.extract_comprehensive_dom(url, session)
+                    if design_context and with_screenshots:
+                        screenshots = await self._session_screenshots(url, session, full_page)
+            validators = await validators_task
+            if stylesheets_task is not None and design_context:
+                try:
+                    bundle = await stylesheets_task
+                    bundle.apply_to(design_context)
+                except Exception as e:
+                    logger.warning(f"Stylesheet collection for {url} failed, skipping it: {e}")
+        finally:
+            validators_task.cancel()
+            if stylesheets_task is not None:
+                stylesheets_task.cancel()
+
+        if design_context:
+            design_context["capture_path"] = capture_path
+            design_context["render_check"] = render_check
+            self.context_cache.put(key, design_context, screenshots, validators)
+        logger.info(f"Captured {url} on the {capture_path} path")
+
+        return (
+            design_context,
+            screenshots,
+            {
+                "cache_status": status,
+                "readiness_wait": session.wait_summary() if session is not None else None,
+                "parse": (
+                    parsed.summary()
+                    if parsed is not None
+                    else session.parse_summary() if session is not None else None
+                ),
+                "capture_path": capture_path,
+                "render_check": render_check,
+                "resources": session.resource_summary() if session is not None else None,
+                "screenshot_error": screenshot_error,
+            },
+        )
 
-            driver.quit()
-            return screenshots
+    def _start_stylesheets(self, url: str, parsed: ParsedPage) -> Optional[asyncio.Task]:
+        """Fetch the parsed page's stylesheets while the rest of the capture runs"""
+        if not settings.stylesheet_fetch_enabled:
+            return None
+        return asyncio.create_task(self.stylesheets.collect(url, parsed.soup))
+
+    def _capture_covers(
+        self,
+        design_context: Dict,
+        screenshots: Dict[str, Screenshot],
+        full_page: bool,
+        fast_path: bool,
+        with_screenshots: bool,
+    ) -> bool:
+        """Whether a cached capture has everything this request asked for"""
+        if full_page and "full_page" not in screenshots:
+            return False
+        if with_screenshots and not screenshots:
+            return False
+        # Only requests that opted into the fast path accept a static capture
+        return fast_path or design_context.get("capture_path", "browser") == "browser"
+
+    async def _capture_static(
+        self, url: str, use_cache: bool = True
+    ) -> Tuple[Dict, Dict, Optional[ParsedPage]]:
+        """Design context from the page's server HTML, or {} when it needs a browser
+
+        Returns (design_context, render_check, parsed_page).
+        """
+        try:
+            with span("static_fetch"):
+                body, _ = await self.stylesheets.fetch(
+                    str(url), "text/html", truncate=True, use_cache=use_cache
+                )
+        except Exception as e:
+            logger.info(f"Static fetch of {url} failed, using the browser: {e}")
+            return {}, {"needs_rendering": True, "reasons": [f"fetch failed: {e}"]}, None
+
+        html = body.decode("utf-8", "replace")
+        parsed = await self.executor.run_cpu(self.html_parser.parse, html)
+        check = check_rendering(
+            parsed.soup,
+            html,
+            truncated=len(body) >= self.stylesheets.max_bytes,
+            min_text=settings.static_min_text,
+            min_density=settings.static_min_text_density,
+        )
+        if check.needs_rendering:
+            logger.info(f"{url} needs rendering: {', '.join(check.reasons)}")
+            return {}, check.summary(), None
+
+        design_context = await self.executor.run_cpu(analyze_design_context, parsed.soup, str(url))
+        return design_context, check.summary(), parsed
+
+    async def _session_screenshots(
+        self, url: str, session: CaptureSession, full_page: bool
+    ) -> Dict[str, Screenshot]:
+        screenshots = await self.capture_multiple_screenshots(url, session)
+        if full_page and not session.abandoned:
+            screenshots.update(await self._capture_full_page(session))
+        return screenshots
+
+    async def capture_multiple_screenshots(
+        self, url: str, session: Optional[CaptureSession] = None
+    ) -> Dict[str, Screenshot]:
+        """Capture multiple screenshots at different viewport sizes"""
+        try:
+            if session is not None:
+                return await self._capture_viewports(session, VIEWPORTS)
+
+            async with self.capture_session(url) as session:
+                return await self._capture_viewports(session, VIEWPORTS)
 
         except Exception as e:
             logger.error(f"Screenshot capture failed: {e}")
             return {}
 
-    async def extract_comprehensive_dom(self, url: str) -> Dict:
-        """Enhanced DOM extraction with more detailed analysis"""
-        try:
-            options = self.get_chrome_options()
-            driver = webdriver.Chrome(options=options)
-            driver.get(str(url))
-            time.sleep(8)
-
-            js_analysis = driver.execute_script(
-                """
-                return {
-                    viewportWidth: window.innerWidth,
-                    viewportHeight: window.innerHeight,
-                    scrollHeight: document.body.scrollHeight,
-                    documentHeight: document.documentElement.scrollHeight,
-                    hasFixedElements: Array.from(document.querySelectorAll('*')).some(el => 
-                        getComputedStyle(el).position === 'fixed'),
-                    computedStyles: Array.from(document.querySelectorAll('*')).slice(0, 50).map(el => ({
-                        tag: el.tagName.toLowerCase(),
-                        className: el.className,
-                        computedStyle: {
-                            display: getComputedStyle(el).display,
-                            position: getComputedStyle(el).position,
-                            backgroundColor: getComputedStyle(el).backgroundColor,
-                            color: getComputedStyle(el).color,
-                            fontSize: getComputedStyle(el).fontSize,
-                            fontFamily: getComputedStyle(el).fontFamily,
-                            margin: getComputedStyle(el).margin,
-                            padding: getComputedStyle(el).padding,
-                            border: getComputedStyle(el).border,
-                            borderRadius: getComputedStyle(el).borderRadius
-                        }
-                    }))
-                };
-            """
+    async def _capture_viewports(
+        self, session: CaptureSession, viewports: Dict[str, Tuple[int, int]]
+    ) -> Dict[str, Screenshot]:
+        """Viewports captured concurrently, each within the capture timeout
+
+        The first viewport uses the already loaded session. Up to
+        viewport_parallelism - 1 others load the page on spare pooled browsers
+        at the same time; any that find no spare browser fall back to the
+        session once its own captures are done. A capture that times out is
+        left out of the result instead of holding up the others.
+        """
+        names = list(viewports)
+        lanes = max(1, min(settings.viewport_parallelism, len(names)))
+        spare = {
+            name: asyncio.create_task(
+                self._bounded_capture(
+                    name, self._capture_on_spare_browser, session, name, *viewports[name]
+                )
             )
+            for name in names[1:lanes]
+        }
 
-            rendered_html = driver.page_source
-            driver.quit()
+        screenshots: Dict[str, Screenshot] = {}
+        usable = await self._capture_on_session(
+            session, [name for name in names if name not in spare], viewports, screenshots
+        )
+        for name, task in spare.items():
+            try:
+                screenshot = await task
+            except Exception as e:
+                if not isinstance(e, asyncio.TimeoutError):
+                    logger.error(f"{name} capture on a spare browser failed: {e}")
+                continue
+            if screenshot is not None:
+                screenshots[name] = screenshot
+            elif usable:
+                usable = await self._capture_on_session(
+                    session, [name], viewports, screenshots
+                )
 
-            soup = BeautifulSoup(rendered_html, "html.parser")
+        return {name: screenshots[name] for name in names if name in screenshots}
 
-            dom_info = {
-                "basic_info": {
-                    "title": soup.title.string if soup.title else "",
-                    "meta_description": self._get_meta_description(soup),
-                    "lang": soup.html.get("lang") if soup.html else "en",
-                },
-                "layout_analysis": self._analyze_layout_comprehensive(soup),
-                "content_sections": self._extract_content_sections(soup),
-                "navigation_structure": self._extract_navigation_detailed(soup),
-                "visual_elements": self._extract_visual_elements(soup, str(url)),
-                "typography_system": self._analyze_typography_system(soup),
-                "color_analysis": self._analyze_colors_comprehensive(soup),
-                "responsive_indicators": self._detect_responsive_patterns(soup),
-                "js_analysis": js_analysis,
-                "form_elements": self._extract_forms(soup),
-                "interactive_elements": self._extract_interactive_elements(soup),
+    async def _capture_full_page(self, session: CaptureSession) -> Dict[str, Screenshot]:
+        width, height = VIEWPORTS["desktop"]
+        try:
+            screenshot = await self._bounded_capture(
+                "full_page",
+                session.full_page_screenshot,
+                width,
+                height,
+                settings.section_screenshot_max_height,
+            )
+        except asyncio.TimeoutError:
+            session.abandoned = True
+            return {}
+        except WebDriverException as e:
+            logger.error(f"Full page capture failed: {e}")
+            return {}
+        return {"full_page": screenshot}
+
+    async def _capture_on_session(
+        self,
+        session: CaptureSession,
+        names: List[str],
+        viewports: Dict[str, Tuple[int, int]],
+        screenshots: Dict[str, Screenshot],
+    ) -> bool:
+        """Capture viewports one after another; False once the session is stuck"""
+        for index, name in enumerate(names):
+            try:
+                screenshots[name] = await self._bounded_capture(
+                    name, session.viewport_screenshot, name, *viewports[name]
+                )
+            except asyncio.TimeoutError:
+                # The driver is still busy with the hung capture; recycle it afterwards
+                session.abandoned = True
+                if names[index + 1:]:
+                    logger.warning(f"Skipping {names[index + 1:]} on the stuck session")
+                return False
+        return True
+
+    async def _bounded_capture(self, name: str, fn, *args):
+        timeout = settings.viewport_capture_timeout
+        try:
+            return await asyncio.wait_for(
+                self.executor.run_browser(fn, *args), timeout=timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"{name} viewport capture timed out after {timeout}s, skipping it")
+            raise
+
+    def _capture_on_spare_browser(
+        self, session: CaptureSession, name: str, width: int, height: int
+    ) -> Optional[Screenshot]:
+        """Load the page on another pooled browser and capture one viewport
+
+        Returns None when no spare browser is free. The driver is released
+        here, on the worker thread, so it comes back even if the caller gave up.
+        """
+        pooled = self.browser_pool.try_acquire()
+        if pooled is None:
+            return None
+
+        healthy = True
+        lane = CaptureSession(
+            pooled.driver,
+            session.url,
+            self.readiness,
+            session.load_options,
+            session.resize_options,
+            html_parser=self.html_parser,
+            resources=session.resources,
+        )
+        try:
+            lane.open()
+            screenshot = lane.viewport_screenshot(name, width, height)
+            waited = lane.wait_summary()
+            session.waits[name] = {
+                "waited_seconds": waited["total_seconds"],
+                "timed_out": waited["timed_out"],
+                "signals": lane.waits[name]["signals"],
             }
+            return screenshot
+        except WebDriverException:
+            healthy = False
+            raise
+        finally:
+            if healthy:
+                try:
+                    lane.close()
+                    if lane.resource_stats is not None:
+                        session.lane_resource_stats.append(lane.resource_stats)
+                except WebDriverException:
+                    healthy = False
+            self.browser_pool.release(pooled, healthy)
+
+    async def extract_comprehensive_dom(
+        self, url: str, session: Optional[CaptureSession] = None
+    ) -> Dict:
+        """Enhanced DOM extraction with more detailed analysis"""
+        try:
+            if session is not None:
+                return await self.executor.run_browser(
+                    self._build_design_context, session, url
+                )
 
-            return dom_info
+            async with self.capture_session(url, profile="extraction") as session:
+                return await self.executor.run_browser(
+                    self._build_design_context, session, url
+                )
 
         except Exception as e:
             logger.error(f"Enhanced DOM extraction failed: {e}")
             return {}
 
-    def _analyze_layout_comprehensive(self, soup):
-        """Comprehensive layout analysis"""
-        layout = {
-            "structure_type": "unknown",
-            "header": self._analyze_header(soup),
-            "main_content": self._analyze_main_content(soup),
-            "sidebar": self._analyze_sidebar(soup),
-            "footer": self._analyze_footer(soup),
-            "grid_systems": self._detect_grid_systems(soup),
-            "container_patterns": self._analyze_containers(soup),
-        }
-
-        if soup.find_all(class_=lambda x: x and "grid" in str(x).lower()):
-            layout["structure_type"] = "grid"
-        elif soup.find_all(class_=lambda x: x and "flex" in str(x).lower()):
-            layout["structure_type"] = "flexbox"
-        elif soup.find(
-            ["aside", "div"], class_=lambda x: x and "sidebar" in str(x).lower()
-        ):
-            layout["structure_type"] = "sidebar"
-        else:
-            layout["structure_type"] = "standard"
-
-        return layout
-
-    def _extract_content_sections(self, soup):
-        """Extract and categorize content sections"""
-        sections = []
-
-        for section in soup.find_all(["section", "article", "div"], class_=True):
-            classes = " ".join(section.get("class", []))
-
-            section_data = {
-                "tag": section.name,
-                "classes": section.get("class", []),
-                "content_type": self._classify_content_type(section, classes),
-                "text_content": section.get_text(strip=True)[:300],
-                "child_elements": [
-                    child.name for child in section.find_all() if child.name
-                ][:10],
-                "has_background_image": bool(
-                    section.find(style=lambda x: x and "background-image" in str(x))
-                ),
-                "estimated_importance": self._estimate_section_importance(section),
-            }
-            sections.append(section_data)
-
-        return sections[:25]  
-
-    def _classify_content_type(self, element, classes):
-        """Classify the type of content section"""
-        text = element.get_text().lower()
-        classes_lower = classes.lower()
-
-        if any(term in classes_lower for term in ["hero", "banner", "jumbotron"]):
-            return "hero"
-        elif any(term in classes_lower for term in ["card", "feature", "service"]):
-            return "feature_card"
-        elif any(term in classes_lower for term in ["testimonial", "review"]):
-            return "testimonial"
-        elif any(term in classes_lower for term in ["contact", "form"]):
-            return "contact"
-        elif any(term in text for term in ["about", "mission", "vision"]):
-            return "about"
-        elif element.find_all(["h1", "h2", "h3"]):
-            return "content_section"
-        else:
-            return "generic"
-
-    def _analyze_typography_system(self, soup):
-        """Analyze typography patterns and hierarchy"""
-        typography = {
-            "headings": {},
-            "body_text": [],
-            "font_families": set(),
-            "font_sizes": set(),
-            "text_colors": set(),
-        }
-
-        for level in range(1, 7):
-            headings = soup.find_all(f"h{level}")
-            if headings:
-                typography["headings"][f"h{level}"] = []
-                for heading in headings[:3]:
-                    typography["headings"][f"h{level}"].append(
-                        {
-                            "text": heading.get_text(strip=True),
-                            "classes": heading.get("class", []),
-                            "style": heading.get("style", ""),
-                        }
-                    )
-
-        return typography
-
-    def _analyze_colors_comprehensive(self, soup):
-        """Comprehensive color analysis"""
-        colors = {
-            "background_colors": [],
-            "text_colors": [],
-            "border_colors": [],
-            "dominant_palette": [],
-        }
-
-        for elem in soup.find_all(style=True):
-            style = elem.get("style", "")
-
-            bg_match = re.search(r"background-color:\s*([^;]+)", style)
-            if bg_match:
-                colors["background_colors"].append(bg_match.group(1).strip())
+    def _build_design_context(self, session: CaptureSession, url: str) -> Dict:
+        js_analysis = session.js_analysis()
+        soup = session.document().soup
 
-            color_match = re.search(r"(?<![a-z])color:\s*([^;]+)", style)
-            if color_match:
-                colors["text_colors"].append(color_match.group(1).strip())
+        # One walk over the tree feeds every layout, content and style collector
+        dom_info = analyze_design_context(soup, str(url), js_analysis)
 
-        return colors
+        return dom_info
 
     async def generate_layout_structure(
-        self, design_context: Dict, screenshot_b64: Optional[str] = None
+        self, design_context: Dict, screenshot: Optional[Screenshot] = None
     ) -> str:
         """First pass: Generate overall layout structure"""
         try:
+            context = self.prompt_budget.render(
+                "structure", {"layout_analysis": design_context["layout_analysis"]}
+            )
             prompt = f"""
             You are a senior frontend architect. Recreate the full page structure as seen in the REFERENCE SCREENSHOT and described in the DESIGN CONTEXT.
 
@@ -271,31 +635,29 @@ class EnchancedWebsiteScraper:
 
             REFERENCE SCREENSHOT: (see attached image)  
             DESIGN CONTEXT:
-            {json.dumps(design_context['layout_analysis'], indent=2)}
+            {context['layout_analysis']}
 
             Your output **must** be a single valid `<!DOCTYPE html>...` document, wrapped in a single `html` code block.  
             Do not include any extra explanation or comments.
             """
 
             content_parts = [prompt]
-            if screenshot_b64:
-                import io
-                import base64
-                from PIL import Image
-
-                image_data = base64.b64decode(screenshot_b64)
-                image = Image.open(io.BytesIO(image_data))
-                content_parts.extend(["\n\nScreenshot for reference:", image])
+            content_parts.extend(
+                await self._screenshot_parts("\n\nScreenshot for reference:", screenshot)
+            )
 
-            response = self.gemini_model.generate_content(
+            response_text = await self.llm.generate(
+                self.models.model_for("structure"),
+                "structure",
                 content_parts,
-                generation_config=genai.types.GenerationConfig(
+                generation_config=self.models.config_for(
+                    "structure",
                     temperature=0.3,
                     max_output_tokens=4096,
                 ),
             )
 
-            return self._extract_html(response.text)
+            return self._extract_html(response_text)
 
         except Exception as e:
             logger.error(f"Structure generation failed: {e}")
@@ -304,17 +666,20 @@ class EnchancedWebsiteScraper:
             )
 
     async def generate_detailed_styling(
-        self, base_html: str, design_context: Dict, screenshot_b64: Optional[str] = None
+        self, base_html: str, design_context: Dict, screenshot: Optional[Screenshot] = None
     ) -> str:
         """Second pass: Add detailed styling and visual elements"""
         try:
 
-            def convert_sets(obj):
-                if isinstance(obj, set):
-                    return list(obj)
-                raise TypeError(
-                    f"Object of type {type(obj).__name__} is not JSON serializable"
-                )
+            context = self.prompt_budget.render(
+                "styling",
+                {
+                    "typography_system": design_context.get("typography_system", {}),
+                    "color_analysis": design_context.get("color_analysis", {}),
+                    "visual_elements": design_context.get("visual_elements", {}),
+                },
+                fixed=base_html,
+            )
 
             prompt = f"""
             You are a top-tier UI/UX designer and frontend developer. Enhance the following HTML by **adding full CSS styling** to match the look and feel of the REFERENCE SCREENSHOT.
@@ -326,9 +691,9 @@ class EnchancedWebsiteScraper:
 
             REFERENCE SCREENSHOT: (see attached image)  
             VISUAL DESIGN CONTEXT:
-            Typography: {json.dumps(design_context.get('typography_system', {}), indent=2, default=convert_sets)}
-            Colors: {json.dumps(design_context.get('color_analysis', {}), indent=2, default=convert_sets)}
-            Visual Elements: {json.dumps(design_context.get('visual_elements', {}), indent=2, default=convert_sets)}
+            Typography: {context['typography_system']}
+            Colors (value: occurrences): {context['color_analysis']}
+            Visual Elements: {context['visual_elements']}
 
             HTML TO STYLE:
             ```html
@@ -336,24 +701,22 @@ class EnchancedWebsiteScraper:
             """
 
             content_parts = [prompt]
-            if screenshot_b64:
-                import io
-                import base64
-                from PIL import Image
-
-                image_data = base64.b64decode(screenshot_b64)
-                image = Image.open(io.BytesIO(image_data))
-                content_parts.extend(["\n\nScreenshot for styling reference:", image])
+            content_parts.extend(
+                await self._screenshot_parts("\n\nScreenshot for styling reference:", screenshot)
+            )
 
-            response = self.gemini_model.generate_content(
+            response_text = await self.llm.generate(
+                self.models.model_for("styling"),
+                "styling",
                 content_parts,
-                generation_config=genai.types.GenerationConfig(
+                generation_config=self.models.config_for(
+                    "styling",
                     temperature=0.7,
                     max_output_tokens=6144,
                 ),
             )
 
-            return self._extract_html(response.text)
+            return self._extract_html(response_text)
 
         except Exception as e:
             logger.error(f"Styling generation failed: {e}")
@@ -364,6 +727,15 @@ class EnchancedWebsiteScraper:
     ) -> str:
         """Third pass: Add real content and interactive elements"""
         try:
+            context = self.prompt_budget.render(
+                "content",
+                {
+                    "content_sections": design_context.get("content_sections", []),
+                    "navigation_structure": design_context.get("navigation_structure", []),
+                    "interactive_elements": design_context.get("interactive_elements", {}),
+                },
+                fixed=styled_html,
+            )
             prompt = f"""
             You are a frontend engineer and content strategist. Take this styled HTML and inject the real content and JS interactivity.
 
@@ -373,9 +745,9 @@ class EnchancedWebsiteScraper:
             {styled_html}
             
             CONTENT DATA:
-            Content Sections: {json.dumps(design_context.get('content_sections', {}), indent=2)}
-            Navigation: {json.dumps(design_context.get('navigation_structure', {}), indent=2)}
-            Interactive Elements: {json.dumps(design_context.get('interactive_elements', {}), indent=2)}
+            Content Sections (in page order): {context['content_sections']}
+            Navigation: {context['navigation_structure']}
+            Interactive Elements: {context['interactive_elements']}
             
             ENHANCE WITH:
             1. Replace placeholder content with real extracted content
@@ -388,45 +760,68 @@ class EnchancedWebsiteScraper:
             Output the complete, functional HTML file.
             """
 
-            response = self.gemini_model.generate_content(
+            response_text = await self.llm.generate(
+                self.models.model_for("content"),
+                "content",
                 prompt,
-                generation_config=genai.types.GenerationConfig(
+                generation_config=self.models.config_for(
+                    "content",
                     temperature=0.4,
                     max_output_tokens=8192,
                 ),
             )
 
-            return self._extract_html(response.text)
+            return self._extract_html(response_text)
 
         except Exception as e:
             logger.error(f"Content generation failed: {e}")
             return styled_html  # Return styled HTML if content addition fails
 
-    async def generate_clone_html_multistage(
-        self, design_context: Dict, screenshots: Dict[str, str] = None
-    ) -> str:
-        """Multi-stage HTML generation process"""
-        try:
-            logger.info("Starting multi-stage HTML generation...")
+    async def iter_clone_html_multistage(
+        self, design_context: Dict, screenshots: Dict[str, Screenshot] = None
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """Multi-stage HTML generation, yielding (stage, html) as each pass finishes"""
+        logger.info("Starting multi-stage HTML generation...")
+
+        # Stage 1: Structure
+        logger.info("Stage 1: Generating layout structure...")
+        screenshot = screenshots.get("desktop") if screenshots else None
+        structure_html = await self.generate_layout_structure(
+            design_context, screenshot
+        )
+        yield "structure", structure_html
 
-            # Stage 1: Structure
-            logger.info("Stage 1: Generating layout structure...")
-            screenshot = screenshots.get("desktop") if screenshots else None
-            structure_html = await self.generate_layout_structure(
-                design_context, screenshot
-            )
+        # Stage 2: Styling
+        logger.info("Stage 2: Adding detailed styling...")
+        styled_html = await self.generate_detailed_styling(
+            structure_html, design_context, screenshot
+        )
+        yield "styled", styled_html
 
-            # Stage 2: Styling
-            logger.info("Stage 2: Adding detailed styling...")
-            styled_html = await self.generate_detailed_styling(
-                structure_html, design_context, screenshot
-            )
+        # Stage 3: Content and Interactivity
+        logger.info("Stage 3: Adding content and interactivity...")
+        final_html = await self.generate_content_and_interactivity(
+            styled_html, design_context
+        )
+        yield "final", final_html
 
-            # Stage 3: Content and Interactivity
-            logger.info("Stage 3: Adding content and interactivity...")
-            final_html = await self.generate_content_and_interactivity(
-                styled_html, design_context
-            )
+    async def generate_clone_html_multistage(
+        self,
+        design_context: Dict,
+        screenshots: Dict[str, Screenshot] = None,
+        stages: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """Multi-stage HTML generation process
+
+        Each stage's output is added to `stages` when given.
+        """
+        try:
+            final_html = None
+            async for stage, final_html in self.iter_clone_html_multistage(
+                design_context, screenshots
+            ):
+                if stages is not None:
+                    stages[stage] = final_html
 
             return final_html
 
@@ -436,152 +831,505 @@ class EnchancedWebsiteScraper:
                 status_code=500, detail=f"Multi-stage generation failed: {str(e)}"
             )
 
-    def _extract_html(self, response_text: str) -> str:
-        """Extract HTML from AI response"""
-        if "```html" in response_text:
-            return response_text.split("```html")[1].split("```")[0].strip()
-        elif "<html" in response_text:
-            start = response_text.find("<html")
-            end = response_text.rfind("</html>") + 7
-            if end > 6:
-                return response_text[start:end].strip()
-        return response_text.strip()
+    async def generate_clone_html_hedged(
+        self,
+        design_context: Dict,
+        screenshots: Dict[str, Screenshot] = None,
+        delay: float = 20,
+        grace: float = 10,
+        stages: Optional[Dict[str, str]] = None,
+    ) -> Tuple[str, Dict]:
+        """Race multi-stage against single-pass generation on the same context
+
+        Single-pass starts once multi-stage has run for `delay` seconds. The first
+        valid document wins, except that a single-pass win waits up to `grace`
+        seconds for multi-stage, which is preferred. The loser is cancelled.
+        Multi-stage outputs are copied into `stages` only when it wins.
+        Returns (html, hedge_info) where hedge_info names the winner.
+        """
+        started = time.monotonic()
+        screenshot = screenshots.get("desktop") if screenshots else None
+        info = {"winner": None, "single_pass_started_after": None, "seconds": None}
+        # A cancelled multi-stage run leaves partial outputs that belong to no clone
+        multistage_stages: Dict[str, str] = {}
+        multistage = asyncio.create_task(
+            self.generate_clone_html_multistage(design_context, screenshots, multistage_stages)
+        )
+        tasks = {multistage: "multi-stage"}
 
-    # Add the missing helper methods
-    def _get_meta_description(self, soup):
-        meta_desc = soup.find("meta", attrs={"name": "description"})
-        return meta_desc.get("content", "") if meta_desc else ""
+        def start_single_pass():
+            single = asyncio.create_task(
+                self.generate_clone_html_single_pass(design_context, screenshot)
+            )
+            tasks[single] = "single-pass"
+            pending.add(single)
+            info["single_pass_started_after"] = round(time.monotonic() - started, 3)
+
+        def valid(task: asyncio.Task) -> bool:
+            if task.cancelled() or task.exception() is not None:
+                return False
+            html = task.result()
+            return bool(html) and "<html" in html.lower()
+
+        winner = None
+        pending = {multistage}
+        try:
+            while pending and winner is None:
+                hedged = len(tasks) > 1
+                timeout = None if hedged else max(0.0, delay - (time.monotonic() - started))
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    logger.info(f"Multi-stage still running after {delay}s, hedging with single-pass")
+                    start_single_pass()
+                    continue
+
+                # Check multi-stage first when both finish in the same step
+                for task in sorted(done, key=lambda t: tasks[t] != "multi-stage"):
+                    if not valid(task):
+                        logger.warning(f"Hedged {tasks[task]} generation produced no valid HTML")
+                        if task is multistage and not hedged:
+                            start_single_pass()
+                        continue
+                    winner = task
+                    break
+
+            if winner is not None and winner is not multistage and not multistage.done():
+                # Single-pass won; multi-stage is still preferred within the grace window
+                await asyncio.wait({multistage}, timeout=grace)
+                if multistage.done() and valid(multistage):
+                    winner = multistage
+        finally:
+            for task in tasks:
+                if task is not winner:
+                    task.cancel()
+
+        info["winner"] = tasks[winner] if winner is not None else None
+        if winner is multistage and stages is not None:
+            stages.update(multistage_stages)
+        info["seconds"] = round(time.monotonic() - started, 3)
+        logger.info(f"Hedged generation finished: {info}")
+        return (winner.result() if winner is not None else ""), info
+
+    async def generate_page_skeleton(
+        self,
+        design_context: Dict,
+        css: str,
+        content: str = "the content sections",
+        screenshot: Optional[Screenshot] = None,
+    ) -> str:
+        """Document shell with header, navigation and footer, leaving the content to others"""
+        context = self.prompt_budget.render(
+            "skeleton",
+            {
+                "layout_analysis": design_context.get("layout_analysis", {}),
+                "navigation_structure": design_context.get("navigation_structure", []),
+                "basic_info": design_context.get("basic_info", {}),
+            },
+            fixed=css,
+        )
+        prompt = f"""
+            You are a frontend developer building the page shell of a website clone. Other developers are building {content} at the same time; it will be inserted later.
+
+            - Output a complete `<!DOCTYPE html>` document with <head> (title, meta viewport) and <body>.
+            - Build the header, navigation and footer to match the REFERENCE SCREENSHOT and the navigation data.
+            - Between header and footer put exactly `<main id="{SECTIONS_CONTAINER_ID}"></main>` and leave it empty.
+            - Put your CSS in one <style> block and only style the header, navigation and footer. Use the shared CSS variables below for fonts and colors.
 
-    def _analyze_header(self, soup):
-        header = soup.find("header") or soup.find(
-            "div", class_=lambda x: x and "header" in str(x).lower()
+            SHARED CSS (already on the page):
+            {css}
+
+            PAGE INFO: {context['basic_info']}
+            LAYOUT: {context['layout_analysis']}
+            NAVIGATION: {context['navigation_structure']}
+
+            Wrap the document in a single ```html code block, with no explanation.
+            """
+
+        content_parts = [prompt]
+        content_parts.extend(
+            await self._screenshot_parts("\n\nScreenshot for reference:", screenshot)
         )
-        return {
-            "exists": bool(header),
-            "content": header.get_text(strip=True)[:200] if header else "",
-        }
+        response_text = await self.llm.generate(
+            self.models.model_for("skeleton"),
+            "skeleton",
+            content_parts,
+            generation_config=self.models.config_for(
+                "skeleton",
+                temperature=0.3,
+                max_output_tokens=4096,
+            ),
+        )
+        return self._extract_html(response_text)
+
+    async def generate_page_section(
+        self,
+        design_context: Dict,
+        planned: PlannedSection,
+        position: int,
+        total: int,
+        css: str,
+        screenshot: Optional[Screenshot] = None,
+    ) -> str:
+        """One content section as a self-contained fragment with CSS scoped to its id"""
+        context = self.prompt_budget.render(
+            "section", {"content_sections": [planned.section]}, fixed=css
+        )
+        prompt = f"""
+            You are a frontend developer rebuilding one section of a website. Other developers are building the rest of the page at the same time, and everything will be combined into one document.
+
+            - Output one `<style>` block followed by one `<section id="{planned.element_id}" class="clone-section">` element. Nothing else: no <html>, <head> or <body>.
+            - Prefix every CSS selector with `#{planned.element_id}` so it only affects this section. Do not style html, body or other sections.
+            - Use the shared CSS variables below for fonts and colors.
+            - Match the layout and look of the SECTION SCREENSHOT and use the real text from SECTION CONTENT.
+            - The section must be responsive for mobile, tablet and desktop.
+
+            SHARED CSS (already on the page):
+            {css}
 
-    def _analyze_main_content(self, soup):
-        main = soup.find("main") or soup.find(
-            "div", class_=lambda x: x and "main" in str(x).lower()
+            SECTION CONTENT (section {position} of {total}, in page order):
+            {context['content_sections']}
+
+            Wrap the output in a single ```html code block, with no explanation.
+            """
+
+        content_parts = [prompt]
+        content_parts.extend(
+            await self._screenshot_parts("\n\nSection screenshot:", screenshot)
+        )
+        response_text = await self.llm.generate(
+            self.models.model_for("section"),
+            "section",
+            content_parts,
+            generation_config=self.models.config_for(
+                "section",
+                temperature=0.4,
+                max_output_tokens=4096,
+            ),
+        )
+        return self._extract_html(response_text)
+
+    async def generate_clone_html_sections(
+        self,
+        design_context: Dict,
+        screenshots: Dict[str, Screenshot] = None,
+        stages: Optional[Dict[str, str]] = None,
+    ) -> Tuple[str, Dict]:
+        """Skeleton and content sections generated concurrently, then stitched
+
+        The page is split into at most section_max non-overlapping sections,
+        each generated from its own content and its crop of the full page
+        screenshot, alongside a skeleton holding header, navigation and
+        footer. All calls share the gateway's concurrency limit, so with
+        enough slots the wall-clock time is that of the slowest call. A
+        section that fails is replaced by its plain text. Pages with fewer
+        than two sections use multi-stage generation instead. The skeleton
+        and every generated section are added to `stages` when given.
+        Returns (html, sections_info).
+        """
+        started = time.monotonic()
+        screenshots = screenshots or {}
+        plan = plan_sections(design_context, settings.section_max)
+        if len(plan) < 2:
+            logger.info(f"Only {len(plan)} section(s) found, using multi-stage generation")
+            html = await self.generate_clone_html_multistage(
+                design_context, screenshots, stages
+            )
+            return html, {"fallback": "multi-stage", "sections": []}
+
+        css = shared_css(design_context)
+        viewport_width = (design_context.get("js_analysis") or {}).get("viewportWidth") or 0
+        full_page = screenshots.get("full_page")
+        crops = await asyncio.to_thread(section_crops, full_page, plan, viewport_width)
+        logger.info(
+            f"Generating skeleton and {len(plan)} sections concurrently "
+            f"({sum(crop is not None for crop in crops)} with screenshot crops)"
         )
-        return {
-            "exists": bool(main),
-            "sections": len(main.find_all(["section", "div"])) if main else 0,
-        }
 
-    def _analyze_sidebar(self, soup):
-        sidebar = soup.find("aside") or soup.find(
-            "div", class_=lambda x: x and "sidebar" in str(x).lower()
+        timings: List[float] = []
+
+        async def timed(coroutine):
+            start = time.monotonic()
+            try:
+                return await coroutine
+            finally:
+                timings.append(round(time.monotonic() - start, 3))
+
+        results = await asyncio.gather(
+            self.generate_page_skeleton(
+                design_context,
+                css,
+                f"the {len(plan)} content sections",
+                screenshots.get("desktop"),
+            ),
+            *(
+                timed(
+                    self.generate_page_section(
+                        design_context, planned, position, len(plan), css, crop
+                    )
+                )
+                for position, (planned, crop) in enumerate(zip(plan, crops), start=1)
+            ),
+            return_exceptions=True,
         )
-        return {"exists": bool(sidebar)}
 
-    def _analyze_footer(self, soup):
-        footer = soup.find("footer") or soup.find(
-            "div", class_=lambda x: x and "footer" in str(x).lower()
+        skeleton, section_results = results[0], results[1:]
+        if isinstance(skeleton, BaseException):
+            logger.error(f"Skeleton generation failed: {skeleton}")
+            skeleton = ""
+        fragments = []
+        sections_info = []
+        for planned, result in zip(plan, section_results):
+            failed = isinstance(result, BaseException) or not result
+            if failed:
+                logger.warning(f"Section {planned.element_id} generation failed: {result}")
+            fragments.append(placeholder_section(planned) if failed else result)
+            sections_info.append({**planned.summary(), "generated": not failed})
+            if stages is not None and not failed:
+                stages[f"section-{planned.element_id}"] = result
+        if stages is not None and skeleton:
+            stages["skeleton"] = skeleton
+
+        html = await asyncio.to_thread(stitch, skeleton, fragments, css)
+        info = {
+            "sections": sections_info,
+            "skeleton_generated": bool(skeleton),
+            "slowest_section_seconds": max(timings) if timings else None,
+            "seconds": round(time.monotonic() - started, 3),
+        }
+        logger.info(
+            f"Section generation finished in {info['seconds']}s "
+            f"(slowest section {info['slowest_section_seconds']}s)"
         )
+        return html, info
+
+    async def store_artifacts(
+        self,
+        html: str,
+        stages: Optional[Dict[str, str]] = None,
+        screenshots: Optional[Dict[str, Screenshot]] = None,
+    ) -> Optional[Dict]:
+        """Persist a clone's document, stage outputs and screenshots
+
+        Returns their artifact ids, or None when the store is disabled or
+        the write failed; a clone is not failed for want of storage.
+        """
+        if self.artifacts is None:
+            return None
+        try:
+            with span("artifacts"):
+                return await asyncio.to_thread(
+                    self._store_artifacts, html, stages or {}, screenshots or {}
+                )
+        except OSError as e:
+            logger.error(f"Storing clone artifacts failed: {e}")
+            return None
+
+    def _store_artifacts(
+        self, html: str, stages: Dict[str, str], screenshots: Dict[str, Screenshot]
+    ) -> Dict:
+        html_type = "text/html; charset=utf-8"
         return {
-            "exists": bool(footer),
-            "content": footer.get_text(strip=True)[:200] if footer else "",
+            "html": self.artifacts.put(html.encode(), html_type, "html").id,
+            "stages": {
+                stage: self.artifacts.put(output.encode(), html_type, "stage").id
+                for stage, output in stages.items()
+                if output
+            },
+            "screenshots": {
+                name: self.artifacts.put(screenshot.png, "image/png", "screenshot").id
+                for name, screenshot in screenshots.items()
+            },
         }
 
-    def _detect_grid_systems(self, soup):
-        grid_elements = soup.find_all(
-            class_=lambda x: x
-            and any(term in str(x).lower() for term in ["grid", "col", "row"])
+    async def generate_page_body(
+        self,
+        design_context: Dict,
+        css: str,
+        slug: str,
+        screenshot: Optional[Screenshot] = None,
+    ) -> str:
+        """The content of one page of a site clone, styled on top of the shared stylesheet"""
+        context = self.prompt_budget.render(
+            "page",
+            {
+                "content_sections": page_sections(design_context),
+                "visual_elements": design_context.get("visual_elements", {}),
+            },
+            fixed=css,
         )
-        return {
-            "count": len(grid_elements),
-            "classes": [" ".join(el.get("class", [])) for el in grid_elements[:5]],
-        }
+        prompt = f"""
+            You are a frontend developer cloning one page of a website. The header, navigation, footer and base styles are shared by every page and already exist; you only build this page's main content.
 
-    def _analyze_containers(self, soup):
-        containers = soup.find_all(class_=lambda x: x and "container" in str(x).lower())
-        return {"count": len(containers)}
-
-    def _extract_navigation_detailed(self, soup):
-        nav_elements = soup.find_all(
-            ["nav", "div"], class_=lambda x: x and "nav" in str(x).lower()
-        )
-        navigation = []
-        for nav in nav_elements[:3]:
-            links = [
-                {"text": a.get_text(strip=True), "href": a.get("href", "")}
-                for a in nav.find_all("a")[:10]
-            ]
-            navigation.append({"classes": nav.get("class", []), "links": links})
-        return navigation
-
-    def _extract_visual_elements(self, soup, base_url):
-        images = []
-        for img in soup.find_all("img")[:10]:
-            images.append(
-                {
-                    "src": urljoin(base_url, img.get("src", "")),
-                    "alt": img.get("alt", ""),
-                    "classes": img.get("class", []),
-                }
-            )
-        return {"images": images}
-
-    def _detect_responsive_patterns(self, soup):
-        responsive_classes = soup.find_all(
-            class_=lambda x: x
-            and any(
-                term in str(x).lower()
-                for term in [
-                    "responsive",
-                    "mobile",
-                    "tablet",
-                    "desktop",
-                    "sm",
-                    "md",
-                    "lg",
-                    "xl",
-                ]
-            )
+            - Output one `<style>` block followed by the content markup. No <html>, <head>, <body>, header, navigation or footer.
+            - Prefix every CSS selector with `body[data-page="{slug}"]` so it only affects this page.
+            - Use the shared CSS variables below for fonts and colors.
+            - Match the look of the PAGE SCREENSHOT and use the real text from PAGE CONTENT.
+
+            SHARED CSS (already on every page):
+            {css}
+
+            PAGE CONTENT (in page order): {context['content_sections']}
+            IMAGES: {context['visual_elements']}
+
+            Wrap the output in a single ```html code block, with no explanation.
+            """
+
+        content_parts = [prompt]
+        content_parts.extend(
+            await self._screenshot_parts("\n\nPage screenshot:", screenshot)
         )
-        return {"count": len(responsive_classes)}
-
-    def _extract_forms(self, soup):
-        forms = []
-        for form in soup.find_all("form")[:3]:
-            inputs = [
-                {"type": inp.get("type", ""), "name": inp.get("name", "")}
-                for inp in form.find_all("input")
-            ]
-            forms.append({"action": form.get("action", ""), "inputs": inputs})
-        return forms
-
-    def _extract_interactive_elements(self, soup):
-        interactive = {
-            "buttons": len(soup.find_all("button")),
-            "links": len(soup.find_all("a")),
-            "modals": len(
-                soup.find_all(class_=lambda x: x and "modal" in str(x).lower())
+        response_text = await self.llm.generate(
+            self.models.model_for("page"),
+            "page",
+            content_parts,
+            generation_config=self.models.config_for(
+                "page",
+                temperature=0.4,
+                max_output_tokens=8192,
             ),
-            "dropdowns": len(
-                soup.find_all(class_=lambda x: x and "dropdown" in str(x).lower())
+        )
+        return self._extract_html(response_text)
+
+    async def clone_site(
+        self,
+        url: str,
+        max_pages: int,
+        readiness: Optional[Dict] = None,
+        use_cache: bool = True,
+    ) -> Tuple[List[Dict], str, Dict]:
+        """Clone up to max_pages pages of a site around one shared design system
+
+        Pages are the root plus same-origin links from its navigation. The
+        header, navigation, footer and design tokens are generated once from
+        the root page; each page then only gets its own content generated,
+        all at once. At most BROWSER_POOL_SIZE pages are captured at a time.
+        Every page links the same stylesheet, which holds the shared rules
+        followed by each page's scoped rules.
+        Returns (pages, stylesheet, site_info).
+        """
+        started = time.monotonic()
+        design_context, screenshots, capture_info = await self.capture_page(
+            url, readiness, use_cache
+        )
+        if not design_context:
+            raise HTTPException(status_code=400, detail="Failed to extract website data")
+
+        urls = discover_pages(str(url), design_context, max_pages)
+        logger.info(f"Site clone of {url}: {len(urls)} pages {urls}")
+        # Captures beyond the pool size would only queue for a driver
+        capture_slots = asyncio.Semaphore(max(1, settings.browser_pool_size))
+
+        async def capture(page: str) -> Tuple[Dict, Dict[str, Screenshot], Dict]:
+            async with capture_slots:
+                return await self.capture_page(page, readiness, use_cache)
+
+        captures = await asyncio.gather(
+            *(capture(page) for page in urls[1:]), return_exceptions=True
+        )
+
+        pages = [(urls[0], design_context, screenshots, capture_info)]
+        skipped = []
+        for page, capture in zip(urls[1:], captures):
+            if isinstance(capture, BaseException) or not capture[0]:
+                reason = capture if isinstance(capture, BaseException) else "no design context"
+                logger.warning(f"Skipping {page} in site clone: {reason}")
+                skipped.append(page)
+                continue
+            pages.append((page, *capture))
+        filenames = {page: page_filename(page, urls[0]) for page, *_ in pages}
+
+        css = shared_css(design_context)
+        results = await asyncio.gather(
+            self.generate_page_skeleton(
+                design_context, css, "the content of each page", screenshots.get("desktop")
             ),
+            *(
+                self.generate_page_body(
+                    page_context,
+                    css,
+                    page_slug(filenames[page]),
+                    page_screenshots.get("desktop"),
+                )
+                for page, page_context, page_screenshots, _ in pages
+            ),
+            return_exceptions=True,
+        )
+        shell, bodies = results[0], results[1:]
+        if isinstance(shell, BaseException) or not shell:
+            raise HTTPException(
+                status_code=500, detail=f"Site shell generation failed: {shell}"
+            )
+
+        shell_html, shell_css = split_shell(shell, urls[0], filenames)
+        stylesheet = [css, f"/* Header, navigation and footer */\n{shell_css}"]
+        cloned = []
+        for (page, page_context, _, page_info), body in zip(pages, bodies):
+            generated = not isinstance(body, BaseException) and bool(body)
+            if not generated:
+                logger.warning(f"Page content generation failed for {page}: {body}")
+                body = "".join(
+                    placeholder_section(PlannedSection(index, section))
+                    for index, section in enumerate(page_sections(page_context), start=1)
+                )
+            html, page_css = await asyncio.to_thread(
+                assemble_page,
+                shell_html,
+                body,
+                page,
+                filenames[page],
+                filenames,
+                (page_context.get("basic_info") or {}).get("title"),
+            )
+            if page_css:
+                stylesheet.append(f"/* {filenames[page]} */\n{page_css}")
+            cloned.append(
+                {
+                    "url": page,
+                    "filename": filenames[page],
+                    "html": html,
+                    "generated": generated,
+                    "cache_status": page_info["cache_status"],
+                }
+            )
+
+        info = {
+            "pages": len(cloned),
+            "skipped": skipped,
+            "llm_calls": 1 + len(pages),
+            "seconds": round(time.monotonic() - started, 3),
         }
-        return interactive
-
-    def _estimate_section_importance(self, section):
-        # Simple importance scoring based on position and content
-        score = 0
-        if section.find(["h1", "h2"]):
-            score += 3
-        if any(
-            term in " ".join(section.get("class", [])).lower()
-            for term in ["hero", "main", "primary"]
-        ):
-            score += 5
-        if len(section.get_text(strip=True)) > 100:
-            score += 2
-        return score
+        logger.info(f"Site clone of {url} finished: {info}")
+        return cloned, "\n\n".join(stylesheet), info
+
+    async def _screenshot_parts(
+        self, label: str, screenshot: Optional[Screenshot]
+    ) -> List:
+        """Prompt parts for a screenshot, encoded at the model's size off the event loop"""
+        if screenshot is None:
+            return []
+        image = await asyncio.to_thread(
+            screenshot.model_part,
+            settings.screenshot_model_max_dimension,
+            settings.screenshot_model_format,
+            settings.screenshot_model_quality,
+        )
+        return [label, image]
+
+    def _extract_html(self, response_text: str) -> str:
+        """Extract HTML from AI response"""
+        if "```html" in response_text:
+            return response_text.split("```html")[1].split("```")[0].strip()
+        elif "<html" in response_text:
+            start = response_text.find("<html")
+            end = response_text.rfind("</html>") + 7
+            if end > 6:
+                return response_text[start:end].strip()
+        return response_text.strip()
 
     async def generate_clone_html_single_pass(
-        self, design_context: Dict, screenshot_b64: Optional[str] = None
+        self, design_context: Dict, screenshot: Optional[Screenshot] = None
     ) -> str:
         """Single-pass HTML generation for fallback compatibility"""
         try:
@@ -606,7 +1354,7 @@ class EnchancedWebsiteScraper:
     Navigation: {navigation_summary}
     Key Content Sections: {key_content}
     Visual Design: {visual_summary}
-    Interactive Elements: {json.dumps(interactive_elements, indent=2)}
+    Interactive Elements: {self.prompt_budget.render("single_pass", {"interactive_elements": interactive_elements})["interactive_elements"]}
 
     REQUIREMENTS:
     1. Create a complete, responsive HTML5 document with embedded CSS and JavaScript
@@ -656,21 +1404,19 @@ class EnchancedWebsiteScraper:
     The HTML should be production-ready and visually indistinguishable from the original website."""
 
             content_parts = [prompt]
-            if screenshot_b64:
-                import io
-                import base64
-                from PIL import Image
-                
-                image_data = base64.b64decode(screenshot_b64)
-                image = Image.open(io.BytesIO(image_data))
-                content_parts.extend([
+            content_parts.extend(
+                await self._screenshot_parts(
                     "\n\nREFERENCE SCREENSHOT: Use this as the visual reference for styling, layout, and content placement:",
-                    image
-                ])
+                    screenshot,
+                )
+            )
 
-            response = self.gemini_model.generate_content(
+            response_text = await self.llm.generate(
+                self.models.model_for("single_pass"),
+                "single_pass",
                 content_parts,
-                generation_config=genai.types.GenerationConfig(
+                generation_config=self.models.config_for(
+                    "single_pass",
                     temperature=0.4,  # Lower temperature for more consistent results
                     max_output_tokens=12000,  # Increased for more detailed output
                     top_p=0.8,
@@ -678,7 +1424,7 @@ class EnchancedWebsiteScraper:
                 ),
             )
 
-            return self._extract_html(response.text)
+            return self._extract_html(response_text)
 
         except Exception as e:
             logger.error(f"Enhanced HTML generation failed: {e}")
@@ -780,12 +1526,12 @@ class EnchancedWebsiteScraper:
         return base_instruction
 
     async def generate_clone_html_iterative(
-        self, design_context: Dict, screenshot_b64: Optional[str] = None
+        self, design_context: Dict, screenshot: Optional[Screenshot] = None
     ) -> str:
         """Iterative approach: Generate, review, and refine"""
         try:
             # First pass - generate initial HTML
-            initial_html = await self.generate_clone_html_enhanced(design_context, screenshot_b64)
+            initial_html = await self.generate_clone_html_single_pass(design_context, screenshot)
             
             # Second pass - review and refine
             refinement_prompt = f"""Review and improve this HTML code for a website clone:
@@ -805,27 +1551,25 @@ class EnchancedWebsiteScraper:
     Provide the complete improved HTML with these enhancements. Focus on making it production-ready and visually stunning."""
 
             content_parts = [refinement_prompt]
-            if screenshot_b64:
-                import io
-                import base64
-                from PIL import Image
-                
-                image_data = base64.b64decode(screenshot_b64)
-                image = Image.open(io.BytesIO(image_data))
-                content_parts.extend(["\n\nTarget design reference:", image])
-
-            refined_response = self.gemini_model.generate_content(
+            content_parts.extend(
+                await self._screenshot_parts("\n\nTarget design reference:", screenshot)
+            )
+
+            refined_response_text = await self.llm.generate(
+                self.models.model_for("refine"),
+                "refine",
                 content_parts,
-                generation_config=genai.types.GenerationConfig(
+                generation_config=self.models.config_for(
+                    "refine",
                     temperature=0.3,
                     max_output_tokens=10000,
                 ),
             )
 
-            refined_html = self._extract_html(refined_response.text)
+            refined_html = self._extract_html(refined_response_text)
             return refined_html if refined_html and len(refined_html) > len(initial_html) * 0.8 else initial_html
 
         except Exception as e:
             logger.error(f"Iterative generation failed: {e}")
             # Fallback to single enhanced pass
-            return await self.generate_clone_html_enhanced(design_context, screenshot_b64)
\ No newline at end of file
+            return await self.generate_clone_html_single_pass(design_context, screenshot)
\ No newline at end of file
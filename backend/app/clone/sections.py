@@ -0,0 +1,225 @@
+# splits a page into independently generated sections and stitches the results together
+
+import html
+import logging
+from typing import Dict, List, Optional
+from bs4 import BeautifulSoup
+from app.browser.screenshot import Screenshot
+from app.llm.prompt_budget import rank_values
+
+logger = logging.getLogger(__name__)
+
+SECTIONS_CONTAINER_ID = "clone-sections"
+
+# A box taller than this share of the document is a page wrapper, not a section
+WRAPPER_SHARE = 0.6
+
+
+class PlannedSection:
+    """One content section to generate, with its page position when the browser reported it"""
+
+    def __init__(self, index: int, section: Dict, box: Optional[Dict] = None):
+        self.index = index
+        self.section = section
+        self.box = box
+
+    @property
+    def element_id(self) -> str:
+        return f"clone-section-{self.index}"
+
+    @property
+    def importance(self) -> int:
+        return self.section.get("estimated_importance", 0)
+
+    def summary(self) -> Dict:
+        return {
+            "id": self.element_id,
+            "content_type": self.section.get("content_type"),
+            "importance": self.importance,
+            "top": self.box["top"] if self.box else None,
+            "height": self.box["height"] if self.box else None,
+        }
+
+
+def _match_boxes(sections: List[Dict], boxes: List[Dict]) -> List[Optional[Dict]]:
+    """Pair each section with its browser box, matching tag and classes in document order"""
+    matched: List[Optional[Dict]] = []
+    position = 0
+    for section in sections:
+        box = None
+        for index in range(position, len(boxes)):
+            candidate = boxes[index]
+            if (
+                candidate.get("tag") == section.get("tag")
+                and candidate.get("className", "").split() == list(section.get("classes", []))
+            ):
+                box = candidate
+                position = index + 1
+                break
+        matched.append(box)
+    return matched
+
+
+def _overlaps(a: PlannedSection, b: PlannedSection) -> bool:
+    if a.box and b.box:
+        return (
+            a.box["top"] < b.box["top"] + b.box["height"]
+            and b.box["top"] < a.box["top"] + a.box["height"]
+        )
+    # Without positions, nested sections repeat each other's text
+    text_a = (a.section.get("text_content") or "")[:100]
+    text_b = (b.section.get("text_content") or "")[:100]
+    return bool(text_a and text_b) and (text_a in text_b or text_b in text_a)
+
+
+def plan_sections(design_context: Dict, max_sections: int) -> List[PlannedSection]:
+    """Non-overlapping content sections in page order, most important first when capped
+
+    Content sections nest (a wrapper div contains the hero, which contains
+    a card grid), so sections are taken by estimated importance and any that
+    overlap an already chosen one are skipped.
+    """
+    sections = design_context.get("content_sections") or []
+    js_analysis = design_context.get("js_analysis") or {}
+    boxes = _match_boxes(sections, js_analysis.get("sectionBoxes") or [])
+    document_height = js_analysis.get("documentHeight") or 0
+
+    candidates = []
+    for index, (section, box) in enumerate(zip(sections, boxes)):
+        if box is not None:
+            if box.get("height", 0) <= 0:
+                continue
+            if document_height and box["height"] >= WRAPPER_SHARE * document_height:
+                continue
+        if not section.get("text_content") and not section.get("has_background_image"):
+            continue
+        candidates.append(PlannedSection(index, section, box))
+
+    chosen: List[PlannedSection] = []
+    for candidate in sorted(candidates, key=lambda planned: (-planned.importance, planned.index)):
+        if len(chosen) >= max_sections:
+            break
+        if not any(_overlaps(candidate, other) for other in chosen):
+            chosen.append(candidate)
+
+    return sorted(
+        chosen,
+        key=lambda planned: (planned.box["top"] if planned.box else 0, planned.index),
+    )
+
+
+def section_crops(
+    full_page: Optional[Screenshot], plan: List[PlannedSection], viewport_width: int
+) -> List[Optional[Screenshot]]:
+    """For each planned section, the band of the full page screenshot showing it"""
+    if full_page is None:
+        return [None] * len(plan)
+    scale = full_page.viewport[0] / viewport_width if viewport_width else 1
+    bands = {}
+    for planned in plan:
+        if planned.box is None:
+            continue
+        top = int(planned.box["top"] * scale)
+        if top < full_page.viewport[1]:
+            bands[planned.index] = (top, int(planned.box["height"] * scale), planned.element_id)
+    crops = dict(zip(bands, full_page.crops(list(bands.values())))) if bands else {}
+    return [crops.get(planned.index) for planned in plan]
+
+
+def shared_css(design_context: Dict) -> str:
+    """Base styles and CSS variables every generated section builds on
+
+    Fonts and colors come from the largest computed styles on the page, with
+    inline style colors as a fallback. The rules sit in the lowest cascade
+    layer so anything a section or the skeleton declares wins.
+    """
+    styles = (design_context.get("js_analysis") or {}).get("computedStyles") or []
+    colors = design_context.get("color_analysis") or {}
+
+    fonts = [style["computedStyle"].get("fontFamily") for style in styles]
+    text_colors = [style["computedStyle"].get("color") for style in styles]
+    backgrounds = [
+        style["computedStyle"].get("backgroundColor")
+        for style in styles
+        if style["computedStyle"].get("backgroundColor") not in ("rgba(0, 0, 0, 0)", "transparent")
+    ]
+    text_colors += colors.get("text_colors", [])
+    backgrounds += colors.get("background_colors", [])
+
+    variables = {
+        "--clone-font": next(iter(rank_values(fonts)), "system-ui, sans-serif"),
+        "--clone-text": next(iter(rank_values(text_colors)), "#111"),
+        "--clone-background": next(iter(rank_values(backgrounds)), "#fff"),
+    }
+    palette = [
+        color
+        for color in rank_values(text_colors + backgrounds, 8)
+        if color not in variables.values()
+    ]
+    for number, color in enumerate(palette[:6], start=1):
+        variables[f"--clone-color-{number}"] = color
+
+    declarations = "\n".join(f"    {name}: {value};" for name, value in variables.items())
+    return (
+        "@layer shared {\n"
+        f"  :root {{\n{declarations}\n  }}\n"
+        "  *, *::before, *::after { box-sizing: border-box; }\n"
+        "  body { margin: 0; font-family: var(--clone-font); color: var(--clone-text);"
+        " background: var(--clone-background); }\n"
+        "  img { max-width: 100%; height: auto; }\n"
+        "  .clone-section { display: block; width: 100%; }\n"
+        "}"
+    )
+
+
+def placeholder_section(planned: PlannedSection) -> str:
+    """Plain markup for a section whose generation failed, so its text is not lost"""
+    text = html.escape(planned.section.get("text_content") or "")
+    return f'<section id="{planned.element_id}" class="clone-section"><p>{text}</p></section>'
+
+
+def stitch(skeleton_html: str, fragments: List[str], css: str) -> str:
+    """Put the generated sections into the skeleton, in page order, under one stylesheet
+
+    Each fragment's <style> blocks move into <head> after the shared layer;
+    the markup goes into the skeleton's sections container, or before the
+    footer when the skeleton left that out.
+    """
+    document = BeautifulSoup(skeleton_html or "<!DOCTYPE html><html><body></body></html>", "html.parser")
+    if document.html is None:
+        document = BeautifulSoup(f"<!DOCTYPE html><html><body>{skeleton_html}</body></html>", "html.parser")
+    if document.head is None:
+        document.html.insert(0, document.new_tag("head"))
+    if document.body is None:
+        document.html.append(document.new_tag("body"))
+
+    shared = document.new_tag("style", id="clone-shared")
+    shared.string = css
+    document.head.insert(0, shared)
+
+    container = document.find(id=SECTIONS_CONTAINER_ID)
+    if container is None:
+        container = document.new_tag("main", id=SECTIONS_CONTAINER_ID)
+        footer = document.body.find("footer")
+        if footer is not None:
+            footer.insert_before(container)
+        else:
+            document.body.append(container)
+
+    section_css = []
+    for fragment in fragments:
+        parsed = BeautifulSoup(fragment, "html.parser")
+        for style in parsed.find_all("style"):
+            section_css.append(style.get_text())
+            style.decompose()
+        # A model that answered with a whole document still only contributes its body
+        root = parsed.body or parsed
+        for node in list(root.contents):
+            container.append(node.extract())
+
+    if section_css:
+        sections_style = document.new_tag("style", id="clone-section-styles")
+        sections_style.string = "\n".join(section_css)
+        document.head.append(sections_style)
+
+    return str(document)
@@ -0,0 +1,145 @@
+# multi-page site clones: page discovery, one shared stylesheet and per-page documents
+
+import hashlib
+import logging
+import re
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urljoin, urlsplit
+from bs4 import BeautifulSoup
+from app.clone.sections import SECTIONS_CONTAINER_ID
+from app.utils.urls import normalize_url
+
+logger = logging.getLogger(__name__)
+
+STYLESHEET_NAME = "styles.css"
+
+# Content sections with these class terms are site chrome, generated once for all pages
+CHROME_TERMS = ("header", "footer", "nav", "menu")
+
+SKIPPED_EXTENSIONS = (".pdf", ".zip", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".mp4")
+
+
+def discover_pages(root_url: str, design_context: Dict, limit: int) -> List[str]:
+    """Same-origin pages linked from the root page's navigation, in link order
+
+    Returns at most `limit` normalized URLs, the root page first.
+    """
+    root = normalize_url(root_url)
+    origin = urlsplit(root)[:2]
+    pages = [root]
+    for nav in design_context.get("navigation_structure") or []:
+        for link in nav.get("links") or []:
+            if len(pages) >= limit:
+                return pages
+            href = (link.get("href") or "").strip()
+            if not href or href.startswith(("#", "mailto:", "tel:", "javascript:")):
+                continue
+            url = normalize_url(urljoin(root, href))
+            parts = urlsplit(url)
+            if parts[:2] != origin or parts.path.lower().endswith(SKIPPED_EXTENSIONS):
+                continue
+            if url not in pages:
+                pages.append(url)
+    return pages
+
+
+def page_filename(url: str, root_url: str) -> str:
+    """File name of a cloned page: index.html for the root, else a slug of its path
+
+    The slug is followed by a short hash of the normalized URL, since paths
+    such as /a/b and /a-b, or ones differing only in punctuation, slug alike.
+    """
+    normalized = normalize_url(url)
+    if normalized == normalize_url(root_url):
+        return "index.html"
+    parts = urlsplit(url)
+    slug = re.sub(r"[^a-z0-9]+", "-", f"{parts.path} {parts.query}".lower()).strip("-")
+    digest = hashlib.sha256(normalized.encode()).hexdigest()[:8]
+    return f"{slug or 'page'}-{digest}.html"
+
+
+def page_slug(filename: str) -> str:
+    return filename.rsplit(".", 1)[0]
+
+
+def page_sections(design_context: Dict) -> List[Dict]:
+    """The page's own content sections, without the header, navigation and footer"""
+    return [
+        section
+        for section in design_context.get("content_sections") or []
+        if not any(
+            term in " ".join(section.get("classes", [])).lower() for term in CHROME_TERMS
+        )
+    ]
+
+
+def split_shell(shell_html: str, root_url: str, filenames: Dict[str, str]) -> Tuple[str, str]:
+    """Move the shell's <style> blocks out into the stylesheet and link it instead
+
+    Navigation links to cloned pages are pointed at their files.
+    Returns (shell_html, css).
+    """
+    document = BeautifulSoup(shell_html, "html.parser")
+    css = []
+    for style in document.find_all("style"):
+        css.append(style.get_text())
+        style.decompose()
+    if document.html is None or document.body is None:
+        document = BeautifulSoup(
+            f"<!DOCTYPE html><html><head></head><body>{document}</body></html>", "html.parser"
+        )
+    if document.head is None:
+        document.html.insert(0, document.new_tag("head"))
+    document.head.append(document.new_tag("link", rel="stylesheet", href=STYLESHEET_NAME))
+    if document.find(id=SECTIONS_CONTAINER_ID) is None:
+        container = document.new_tag("main", id=SECTIONS_CONTAINER_ID)
+        footer = document.body.find("footer")
+        if footer is not None:
+            footer.insert_before(container)
+        else:
+            document.body.append(container)
+    rewrite_links(document, root_url, filenames)
+    return str(document), "\n".join(css)
+
+
+def rewrite_links(document: BeautifulSoup, base_url: str, filenames: Dict[str, str]):
+    """Point links to other cloned pages at their local files"""
+    for anchor in document.find_all("a", href=True):
+        target = normalize_url(urljoin(base_url, anchor["href"]))
+        if target in filenames:
+            anchor["href"] = filenames[target]
+
+
+def assemble_page(
+    shell_html: str,
+    fragment: str,
+    url: str,
+    filename: str,
+    filenames: Dict[str, str],
+    title: Optional[str] = None,
+) -> Tuple[str, str]:
+    """One page: the shared shell with the page's content in its container
+
+    Returns (html, css) where css is the page's own rules, which go into the
+    shared stylesheet instead of the page.
+    """
+    document = BeautifulSoup(shell_html, "html.parser")
+    content = BeautifulSoup(fragment, "html.parser")
+    css = []
+    for style in content.find_all("style"):
+        css.append(style.get_text())
+        style.decompose()
+
+    rewrite_links(content, url, filenames)
+
+    container = document.find(id=SECTIONS_CONTAINER_ID)
+    root = content.body or content
+    for node in list(root.contents):
+        container.append(node.extract())
+
+    document.body["data-page"] = page_slug(filename)
+    if title:
+        if document.title is None:
+            document.head.insert(0, document.new_tag("title"))
+        document.title.string = title
+    return str(document), "\n".join(css)
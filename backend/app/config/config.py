@@ -0,0 +1,197 @@
+# runtime configuration for the cloning service, read from the environment
+
+import os
+from typing import Dict, List
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_float_map(name: str, default: Dict[str, float]) -> Dict[str, float]:
+    """Parse "key=value,key=value" into a dict, e.g. "structure=60,styling=90" """
+    value = os.getenv(name)
+    if not value:
+        return dict(default)
+    parsed = {}
+    for pair in value.split(","):
+        key, _, number = pair.partition("=")
+        if key.strip() and number.strip():
+            parsed[key.strip()] = float(number)
+    return parsed
+
+
+def _env_list(name: str, default: List[str]) -> List[str]:
+    """Parse "a,b,c" into a list of non-empty strings"""
+    value = os.getenv(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _env_str_map(name: str, default: Dict[str, str]) -> Dict[str, str]:
+    """Parse "key=value,key=value" into a dict of strings, e.g. "structure=gemini-2.0-flash-lite"
+
+    Entries are merged over `default`, so keys the variable leaves out keep their defaults.
+    """
+    parsed = dict(default)
+    for pair in (os.getenv(name) or "").split(","):
+        key, _, text = pair.partition("=")
+        if key.strip() and text.strip():
+            parsed[key.strip()] = text.strip()
+    return parsed
+
+
+class Settings:
+    def __init__(self):
+        # Browser pool
+        self.browser_pool_size = _env_int("BROWSER_POOL_SIZE", 2)
+        self.browser_max_pages = _env_int("BROWSER_MAX_PAGES", 50)
+        self.browser_lease_timeout = _env_int("BROWSER_LEASE_TIMEOUT", 60)
+
+        # Resource policy: URLs blocked through DevTools while a page loads.
+        # Pages loaded only for DOM extraction use the extraction types, pages
+        # that are also screenshotted the screenshot types; domains apply to both.
+        self.resource_policy_enabled = _env_int("RESOURCE_POLICY_ENABLED", 1) == 1
+        self.resource_block_trackers = _env_int("RESOURCE_BLOCK_TRACKERS", 1) == 1
+        self.resource_blocked_domains = _env_list("RESOURCE_BLOCKED_DOMAINS", [])
+        self.resource_extraction_blocked_types = _env_list(
+            "RESOURCE_EXTRACTION_BLOCKED_TYPES", ["image", "media", "font"]
+        )
+        self.resource_screenshot_blocked_types = _env_list(
+            "RESOURCE_SCREENSHOT_BLOCKED_TYPES", ["media"]
+        )
+
+        # Viewport screenshots: concurrent captures per page, each bounded in seconds
+        self.viewport_parallelism = _env_int("VIEWPORT_PARALLELISM", 2)
+        self.viewport_capture_timeout = _env_float("VIEWPORT_CAPTURE_TIMEOUT", 20)
+
+        # Thread pools for blocking browser work and browser-free parsing
+        self.browser_workers = _env_int("BROWSER_WORKERS", 4)
+        self.cpu_workers = _env_int("CPU_WORKERS", 2)
+
+        # Clone job queue
+        self.clone_job_workers = _env_int("CLONE_JOB_WORKERS", 2)
+        self.clone_job_queue_size = _env_int("CLONE_JOB_QUEUE_SIZE", 16)
+        self.clone_job_result_ttl = _env_float("CLONE_JOB_RESULT_TTL", 900)
+
+        # Model routing: default model, per-stage models and GenerationConfig
+        # overrides as "stage.field=value"; model names starting with "stub" run offline
+        self.llm_model = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+        self.llm_stage_models = _env_str_map(
+            "LLM_STAGE_MODELS", {"fallback": "gemini-2.5-pro-preview-06-05"}
+        )
+        self.llm_stage_configs = _env_float_map("LLM_STAGE_CONFIGS", {})
+        self.llm_stub_latency = _env_float("LLM_STUB_LATENCY", 0)
+
+        # Batch clones (POST /clone/batch)
+        self.clone_batch_concurrency = _env_int("CLONE_BATCH_CONCURRENCY", 4)
+        self.clone_batch_max_items = _env_int("CLONE_BATCH_MAX_ITEMS", 50)
+
+        # LLM gateway
+        self.llm_max_concurrency = _env_int("LLM_MAX_CONCURRENCY", 4)
+        self.llm_default_deadline = _env_float("LLM_DEFAULT_DEADLINE", 120)
+        self.llm_stage_deadlines = _env_float_map(
+            "LLM_STAGE_DEADLINES",
+            {
+                "structure": 60,
+                "styling": 90,
+                "content": 90,
+                "single_pass": 120,
+                "skeleton": 60,
+                "section": 60,
+                "page": 90,
+            },
+        )
+        self.llm_max_attempts = _env_int("LLM_MAX_ATTEMPTS", 3)
+        self.llm_retry_budget = _env_int("LLM_RETRY_BUDGET", 20)
+
+        # Hedged generation (CloneRequest.hedge), in seconds
+        self.hedge_delay = _env_float("HEDGE_DELAY", 20)
+        self.hedge_grace = _env_float("HEDGE_GRACE", 10)
+
+        # Section-parallel generation (CloneRequest.sections)
+        self.section_max = _env_int("SECTION_MAX", 6)
+        self.section_screenshot_max_height = _env_int("SECTION_SCREENSHOT_MAX_HEIGHT", 8000)
+
+        # Site clones (POST /clone/site): most pages one request may ask for
+        self.site_max_pages = _env_int("SITE_MAX_PAGES", 10)
+
+        # Estimated input tokens per stage prompt, previous stage HTML included
+        self.prompt_token_budgets = _env_float_map(
+            "PROMPT_TOKEN_BUDGETS",
+            {
+                "structure": 3000,
+                "styling": 8000,
+                "content": 10000,
+                "single_pass": 6000,
+                "skeleton": 3000,
+                "section": 2500,
+                "page": 6000,
+            },
+        )
+        self.prompt_default_token_budget = _env_int("PROMPT_DEFAULT_TOKEN_BUDGET", 8000)
+
+        # LLM response cache, shared by every worker through SQLite
+        self.llm_cache_enabled = _env_int("LLM_CACHE_ENABLED", 1) == 1
+        self.llm_cache_path = os.getenv("LLM_CACHE_PATH", ".cache/llm_responses.sqlite3")
+        self.llm_cache_max_mb = _env_int("LLM_CACHE_MAX_MB", 256)
+
+        # Page readiness, in seconds
+        self.readiness_max_wait = _env_float("READINESS_MAX_WAIT", 15)
+        self.readiness_resize_max_wait = _env_float("READINESS_RESIZE_MAX_WAIT", 3)
+        self.readiness_network_idle = _env_float("READINESS_NETWORK_IDLE", 0.5)
+        self.readiness_dom_quiet = _env_float("READINESS_DOM_QUIET", 0.5)
+
+        # In-page computed style sampling
+        self.style_sample_budget_ms = _env_int("STYLE_SAMPLE_BUDGET_MS", 250)
+        self.style_sample_max = _env_int("STYLE_SAMPLE_MAX", 50)
+
+        # Screenshot encoding for the vision model
+        self.screenshot_model_max_dimension = _env_int("SCREENSHOT_MODEL_MAX_DIMENSION", 1536)
+        self.screenshot_model_format = os.getenv("SCREENSHOT_MODEL_FORMAT", "JPEG")
+        self.screenshot_model_quality = _env_int("SCREENSHOT_MODEL_QUALITY", 80)
+
+        # HTML parser backend: auto, lxml, html5-parser or html.parser
+        self.html_parser = os.getenv("HTML_PARSER", "auto")
+
+        # Linked stylesheet fetching, run alongside the Chrome capture
+        self.stylesheet_fetch_enabled = _env_int("STYLESHEET_FETCH_ENABLED", 1) == 1
+        self.stylesheet_max_connections = _env_int("STYLESHEET_MAX_CONNECTIONS", 32)
+        self.stylesheet_per_host = _env_int("STYLESHEET_PER_HOST", 4)
+        self.stylesheet_max_kb = _env_int("STYLESHEET_MAX_KB", 1024)
+        self.stylesheet_max_sheets = _env_int("STYLESHEET_MAX_SHEETS", 20)
+        self.stylesheet_timeout = _env_float("STYLESHEET_TIMEOUT", 10)
+        self.http_cache_path = os.getenv("HTTP_CACHE_PATH", ".cache/http.sqlite3")
+        self.http_cache_max_mb = _env_int("HTTP_CACHE_MAX_MB", 128)
+
+        # Static fast path: build the design context from a plain HTTP fetch
+        # when the page does not need JavaScript to render its content
+        self.static_fast_path = _env_int("STATIC_FAST_PATH", 0) == 1
+        self.static_min_text = _env_int("STATIC_MIN_TEXT", 200)
+        self.static_min_text_density = _env_float("STATIC_MIN_TEXT_DENSITY", 0.02)
+
+        # Artifact store for generated documents, stage outputs and screenshots
+        self.artifacts_enabled = _env_int("ARTIFACTS_ENABLED", 1) == 1
+        self.artifact_backend = os.getenv("ARTIFACT_BACKEND", "local")
+        self.artifact_path = os.getenv("ARTIFACT_PATH", ".artifacts")
+        self.artifact_max_mb = _env_int("ARTIFACT_MAX_MB", 1024)
+        self.artifact_max_age = _env_float("ARTIFACT_MAX_AGE", 7 * 24 * 3600)
+
+        # Design context cache, in seconds
+        self.context_cache_entries = _env_int("CONTEXT_CACHE_ENTRIES", 64)
+        self.context_cache_max_mb = _env_int("CONTEXT_CACHE_MAX_MB", 256)
+        self.context_cache_ttl = _env_float("CONTEXT_CACHE_TTL", 3600)
+        self.context_cache_fresh = _env_float("CONTEXT_CACHE_FRESH", 60)
+
+
+settings = Settings()
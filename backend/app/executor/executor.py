@@ -0,0 +1,42 @@
+# bounded thread pools that keep blocking browser and CPU-bound calls off the event loop
+
+import asyncio
+import contextvars
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class ExecutionLayer:
+    def __init__(self, browser_workers: int = 4, cpu_workers: int = 2):
+        self.browser_workers = browser_workers
+        self.browser_executor = ThreadPoolExecutor(
+            max_workers=browser_workers, thread_name_prefix="browser"
+        )
+        # Separate so parsing a large page never waits behind a slow page load
+        self.cpu_workers = cpu_workers
+        self.cpu_executor = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="cpu")
+
+    async def run_browser(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking Selenium or parsing call on the browser pool"""
+        return await self._run(self.browser_executor, fn, *args, **kwargs)
+
+    async def run_cpu(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run HTML parsing or design analysis that needs no browser"""
+        return await self._run(self.cpu_executor, fn, *args, **kwargs)
+
+    async def _run(self, executor: ThreadPoolExecutor, fn: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Carry context variables (the request trace) into the worker thread
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            executor, functools.partial(context.run, fn, *args, **kwargs)
+        )
+
+    def shutdown(self):
+        self.browser_executor.shutdown(wait=True, cancel_futures=True)
+        self.cpu_executor.shutdown(wait=True, cancel_futures=True)
+        logger.info("Execution layer shut down")
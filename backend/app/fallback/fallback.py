@@ -3,11 +3,9 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, HttpUrl
-from bs4 import BeautifulSoup
 import base64
 from urllib.parse import urljoin, urlparse
 import json
-import os
 from typing import Optional, Dict, List
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -15,10 +13,11 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 import time
-import google.generativeai as genai
 import logging
 from dotenv import load_dotenv
-import os
+from app.config.config import settings
+from app.llm.models import ModelRegistry
+from app.parsing.html_parser import HTMLParser
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
@@ -26,8 +25,13 @@ logger = logging.getLogger(__name__)
 
 class WebsiteScraper:
     def __init__(self):
-        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
-        self.gemini_model = genai.GenerativeModel('gemini-2.5-pro-preview-06-05')
+        self.models = ModelRegistry(
+            default_model=settings.llm_model,
+            stage_models=settings.llm_stage_models,
+            stage_configs=settings.llm_stage_configs,
+            stub_latency=settings.llm_stub_latency,
+        )
+        self.html_parser = HTMLParser(settings.html_parser)
     
     def get_chrome_options(self):
         """Configure Chrome options for headless browsing"""
@@ -75,7 +79,7 @@ class WebsiteScraper:
 
             driver.quit()
 
-            soup = BeautifulSoup(rendered_html, 'html.parser')
+            soup = self.html_parser.parse(rendered_html).soup
 
             dom_info = {
                 'title': soup.title.string if soup.title else '',
@@ -231,9 +235,10 @@ class WebsiteScraper:
                     image
                 ])
             
-            response = self.gemini_model.generate_content(
+            response = self.models.model_for("fallback").generate_content(
                 content_parts,
-                generation_config=genai.types.GenerationConfig(
+                generation_config=self.models.config_for(
+                    "fallback",
                     temperature=1.5,
                     max_output_tokens=8192,
                     candidate_count=1,
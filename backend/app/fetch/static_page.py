@@ -0,0 +1,95 @@
+# decides from a plain HTTP fetch whether a page needs a browser to render its content
+
+import re
+from typing import Dict, List
+from bs4 import BeautifulSoup, NavigableString
+
+# Mount points of client-rendered apps; empty ones mean the content comes from JS
+APP_ROOT_IDS = ("__next", "__nuxt", "___gatsby", "root", "app", "svelte")
+APP_ROOT_ATTRIBUTES = ("ng-version", "data-reactroot", "data-v-app")
+NOSCRIPT_HINT_RE = re.compile(
+    r"enable javascript|javascript (?:is )?(?:required|disabled)|requires javascript"
+    r"|turn on javascript|javascript to run this app",
+    re.I,
+)
+NON_CONTENT_TAGS = {"script", "style", "noscript", "template"}
+
+
+class RenderCheck:
+    """Outcome of the rendering heuristic for one page's server HTML"""
+
+    def __init__(self, text_chars: int, text_density: float, elements: int):
+        self.text_chars = text_chars
+        self.text_density = text_density
+        self.elements = elements
+        self.reasons: List[str] = []
+
+    @property
+    def needs_rendering(self) -> bool:
+        return bool(self.reasons)
+
+    def summary(self) -> Dict:
+        return {
+            "needs_rendering": self.needs_rendering,
+            "reasons": self.reasons,
+            "text_chars": self.text_chars,
+            "text_density": round(self.text_density, 4),
+            "elements": self.elements,
+        }
+
+
+def _visible_text(tag) -> str:
+    return " ".join(
+        string.strip()
+        for string in tag.find_all(string=True)
+        # Comments, doctypes and script bodies are NavigableString subclasses
+        if type(string) is NavigableString
+        and string.parent.name not in NON_CONTENT_TAGS
+        and string.strip()
+    )
+
+
+def check_rendering(
+    soup: BeautifulSoup,
+    html: str,
+    truncated: bool = False,
+    min_text: int = 200,
+    min_density: float = 0.02,
+) -> RenderCheck:
+    """Whether the server HTML is missing content that JavaScript would add
+
+    Text density is visible text over the size of the markup without script
+    and style bodies, so server-rendered pages carrying large hydration
+    payloads are not penalised for them.
+    """
+    body = soup.body or soup
+    text = _visible_text(body)
+    code_chars = sum(len(tag.get_text()) for tag in soup.find_all(("script", "style")))
+    markup_chars = max(1, len(html) - code_chars)
+    check = RenderCheck(
+        len(text),
+        len(text) / markup_chars,
+        sum(1 for tag in body.find_all(True) if tag.name not in NON_CONTENT_TAGS),
+    )
+
+    if truncated:
+        check.reasons.append("page HTML over the size limit")
+    if check.text_chars < min_text:
+        check.reasons.append(f"only {check.text_chars} characters of text")
+
+    for root in soup.find_all(id=APP_ROOT_IDS):
+        if len(_visible_text(root)) < min_text:
+            check.reasons.append(f"empty app root #{root['id']}")
+    for attribute in APP_ROOT_ATTRIBUTES:
+        root = soup.find(attrs={attribute: True})
+        if root is not None and len(_visible_text(root)) < min_text:
+            check.reasons.append(f"empty app root [{attribute}]")
+
+    if check.text_density < min_density:
+        check.reasons.append(f"text density {check.text_density:.3f}")
+        if any(
+            NOSCRIPT_HINT_RE.search(noscript.get_text())
+            for noscript in soup.find_all("noscript")
+        ):
+            check.reasons.append("noscript asks for JavaScript")
+    return check
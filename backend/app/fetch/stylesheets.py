@@ -0,0 +1,244 @@
+# pooled fetcher for a page's linked stylesheets and their @import chains
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Set, Tuple
+from urllib.parse import urljoin, urlsplit
+import aiohttp
+from bs4 import BeautifulSoup
+from app.cache.http_cache import HTTPCache
+from app.metrics.tracing import record_cache, span
+from app.parsing.css_tokens import CssTokens, import_urls
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+class ResponseTooLarge(Exception):
+    pass
+
+
+def _resolve(base: str, href: str) -> Optional[str]:
+    """Absolute http(s) URL of an href, or None for ones that cannot be fetched"""
+    try:
+        url = urljoin(base, href.strip())
+        scheme = urlsplit(url).scheme
+    except ValueError:
+        # Malformed hrefs such as "http://[x/a.css"
+        return None
+    return url if scheme in ("http", "https") else None
+
+
+class StylesheetBundle:
+    """Every stylesheet fetched for one page and the tokens scanned from them"""
+
+    def __init__(self):
+        self.sheets: List[Dict] = []
+        self.tokens = CssTokens()
+        self.total_bytes = 0
+        self.seconds = 0.0
+
+    def summary(self) -> Dict:
+        return {
+            "sheets": self.sheets,
+            "total_bytes": self.total_bytes,
+            "seconds": round(self.seconds, 3),
+            **self.tokens.summary(),
+        }
+
+    def apply_to(self, design_context: Dict, limit: int = 12):
+        """Add stylesheet colors and fonts to what the DOM analysis found inline
+
+        The page's color lists repeat each color once per element using it,
+        so stylesheet colors go under their own stylesheet_* keys, ordered by
+        how often the CSS declares them, instead of being counted with those.
+        """
+        tokens = self.tokens
+        colors = design_context.setdefault("color_analysis", {})
+        for key, counter in (
+            ("text_colors", tokens.text_colors),
+            ("background_colors", tokens.background_colors),
+            ("border_colors", tokens.border_colors),
+        ):
+            colors[f"stylesheet_{key}"] = [color for color, _ in counter.most_common(limit)]
+        if not colors.get("dominant_palette"):
+            colors["dominant_palette"] = tokens.palette(limit)
+
+        typography = design_context.setdefault("typography_system", {})
+        if not typography.get("font_families"):
+            typography["font_families"] = [
+                family for family, _ in tokens.font_families.most_common(limit)
+            ]
+        if not typography.get("font_sizes"):
+            typography["font_sizes"] = [
+                size for size, _ in tokens.font_sizes.most_common(limit)
+            ]
+        design_context["stylesheets"] = self.summary()
+
+
+class StylesheetFetcher:
+    """Fetches a page's CSS over one pooled aiohttp session
+
+    Stylesheets are found in the page as Chrome (or the static fast path)
+    loaded it, so ones injected by scripts count too. Linked stylesheets and
+    their @import chains (up to `max_depth` deep) are fetched concurrently,
+    at most `per_host` at a time per host and `max_connections` overall. Each response is cut off at
+    `max_bytes` and a page stops after `max_sheets` stylesheets or
+    `max_total_bytes`. Responses go through the on-disk HTTP cache.
+    """
+
+    def __init__(
+        self,
+        cache: Optional[HTTPCache] = None,
+        max_connections: int = 32,
+        per_host: int = 4,
+        max_bytes: int = 1024 * 1024,
+        max_total_bytes: int = 4 * 1024 * 1024,
+        max_sheets: int = 20,
+        max_depth: int = 3,
+        timeout: float = 10,
+    ):
+        self.cache = cache
+        self.max_connections = max_connections
+        self.per_host = per_host
+        self.max_bytes = max_bytes
+        self.max_total_bytes = max_total_bytes
+        self.max_sheets = max_sheets
+        self.max_depth = max_depth
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _client(self) -> aiohttp.ClientSession:
+        # Created on first use so it binds to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.max_connections,
+                    limit_per_host=self.per_host,
+                    ttl_dns_cache=300,
+                ),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": USER_AGENT},
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def collect(self, page_url: str, soup: BeautifulSoup) -> StylesheetBundle:
+        """Fetch and scan every stylesheet the parsed page links or imports
+
+        `soup` is the page as already loaded, so the page itself is not
+        fetched again. Stylesheets that fail are recorded and skipped.
+        """
+        started = time.monotonic()
+        bundle = StylesheetBundle()
+        with span("stylesheets"):
+            page_url = str(page_url)
+            base_tag = soup.find("base", href=True)
+            base = (_resolve(page_url, base_tag["href"]) if base_tag else None) or page_url
+
+            level: List[Tuple[Optional[str], int]] = []
+            for link in soup.find_all("link", href=True):
+                rel = link.get("rel") or []
+                if "stylesheet" in [value.lower() for value in rel]:
+                    level.append((_resolve(base, link["href"]), 0))
+            for style in soup.find_all("style"):
+                css = style.get_text()
+                await asyncio.to_thread(bundle.tokens.scan, css)
+                level.extend((_resolve(base, target), 1) for target in import_urls(css))
+
+            seen: Set[str] = set()
+            # Breadth first: each level of @imports is fetched concurrently
+            while level:
+                batch = []
+                for url, depth in level:
+                    if url is None or url in seen or depth > self.max_depth:
+                        continue
+                    if len(seen) >= self.max_sheets:
+                        break
+                    seen.add(url)
+                    batch.append((url, depth))
+                results = await asyncio.gather(
+                    *(self.fetch(url, "text/css") for url, _ in batch),
+                    return_exceptions=True,
+                )
+
+                level = []
+                for (url, depth), result in zip(batch, results):
+                    if isinstance(result, Exception):
+                        logger.info(f"Stylesheet {url} skipped: {result}")
+                        bundle.sheets.append({"url": url, "error": str(result)})
+                        continue
+                    body, cache_result = result
+                    if bundle.total_bytes + len(body) > self.max_total_bytes:
+                        bundle.sheets.append({"url": url, "error": "page CSS size limit reached"})
+                        continue
+                    bundle.total_bytes += len(body)
+                    css = body.decode("utf-8", "replace")
+                    # Large framework stylesheets take a while to scan; keep it off the loop
+                    await asyncio.to_thread(bundle.tokens.scan, css)
+                    bundle.sheets.append({"url": url, "bytes": len(body), "cache": cache_result})
+                    level.extend((_resolve(url, target), depth + 1) for target in import_urls(css))
+
+        bundle.seconds = time.monotonic() - started
+        logger.info(
+            f"Fetched {len(bundle.sheets)} stylesheets ({bundle.total_bytes} bytes) "
+            f"for {page_url} in {bundle.seconds:.2f}s"
+        )
+        return bundle
+
+    async def fetch(
+        self, url: str, accept: str, truncate: bool = False, use_cache: bool = True
+    ) -> Tuple[bytes, str]:
+        """Body of a URL through the HTTP cache; returns (body, hit | revalidated | miss)
+
+        Bodies over max_bytes raise ResponseTooLarge, or with `truncate` are
+        cut off and returned without being cached. Without `use_cache` the
+        URL is always fetched, and the response still cached.
+        """
+        cached = None
+        if self.cache is not None and use_cache:
+            cached = await asyncio.to_thread(self.cache.get, url)
+            if cached is not None and cached.fresh:
+                record_cache("http", "hit")
+                return cached.body, "hit"
+
+        headers = {"Accept": accept}
+        if cached is not None:
+            headers.update(cached.conditional_headers())
+
+        async with self._client().get(url, headers=headers, allow_redirects=True) as response:
+            if response.status == 304 and cached is not None:
+                await asyncio.to_thread(self.cache.refresh, url, response.headers)
+                record_cache("http", "revalidated")
+                return cached.body, "revalidated"
+            response.raise_for_status()
+            if (
+                not truncate
+                and response.content_length
+                and response.content_length > self.max_bytes
+            ):
+                raise ResponseTooLarge(f"{response.content_length} bytes")
+            body = bytearray()
+            truncated = False
+            async for chunk in response.content.iter_chunked(64 * 1024):
+                body.extend(chunk)
+                if len(body) > self.max_bytes:
+                    if not truncate:
+                        raise ResponseTooLarge(f"over {self.max_bytes} bytes")
+                    truncated = True
+                    break
+            body = bytes(body[: self.max_bytes])
+            response_headers = response.headers
+
+        record_cache("http", "miss" if use_cache else "bypass")
+        if self.cache is not None and not truncated:
+            try:
+                await asyncio.to_thread(self.cache.put, url, body, response_headers)
+            except Exception as e:
+                logger.warning(f"HTTP cache write failed for {url}: {e}")
+        return body, "miss"
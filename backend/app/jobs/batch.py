@@ -0,0 +1,114 @@
+# runs a batch of clone payloads once per distinct key and reports results as they finish
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem:
+    def __init__(self, index: int, payload: Any, key: str):
+        self.index = index
+        self.payload = payload
+        self.key = key
+        # Index of the earlier item with the same key, whose result this one shares
+        self.duplicate_of: Optional[int] = None
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.seconds: Optional[float] = None
+
+
+class CloneBatch:
+    """Runs each distinct payload through `runner` with at most `concurrency` at once
+
+    Items are deduplicated by `key` (e.g. the normalized URL plus options);
+    duplicates are not run again but reported with the first item's result.
+    Runs share whatever the runner shares, such as the browser pool, the
+    LLM gateway's concurrency limit and the design context cache.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Any], Awaitable[Any]],
+        payloads: List[Any],
+        key: Callable[[Any], str],
+        concurrency: int = 4,
+    ):
+        self.runner = runner
+        self.concurrency = max(1, concurrency)
+        self.items: List[BatchItem] = []
+        first: Dict[str, BatchItem] = {}
+        for index, payload in enumerate(payloads):
+            item = BatchItem(index, payload, key(payload))
+            if item.key in first:
+                item.duplicate_of = first[item.key].index
+            else:
+                first[item.key] = item
+            self.items.append(item)
+        self.unique = list(first.values())
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    async def run(self) -> AsyncIterator[BatchItem]:
+        """Yield every item, duplicates included, as soon as its result is known"""
+        self.started_at = time.monotonic()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        duplicates: Dict[int, List[BatchItem]] = {}
+        for item in self.items:
+            if item.duplicate_of is not None:
+                duplicates.setdefault(item.duplicate_of, []).append(item)
+
+        async def run_item(item: BatchItem) -> BatchItem:
+            async with semaphore:
+                item.status = "running"
+                start = time.monotonic()
+                try:
+                    item.result = await self.runner(item.payload)
+                    item.status = "succeeded"
+                except Exception as e:
+                    logger.error(f"Batch item {item.index} ({item.key}) failed: {e}")
+                    item.status = "failed"
+                    item.error = getattr(e, "detail", None) or str(e)
+                finally:
+                    item.seconds = round(time.monotonic() - start, 3)
+            return item
+
+        tasks = [asyncio.create_task(run_item(item)) for item in self.unique]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item = await next_done
+                yield item
+                for duplicate in duplicates.get(item.index, []):
+                    duplicate.status = item.status
+                    duplicate.result = item.result
+                    duplicate.error = item.error
+                    duplicate.seconds = 0.0
+                    yield duplicate
+        finally:
+            # The client went away or the batch finished; stop anything still running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.finished_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        end = self.finished_at or time.monotonic()
+        seconds = end - self.started_at if self.started_at else 0.0
+        ran = [item for item in self.unique if item.seconds is not None]
+        succeeded = sum(1 for item in self.items if item.status == "succeeded")
+        return {
+            "items": len(self.items),
+            "unique": len(self.unique),
+            "duplicates": len(self.items) - len(self.unique),
+            "succeeded": succeeded,
+            "failed": sum(1 for item in self.items if item.status == "failed"),
+            "concurrency": self.concurrency,
+            "seconds": round(seconds, 3),
+            "average_item_seconds": (
+                round(sum(item.seconds for item in ran) / len(ran), 3) if ran else None
+            ),
+            "clones_per_minute": round(len(ran) * 60 / seconds, 2) if seconds else None,
+        }
@@ -0,0 +1,143 @@
+# bounded clone job queue drained by a fixed pool of asyncio workers
+
+import asyncio
+import logging
+import math
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(Exception):
+    """Raised by submit when no queue slot is free; carries a Retry-After estimate"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Clone queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class CloneJob:
+    def __init__(self, payload: Any):
+        self.id = uuid.uuid4().hex
+        self.payload = payload
+        self.status = "queued"
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed")
+
+
+class JobQueue:
+    """Runs submitted payloads through `runner` with at most `workers` in flight
+
+    At most `max_queued` jobs wait for a worker; beyond that submit raises
+    QueueFull so callers can shed load instead of piling up browsers. Finished
+    jobs are kept for `result_ttl` seconds so clients can poll for the result.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[[Any], Awaitable[Any]],
+        workers: int = 2,
+        max_queued: int = 16,
+        result_ttl: float = 900,
+    ):
+        self.runner = runner
+        self.workers = workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._jobs: Dict[str, CloneJob] = {}
+        self._pending: "OrderedDict[str, CloneJob]" = OrderedDict()
+        self._durations: deque = deque(maxlen=20)
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [
+            asyncio.create_task(self._worker(index)) for index in range(self.workers)
+        ]
+        logger.info(
+            f"Clone job queue started with {self.workers} workers, "
+            f"{self.max_queued} queue slots"
+        )
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, payload: Any) -> CloneJob:
+        self._prune()
+        job = CloneJob(payload)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(self.retry_after())
+        self._jobs[job.id] = job
+        self._pending[job.id] = job
+        logger.info(f"Queued clone job {job.id} ({len(self._pending)} waiting)")
+        return job
+
+    def get(self, job_id: str) -> Optional[CloneJob]:
+        self._prune()
+        return self._jobs.get(job_id)
+
+    def position(self, job: CloneJob) -> Optional[int]:
+        """1-based place in the queue, or None once a worker has picked the job up"""
+        if job.id not in self._pending:
+            return None
+        return list(self._pending).index(job.id) + 1
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is likely to free up, from recent job durations"""
+        average = (
+            sum(self._durations) / len(self._durations) if self._durations else 30
+        )
+        # A slot frees whenever any worker finishes, about every average/workers
+        return max(1, math.ceil(average / max(self.workers, 1)))
+
+    async def _worker(self, index: int):
+        while True:
+            job = await self._queue.get()
+            self._pending.pop(job.id, None)
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                job.result = await self.runner(job.payload)
+                job.status = "succeeded"
+            except asyncio.CancelledError:
+                job.status = "failed"
+                job.error = "Server shutting down"
+                raise
+            except Exception as e:
+                logger.error(f"Clone job {job.id} failed: {e}")
+                job.status = "failed"
+                job.error = getattr(e, "detail", None) or str(e)
+            finally:
+                job.finished_at = time.time()
+                self._durations.append(job.finished_at - job.started_at)
+                self._queue.task_done()
+            logger.info(
+                f"Clone job {job.id} {job.status} in "
+                f"{job.finished_at - job.started_at:.1f}s on worker {index}"
+            )
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        expired = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.done and job.finished_at < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
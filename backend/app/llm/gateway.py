@@ -0,0 +1,200 @@
+# async gateway every Gemini call goes through: concurrency cap, deadlines and retries
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Set
+import google.generativeai as genai
+from app.cache.response_cache import LLMResponseCache
+from app.llm.prompt_budget import estimate_tokens
+from app.metrics.tracing import record_cache, record_tokens, span
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Set per request to skip the response cache for every stage of that request
+llm_cache_bypass: ContextVar[bool] = ContextVar("llm_cache_bypass", default=False)
+
+
+class LLMDeadlineExceeded(Exception):
+    pass
+
+
+class RetryBudget:
+    """Retries shared by every call so an outage cannot turn into a retry storm
+
+    Each retry spends one token; each success earns back `refill_ratio` tokens.
+    """
+
+    def __init__(self, capacity: float = 20, refill_ratio: float = 0.1):
+        self.capacity = capacity
+        self.refill_ratio = refill_ratio
+        self._tokens = capacity
+        self._lock = threading.Lock()
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + self.refill_ratio)
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        max_concurrency: int = 4,
+        default_deadline: float = 120,
+        stage_deadlines: Optional[Dict[str, float]] = None,
+        max_attempts: int = 3,
+        retry_budget: Optional[RetryBudget] = None,
+        base_delay: float = 1,
+        max_delay: float = 20,
+        response_cache: Optional[LLMResponseCache] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.default_deadline = default_deadline
+        self.stage_deadlines = stage_deadlines or {}
+        self.max_attempts = max_attempts
+        self.retry_budget = retry_budget or RetryBudget()
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.response_cache = response_cache
+
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._inflight: Set[asyncio.Task] = set()
+
+    def deadline_for(self, stage: str) -> float:
+        return self.stage_deadlines.get(stage, self.default_deadline)
+
+    async def generate(
+        self,
+        model: genai.GenerativeModel,
+        stage: str,
+        contents,
+        generation_config: Optional[genai.types.GenerationConfig] = None,
+    ) -> str:
+        """Generate text for one pipeline stage and return the response text
+
+        Cached responses are returned without touching the model. The stage
+        deadline covers queueing for a slot, every attempt and the backoff
+        between them. Cancelling the calling task aborts the request.
+        """
+        with span("llm", stage):
+            return await self._generate(model, stage, contents, generation_config)
+
+    async def _generate(self, model, stage, contents, generation_config) -> str:
+        cache_key = None
+        if self.response_cache is not None:
+            if llm_cache_bypass.get():
+                record_cache("llm_response", "bypass")
+            else:
+                cache_key, cached = await self._cache_lookup(model, contents, generation_config)
+                record_cache("llm_response", "miss" if cached is None else "hit")
+                if cached is not None:
+                    logger.info(f"LLM response cache hit for {stage}")
+                    return cached
+
+        text = await self._generate_with_deadline(model, stage, contents, generation_config)
+
+        if cache_key is not None:
+            try:
+                await asyncio.to_thread(self.response_cache.put, cache_key, text)
+            except Exception as e:
+                logger.warning(f"LLM response cache write failed: {e}")
+        return text
+
+    async def _cache_lookup(self, model, contents, generation_config):
+        # Hashing screenshots and touching SQLite both block, so run them off the loop
+        try:
+            key = await asyncio.to_thread(
+                self.response_cache.key, model.model_name, contents, generation_config
+            )
+            return key, await asyncio.to_thread(self.response_cache.get, key)
+        except Exception as e:
+            logger.warning(f"LLM response cache read failed: {e}")
+            return None, None
+
+    async def _generate_with_deadline(
+        self, model, stage, contents, generation_config
+    ) -> str:
+        deadline = self.deadline_for(stage)
+        task = asyncio.current_task()
+        self._inflight.add(task)
+        start = time.monotonic()
+        try:
+            async with asyncio.timeout(deadline):
+                async with self._semaphore:
+                    return await self._generate_with_retries(
+                        model, stage, contents, generation_config, start + deadline
+                    )
+        except TimeoutError:
+            raise LLMDeadlineExceeded(
+                f"{stage} generation exceeded its {deadline}s deadline"
+            )
+        finally:
+            self._inflight.discard(task)
+
+    async def cancel_all(self):
+        """Cancel every in-flight generation, used when the app shuts down"""
+        tasks = list(self._inflight)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"Cancelled {len(tasks)} in-flight LLM calls")
+
+    async def _generate_with_retries(
+        self, model, stage, contents, generation_config, deadline_at
+    ) -> str:
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = await model.generate_content_async(
+                    contents,
+                    generation_config=generation_config,
+                    request_options={"timeout": max(deadline_at - time.monotonic(), 1)},
+                )
+                self.retry_budget.record_success()
+                self._record_usage(stage, contents, response)
+                return response.text
+            except Exception as e:
+                if not self._is_retryable(e) or attempt >= self.max_attempts:
+                    raise
+                # Full jitter keeps parallel stages from retrying in lockstep
+                delay = random.uniform(
+                    0, min(self.max_delay, self.base_delay * 2**attempt)
+                )
+                if time.monotonic() + delay >= deadline_at:
+                    raise
+                if not self.retry_budget.try_spend():
+                    logger.warning(f"LLM retry budget exhausted, not retrying {stage}")
+                    raise
+                logger.warning(
+                    f"{stage} generation attempt {attempt} failed ({e}), retrying in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+
+    def _record_usage(self, stage: str, contents, response):
+        """Token counts from the response, estimated when the SDK reports none"""
+        usage = getattr(response, "usage_metadata", None)
+        prompt_tokens = getattr(usage, "prompt_token_count", None) or None
+        response_tokens = getattr(usage, "candidates_token_count", None) or None
+        if prompt_tokens is None:
+            parts = [contents] if isinstance(contents, str) else contents
+            prompt_tokens = sum(estimate_tokens(part) for part in parts if isinstance(part, str))
+        if response_tokens is None:
+            response_tokens = estimate_tokens(response.text or "")
+        record_tokens(stage, prompt_tokens, response_tokens)
+
+    def _is_retryable(self, error: Exception) -> bool:
+        return getattr(error, "code", None) in RETRYABLE_STATUS_CODES
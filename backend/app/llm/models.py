@@ -0,0 +1,137 @@
+# per-stage model routing: which model and generation settings each pipeline stage uses
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+import google.generativeai as genai
+from app.llm.prompt_budget import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+STUB_PREFIX = "stub"
+
+# GenerationConfig fields that only take whole numbers
+INT_FIELDS = {"max_output_tokens", "top_k", "candidate_count"}
+
+
+class StubUsage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class StubResponse:
+    def __init__(self, text: str, usage_metadata: StubUsage):
+        self.text = text
+        self.usage_metadata = usage_metadata
+
+
+class StubModel:
+    """Offline stand-in for a Gemini model with the same generate_content calls
+
+    The reply is a small HTML document derived only from the prompt, so the
+    same request always gets the same answer and no network is needed.
+    """
+
+    def __init__(self, model_name: str = STUB_PREFIX, latency: float = 0):
+        self.model_name = model_name
+        self.latency = latency
+
+    def generate_content(self, contents, generation_config=None, request_options=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(contents)
+
+    async def generate_content_async(
+        self, contents, generation_config=None, request_options=None
+    ):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(contents)
+
+    def _respond(self, contents) -> StubResponse:
+        parts = [contents] if isinstance(contents, str) else list(contents)
+        digest = hashlib.sha256(self.model_name.encode())
+        for part in parts:
+            if isinstance(part, str):
+                digest.update(part.encode())
+            elif isinstance(part, dict) and "data" in part:
+                digest.update(part["data"])
+            elif hasattr(part, "tobytes"):
+                digest.update(part.tobytes())
+            else:
+                digest.update(repr(part).encode())
+        fingerprint = digest.hexdigest()[:12]
+        text = (
+            "```html\n"
+            "<!DOCTYPE html>\n"
+            f'<html lang="en">\n<head>\n<meta charset="utf-8">\n'
+            f"<title>{self.model_name} {fingerprint}</title>\n</head>\n"
+            f'<body>\n<main data-stub="{fingerprint}">\n'
+            f'<div class="placeholder">Content here</div>\n</main>\n</body>\n</html>\n'
+            "```"
+        )
+        prompt_tokens = sum(estimate_tokens(part) for part in parts if isinstance(part, str))
+        return StubResponse(text, StubUsage(prompt_tokens, estimate_tokens(text)))
+
+
+class ModelRegistry:
+    """Resolves each stage to a model and generation config from configuration
+
+    Stages without an entry in `stage_models` use `default_model`. Model names
+    starting with "stub" get the offline StubModel instead of Gemini.
+    `stage_configs` maps "stage.field" to a GenerationConfig value that
+    overrides the stage's built-in default, e.g. "structure.temperature".
+    """
+
+    def __init__(
+        self,
+        default_model: str = "gemini-2.0-flash",
+        stage_models: Optional[Dict[str, str]] = None,
+        stage_configs: Optional[Dict[str, float]] = None,
+        stub_latency: float = 0,
+    ):
+        self.default_model = default_model
+        self.stage_models = stage_models or {}
+        self.stage_configs = self._parse_configs(stage_configs or {})
+        self.stub_latency = stub_latency
+        self._models: Dict[str, object] = {}
+        self._configured = False
+        self._lock = threading.Lock()
+
+    def model_name_for(self, stage: str) -> str:
+        return self.stage_models.get(stage, self.default_model)
+
+    def model_for(self, stage: str):
+        name = self.model_name_for(stage)
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = self._create(name)
+            return self._models[name]
+
+    def config_for(self, stage: str, **defaults) -> genai.types.GenerationConfig:
+        """The stage's GenerationConfig: the caller's defaults with configured overrides"""
+        return genai.types.GenerationConfig(**{**defaults, **self.stage_configs.get(stage, {})})
+
+    def _create(self, name: str):
+        if name.startswith(STUB_PREFIX):
+            logger.info(f"Using offline stub model {name}")
+            return StubModel(name, latency=self.stub_latency)
+        if not self._configured:
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            self._configured = True
+        return genai.GenerativeModel(name)
+
+    def _parse_configs(self, flat: Dict[str, float]) -> Dict[str, Dict]:
+        configs: Dict[str, Dict] = {}
+        for key, value in flat.items():
+            stage, _, field = key.partition(".")
+            if not field:
+                logger.warning(f"Ignoring generation config override {key!r}, expected stage.field")
+                continue
+            configs.setdefault(stage, {})[field] = int(value) if field in INT_FIELDS else value
+        return configs
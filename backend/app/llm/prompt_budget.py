@@ -0,0 +1,217 @@
+# fits the design context embedded in each stage prompt into a token budget
+
+import copy
+import json
+import logging
+import math
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Rough average for English text and JSON with Gemini's tokenizer
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def compact_json(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=_jsonable)
+
+
+def rank_values(values: List[str], limit: Optional[int] = None) -> Dict[str, int]:
+    """Distinct values mapped to how often they occur, most frequent first"""
+    counts = Counter(_normalize_value(value) for value in values if value)
+    return dict(counts.most_common(limit))
+
+
+def _normalize_value(value: str) -> str:
+    value = value.replace("!important", "").strip().lower()
+    return " ".join(value.split())
+
+
+def _jsonable(obj):
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=str)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _prune(obj):
+    """Drop None, empty strings and empty containers, which only cost tokens"""
+    if isinstance(obj, dict):
+        pruned = {key: _prune(value) for key, value in obj.items()}
+        return {key: value for key, value in pruned.items() if value not in (None, "", [], {})}
+    if isinstance(obj, (list, tuple)):
+        pruned = [_prune(value) for value in obj]
+        return [value for value in pruned if value not in (None, "", [], {})]
+    if isinstance(obj, (set, frozenset)):
+        return _prune(sorted(obj, key=str))
+    return obj
+
+
+def _compact_layout(layout: Dict) -> Dict:
+    layout = copy.deepcopy(layout)
+    grid = layout.get("grid_systems")
+    if grid:
+        grid["classes"] = list(rank_values(grid.get("classes", [])))
+    return layout
+
+
+def _compact_colors(colors: Dict) -> Dict:
+    return {
+        name: rank_values(values, 12)
+        for name, values in colors.items()
+        if isinstance(values, list)
+    }
+
+
+def _compact_sections(sections: List[Dict]) -> List[Dict]:
+    compacted = []
+    for section in sections:
+        compacted.append(
+            {
+                "type": section.get("content_type"),
+                "tag": section.get("tag"),
+                "classes": " ".join(section.get("classes", [])),
+                "text": section.get("text_content"),
+                "children": list(dict.fromkeys(section.get("child_elements", []))),
+                "background_image": section.get("has_background_image") or None,
+                "importance": section.get("estimated_importance", 0),
+            }
+        )
+    return compacted
+
+
+COMPACTORS: Dict[str, Callable[[Any], Any]] = {
+    "layout_analysis": _compact_layout,
+    "color_analysis": _compact_colors,
+    "content_sections": _compact_sections,
+}
+
+
+def _drop_least_important_section(context: Dict, keep: int) -> bool:
+    sections = context.get("content_sections")
+    if not sections or len(sections) <= keep:
+        return False
+    # Remove the lowest-ranked section, latest in the page on ties
+    weakest = min(
+        range(len(sections)),
+        key=lambda index: (sections[index].get("importance", 0), -index),
+    )
+    del sections[weakest]
+    return True
+
+
+def _shorten_section_text(context: Dict, length: int) -> bool:
+    changed = False
+    for section in context.get("content_sections") or []:
+        text = section.get("text")
+        if text and len(text) > length:
+            section["text"] = text[:length]
+            changed = True
+    return changed
+
+
+def _limit_colors(context: Dict, top: int) -> bool:
+    changed = False
+    for name, ranked in (context.get("color_analysis") or {}).items():
+        if len(ranked) > top:
+            context["color_analysis"][name] = dict(list(ranked.items())[:top])
+            changed = True
+    return changed
+
+
+def _limit_images(context: Dict, top: int) -> bool:
+    images = (context.get("visual_elements") or {}).get("images")
+    if not images or len(images) <= top:
+        return False
+    del images[top:]
+    return True
+
+
+def _limit_nav_links(context: Dict, top: int) -> bool:
+    changed = False
+    for nav in context.get("navigation_structure") or []:
+        links = nav.get("links")
+        if links and len(links) > top:
+            del links[top:]
+            changed = True
+    return changed
+
+
+def _limit_headings(context: Dict, top: int) -> bool:
+    changed = False
+    for headings in ((context.get("typography_system") or {}).get("headings") or {}).values():
+        if len(headings) > top:
+            del headings[top:]
+            changed = True
+    return changed
+
+
+# Applied in order, each repeated until it stops changing anything
+TRIM_STEPS: List[Callable[[Dict], bool]] = [
+    lambda context: _drop_least_important_section(context, keep=8),
+    lambda context: _shorten_section_text(context, 150),
+    lambda context: _limit_colors(context, 6),
+    lambda context: _limit_images(context, 5),
+    lambda context: _limit_nav_links(context, 6),
+    lambda context: _limit_headings(context, 1),
+    lambda context: _drop_least_important_section(context, keep=3),
+    lambda context: _shorten_section_text(context, 60),
+    lambda context: _drop_least_important_section(context, keep=1),
+]
+
+
+class PromptBudget:
+    """Renders design-context pieces as compact JSON that fits a stage's token budget
+
+    Colors and classes are deduplicated and ranked by frequency, empty values
+    are dropped, and if the prompt is still too large the least important
+    sections and longest lists are trimmed step by step.
+    """
+
+    def __init__(self, stage_budgets: Dict[str, float], default_budget: int = 8000):
+        self.stage_budgets = stage_budgets
+        self.default_budget = default_budget
+
+    def budget_for(self, stage: str) -> int:
+        return int(self.stage_budgets.get(stage, self.default_budget))
+
+    def render(self, stage: str, context: Dict[str, Any], fixed: str = "") -> Dict[str, str]:
+        """Compact JSON per context key; `fixed` is the rest of the prompt, e.g. previous HTML"""
+        budget = self.budget_for(stage)
+        fixed_tokens = estimate_tokens(fixed)
+        before = fixed_tokens + sum(
+            estimate_tokens(json.dumps(value, indent=2, default=_jsonable))
+            for value in context.values()
+        )
+
+        compacted = {
+            key: _prune(COMPACTORS.get(key, copy.deepcopy)(value))
+            for key, value in context.items()
+        }
+        after = fixed_tokens + self._context_tokens(compacted)
+
+        steps = 0
+        for step in TRIM_STEPS:
+            while after > budget and step(compacted):
+                after = fixed_tokens + self._context_tokens(compacted)
+                steps += 1
+            if after <= budget:
+                break
+
+        logger.info(
+            f"Prompt budget for {stage}: ~{before} -> ~{after} tokens "
+            f"(budget {budget}, {steps} trim steps)"
+        )
+        if after > budget:
+            logger.warning(
+                f"{stage} prompt still ~{after} tokens after trimming, "
+                f"~{fixed_tokens} of them outside the design context"
+            )
+        return {key: compact_json(value) for key, value in compacted.items()}
+
+    def _context_tokens(self, compacted: Dict[str, Any]) -> int:
+        return sum(estimate_tokens(compact_json(value)) for value in compacted.values())
@@ -1,10 +1,39 @@
-from fastapi import FastAPI,  HTTPException
+from fastapi import FastAPI,  HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, HttpUrl
-app = FastAPI()
+import asyncio
+import json
 import logging
-from typing import Optional, Dict
+from contextlib import asynccontextmanager
+from collections import Counter
+from typing import Optional, Dict, List
+from app.artifacts.serving import artifact_response
 from app.clone.clone import EnchancedWebsiteScraper
+from app.config.config import settings
+from app.jobs.batch import CloneBatch
+from app.jobs.queue import CloneJob, JobQueue, QueueFull
+from app.llm.gateway import llm_cache_bypass
+from app.metrics.registry import registry
+from app.metrics.tracing import Trace, span, start_trace
+from app.utils.urls import normalize_url
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm the shared browsers before serving and quit them on shutdown
+    await asyncio.to_thread(scraper.browser_pool.start)
+    if scraper.artifacts is not None:
+        await asyncio.to_thread(scraper.artifacts.prune)
+    clone_jobs.start()
+    yield
+    await clone_jobs.stop()
+    await scraper.llm.cancel_all()
+    await scraper.stylesheets.close()
+    await asyncio.to_thread(scraper.browser_pool.drain)
+    scraper.executor.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -20,8 +49,26 @@ logger = logging.getLogger(__name__)
 
 
 scraper = EnchancedWebsiteScraper()
+class ReadinessOverrides(BaseModel):
+    max_wait: Optional[float] = None
+    network_idle: Optional[float] = None
+    dom_quiet: Optional[float] = None
+    wait_for_fonts: Optional[bool] = None
+    wait_for_images: Optional[bool] = None
+
 class CloneRequest(BaseModel):
     url: HttpUrl
+    readiness: Optional[ReadinessOverrides] = None
+    use_cache: bool = True
+    use_llm_cache: bool = True
+    hedge: bool = False
+    hedge_delay: Optional[float] = None
+    sections: bool = False
+    # None uses STATIC_FAST_PATH
+    fast_path: Optional[bool] = None
+    screenshots: bool = True
+    # Leave html out of the response; fetch it from GET /artifacts/{id} instead
+    return_artifacts: bool = False
 
 class CloneResponse(BaseModel):
     success: bool
@@ -29,53 +76,197 @@ class CloneResponse(BaseModel):
     error: Optional[str] = None
     metadata: Optional[Dict] = None
 
+class CloneSiteRequest(BaseModel):
+    url: HttpUrl
+    max_pages: int = 5
+    readiness: Optional[ReadinessOverrides] = None
+    use_cache: bool = True
+    use_llm_cache: bool = True
+
+class ClonedPage(BaseModel):
+    url: str
+    filename: str
+    html: str
+    generated: bool
+    cache_status: str
+
+class CloneSiteResponse(BaseModel):
+    success: bool
+    pages: List[ClonedPage] = []
+    stylesheet: Optional[str] = None
+    error: Optional[str] = None
+    metadata: Optional[Dict] = None
+
+class CloneBatchRequest(BaseModel):
+    items: List[CloneRequest]
+    concurrency: Optional[int] = None
+
+def readiness_overrides(request: CloneRequest) -> Optional[Dict]:
+    return request.readiness.model_dump(exclude_none=True) if request.readiness else None
+
+def clone_metadata(
+    request: CloneRequest,
+    design_context: Dict,
+    screenshots: Dict,
+    capture_info: Dict,
+    generation_method: str = "multi-stage",
+    hedge: Optional[Dict] = None,
+    trace: Optional[Trace] = None,
+    sections: Optional[Dict] = None,
+    artifacts: Optional[Dict] = None,
+) -> Dict:
+    return {
+        "original_url": str(request.url),
+        "content_sections_extracted": len(design_context.get('content_sections', [])),
+        "navigation_elements": len(design_context.get('navigation_structure', [])),
+        "visual_elements_found": len(design_context.get('visual_elements', {}).get('images', [])),
+        "layout_type": design_context.get('layout_analysis', {}).get('structure_type', 'unknown'),
+        "has_screenshots": len(screenshots) > 0,
+        "responsive_detected": design_context.get('responsive_indicators', {}).get('count', 0) > 0,
+        "interactive_elements": design_context.get('interactive_elements', {}),
+        "readiness_wait": capture_info["readiness_wait"],
+        "cache_status": capture_info["cache_status"],
+        "parse": capture_info["parse"],
+        "capture_path": capture_info["capture_path"],
+        "screenshot_error": capture_info.get("screenshot_error"),
+        "render_check": capture_info["render_check"],
+        "resources": capture_info["resources"],
+        "generation_method": generation_method,
+        "hedge": hedge,
+        "sections": sections,
+        "artifacts": artifacts,
+        "timings": trace.summary() if trace else None,
+    }
+
+def sse_event(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @app.get("/")
 def read_root():
     return {"message": "Hello World"}
 
+@app.get("/artifacts/{artifact_id}")
+def get_artifact(artifact_id: str, request: Request):
+    """A stored clone output by id, with ETag, gzip/brotli and Range support"""
+    if scraper.artifacts is None:
+        raise HTTPException(status_code=404, detail="Artifact store is disabled")
+    return artifact_response(scraper.artifacts, artifact_id, request.headers)
+
+@app.get("/metrics")
+def metrics():
+    """Phase timings, token counts and cache results in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+async def run_clone(request: CloneRequest) -> CloneResponse:
+    """Capture the page and run the multi-stage generation; raises HTTPException on failure"""
+    logger.info(f"Starting enhanced clone process for: {request.url}")
+    llm_cache_bypass.set(not request.use_llm_cache)
+    trace = start_trace()
+
+    # Steps 1 and 2: design context and screenshots from a single page load
+    logger.info("Extracting comprehensive DOM structure and screenshots...")
+    with span("capture"):
+        design_context, screenshots, capture_info = await scraper.capture_page(
+            request.url,
+            readiness_overrides(request),
+            request.use_cache,
+            full_page=request.sections,
+            fast_path=request.fast_path,
+            screenshots=request.screenshots,
+        )
+
+    if not design_context:
+        raise HTTPException(status_code=400, detail="Failed to extract website data")
+
+    # Step 3: Generate HTML using multi-stage process, optionally hedged with
+    # single-pass or split into concurrently generated sections
+    hedge = None
+    sections = None
+    stages: Dict[str, str] = {}
+    generation_method = "multi-stage"
+    if request.sections:
+        logger.info("Generating HTML clone section by section...")
+        with span("generation", "sections"):
+            cloned_html, sections = await scraper.generate_clone_html_sections(
+                design_context, screenshots, stages
+            )
+        generation_method = sections.get("fallback") or "sections"
+    elif request.hedge:
+        logger.info("Generating HTML clone with hedged multi-stage and single-pass...")
+        with span("generation", "hedged"):
+            cloned_html, hedge = await scraper.generate_clone_html_hedged(
+                design_context,
+                screenshots,
+                delay=settings.hedge_delay if request.hedge_delay is None else request.hedge_delay,
+                grace=settings.hedge_grace,
+                stages=stages,
+            )
+        generation_method = hedge["winner"] or generation_method
+    else:
+        logger.info("Generating HTML clone using multi-stage process...")
+        with span("generation", "multi-stage"):
+            cloned_html = await scraper.generate_clone_html_multistage(
+                design_context, screenshots, stages
+            )
+
+    if not cloned_html:
+        raise HTTPException(status_code=500, detail="Failed to generate HTML clone")
+
+    artifacts = await scraper.store_artifacts(cloned_html, stages, screenshots)
+
+    logger.info("Enhanced clone process completed successfully")
+
+    return CloneResponse(
+        success=True,
+        html=None if request.return_artifacts and artifacts else cloned_html,
+        metadata=clone_metadata(
+            request,
+            design_context,
+            screenshots,
+            capture_info,
+            generation_method,
+            hedge,
+            trace,
+            sections,
+            artifacts,
+        )
+    )
+
+clone_jobs = JobQueue(
+    run_clone,
+    workers=settings.clone_job_workers,
+    max_queued=settings.clone_job_queue_size,
+    result_ttl=settings.clone_job_result_ttl,
+)
+
+class CloneJobStatus(BaseModel):
+    job_id: str
+    status: str
+    queue_position: Optional[int] = None
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[CloneResponse] = None
+    error: Optional[str] = None
+
+def job_status(job: CloneJob) -> CloneJobStatus:
+    return CloneJobStatus(
+        job_id=job.id,
+        status=job.status,
+        queue_position=clone_jobs.position(job),
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        result=job.result,
+        error=job.error,
+    )
+
 @app.post("/clone", response_model=CloneResponse)
 async def clone_website(request: CloneRequest):
     """Clone a website using the enhanced multi-stage process"""
     try:
-        logger.info(f"Starting enhanced clone process for: {request.url}")
-        
-        # Step 1: Extract comprehensive design context
-        logger.info("Extracting comprehensive DOM structure...")
-        design_context = await scraper.extract_comprehensive_dom(request.url)
-        
-        if not design_context:
-            raise HTTPException(status_code=400, detail="Failed to extract website data")
-        
-        # Step 2: Capture multiple screenshots
-        logger.info("Capturing screenshots...")
-        screenshots = await scraper.capture_multiple_screenshots(request.url)
-        
-        # Step 3: Generate HTML using multi-stage process
-        logger.info("Generating HTML clone using multi-stage process...")
-        cloned_html = await scraper.generate_clone_html_multistage(design_context, screenshots)
-        
-        if not cloned_html:
-            raise HTTPException(status_code=500, detail="Failed to generate HTML clone")
-        
-        logger.info("Enhanced clone process completed successfully")
-        
-        metadata = {
-            "original_url": str(request.url),
-            "content_sections_extracted": len(design_context.get('content_sections', [])),
-            "navigation_elements": len(design_context.get('navigation_structure', [])),
-            "visual_elements_found": len(design_context.get('visual_elements', {}).get('images', [])),
-            "layout_type": design_context.get('layout_analysis', {}).get('structure_type', 'unknown'),
-            "has_screenshots": len(screenshots) > 0,
-            "responsive_detected": design_context.get('responsive_indicators', {}).get('count', 0) > 0,
-            "interactive_elements": design_context.get('interactive_elements', {}),
-            "generation_method": "multi-stage"
-        }
-        
-        return CloneResponse(
-            success=True,
-            html=cloned_html,
-            metadata=metadata
-        )
+        with span("request", "clone"):
+            return await run_clone(request)
         
     except HTTPException:
         # Re-raise HTTP exceptions
@@ -88,35 +279,265 @@ async def clone_website(request: CloneRequest):
             metadata={"error_type": type(e).__name__}
         )
 
+@app.post("/clone/jobs", response_model=CloneJobStatus, status_code=202)
+async def submit_clone_job(request: CloneRequest):
+    """Queue a clone and return its job id; 429 with Retry-After when the queue is full"""
+    try:
+        job = clone_jobs.submit(request)
+    except QueueFull as e:
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return JSONResponse(
+        status_code=202,
+        content=job_status(job).model_dump(),
+        headers={"Location": f"/clone/jobs/{job.id}"},
+    )
+
+@app.get("/clone/jobs/{job_id}", response_model=CloneJobStatus)
+async def get_clone_job(job_id: str):
+    """Status of a queued clone, with the CloneResponse once it has finished"""
+    job = clone_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job_status(job)
+
+@app.post("/clone/site", response_model=CloneSiteResponse)
+async def clone_site(request: CloneSiteRequest):
+    """Clone a site's root page and the pages its navigation links to, sharing one stylesheet"""
+    try:
+        logger.info(f"Starting site clone for: {request.url}")
+        llm_cache_bypass.set(not request.use_llm_cache)
+        trace = start_trace()
+        max_pages = max(1, min(request.max_pages, settings.site_max_pages))
+
+        with span("request", "site"):
+            pages, stylesheet, site_info = await scraper.clone_site(
+                request.url, max_pages, readiness_overrides(request), request.use_cache
+            )
+
+        logger.info("Site clone completed successfully")
+        return CloneSiteResponse(
+            success=True,
+            pages=pages,
+            stylesheet=stylesheet,
+            metadata={
+                "original_url": str(request.url),
+                "generation_method": "site",
+                **site_info,
+                "timings": trace.summary(),
+            },
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Site clone failed: {e}")
+        return CloneSiteResponse(
+            success=False,
+            error=str(e),
+            metadata={"error_type": type(e).__name__}
+        )
+
+def batch_key(request: CloneRequest) -> str:
+    """Items with the same normalized URL and options are cloned once"""
+    options = request.model_dump(mode="json", exclude={"url"})
+    return f"{normalize_url(str(request.url))} {json.dumps(options, sort_keys=True)}"
+
+@app.post("/clone/batch")
+async def clone_batch(batch: CloneBatchRequest):
+    """Clone many URLs at once, streamed as Server-Sent Events as each one finishes"""
+    if not batch.items:
+        raise HTTPException(status_code=400, detail="Batch has no items")
+    if len(batch.items) > settings.clone_batch_max_items:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch has {len(batch.items)} items, the limit is {settings.clone_batch_max_items}",
+        )
+
+    concurrency = min(
+        batch.concurrency or settings.clone_batch_concurrency,
+        settings.clone_batch_concurrency,
+    )
+    clones = CloneBatch(run_clone, batch.items, batch_key, concurrency)
+
+    async def events():
+        yield sse_event("accepted", {
+            "items": len(clones.items),
+            "unique": len(clones.unique),
+            "duplicates": [
+                {"index": item.index, "duplicate_of": item.duplicate_of}
+                for item in clones.items
+                if item.duplicate_of is not None
+            ],
+        })
+
+        cache_status = Counter()
+        async for item in clones.run():
+            if item.status == "succeeded":
+                response = item.result
+                if item.duplicate_of is None:
+                    cache_status[response.metadata["cache_status"]] += 1
+            else:
+                response = CloneResponse(success=False, error=item.error)
+            yield sse_event("item", {
+                "index": item.index,
+                "url": str(item.payload.url),
+                "status": item.status,
+                "duplicate_of": item.duplicate_of,
+                "seconds": item.seconds,
+                "response": response.model_dump(),
+            })
+
+        yield sse_event("summary", {**clones.stats(), "cache_status": dict(cache_status)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/clone/stream")
+async def clone_website_stream(request: CloneRequest):
+    """Multi-stage clone streamed as Server-Sent Events, one event per finished stage
+
+    Hedged and sectioned generation have no stages to stream, so requests
+    asking for either are rejected rather than run as a plain multi-stage clone.
+    """
+    unsupported = [
+        field
+        for field, requested in (
+            ("hedge", request.hedge),
+            ("hedge_delay", request.hedge_delay is not None),
+            ("sections", request.sections),
+        )
+        if requested
+    ]
+    if unsupported:
+        raise HTTPException(
+            status_code=422,
+            detail=f"{', '.join(unsupported)} not supported by /clone/stream; use /clone",
+        )
+
+    async def events():
+        try:
+            logger.info(f"Starting streamed clone process for: {request.url}")
+            llm_cache_bypass.set(not request.use_llm_cache)
+            trace = start_trace()
+
+            with span("capture"):
+                design_context, screenshots, capture_info = await scraper.capture_page(
+                    request.url,
+                    readiness_overrides(request),
+                    request.use_cache,
+                    fast_path=request.fast_path,
+                    screenshots=request.screenshots,
+                )
+
+            if not design_context:
+                yield sse_event("error", {"error": "Failed to extract website data"})
+                return
+
+            yield sse_event("dom_extracted", {
+                "content_sections_extracted": len(design_context.get('content_sections', [])),
+                "navigation_elements": len(design_context.get('navigation_structure', [])),
+                "layout_type": design_context.get('layout_analysis', {}).get('structure_type', 'unknown'),
+                "cache_status": capture_info["cache_status"],
+                "capture_path": capture_info["capture_path"],
+            })
+            yield sse_event("screenshots_ready", {"viewports": list(screenshots)})
+
+            stages = {}
+            async for stage, html in scraper.iter_clone_html_multistage(design_context, screenshots):
+                stages[stage] = html
+                if stage != "final":
+                    yield sse_event(f"{stage}_html", {"stage": stage, "html": html})
+                    continue
+
+                artifacts = (
+                    await scraper.store_artifacts(html, stages, screenshots) if html else None
+                )
+                response = CloneResponse(
+                    success=bool(html),
+                    html=None if request.return_artifacts and artifacts else html,
+                    error=None if html else "Failed to generate HTML clone",
+                    metadata=clone_metadata(
+                        request,
+                        design_context,
+                        screenshots,
+                        capture_info,
+                        trace=trace,
+                        artifacts=artifacts,
+                    )
+                )
+                yield sse_event("final_html", response.model_dump())
+
+            logger.info("Streamed clone process completed")
+
+        except Exception as e:
+            logger.error(f"Streamed clone process failed: {e}")
+            yield sse_event("error", {
+                "error": getattr(e, "detail", None) or str(e),
+                "error_type": type(e).__name__,
+            })
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/fallback", response_model=CloneResponse)
 async def clone_website_legacy(request: CloneRequest):
     """Fallback to single-stage cloning if multi-stage fails"""
     try:
         logger.info(f"Starting legacy clone process for: {request.url}")
+        llm_cache_bypass.set(not request.use_llm_cache)
+        trace = start_trace()
         
-        # Extract design context
-        design_context = await scraper.extract_comprehensive_dom(request.url)
+        # Extract design context and screenshots, usually cached by a failed /clone
+        with span("capture"):
+            design_context, screenshots, capture_info = await scraper.capture_page(
+                request.url,
+                readiness_overrides(request),
+                request.use_cache,
+                fast_path=request.fast_path,
+                screenshots=request.screenshots,
+            )
         
         if not design_context:
             raise HTTPException(status_code=400, detail="Failed to extract website data")
         
-        # Capture single screenshot
-        screenshots = await scraper.capture_multiple_screenshots(request.url)
         screenshot = screenshots.get('desktop') if screenshots else None
         
         # Use the original single-pass generation method
         # You'll need to add this method to your EnhancedWebsiteScraper class
-        cloned_html = await scraper.generate_clone_html_single_pass(design_context, screenshot)
+        with span("generation", "single-pass"):
+            cloned_html = await scraper.generate_clone_html_single_pass(design_context, screenshot)
         
         logger.info("Legacy clone process completed")
+        artifacts = (
+            await scraper.store_artifacts(cloned_html, screenshots=screenshots)
+            if cloned_html
+            else None
+        )
         
         return CloneResponse(
             success=True,
-            html=cloned_html,
+            html=None if request.return_artifacts and artifacts else cloned_html,
             metadata={
                 "original_url": str(request.url),
                 "generation_method": "single-pass-legacy",
-                "has_screenshot": screenshot is not None
+                "has_screenshot": screenshot is not None,
+                "readiness_wait": capture_info["readiness_wait"],
+                "cache_status": capture_info["cache_status"],
+                "parse": capture_info["parse"],
+                "capture_path": capture_info["capture_path"],
+                "resources": capture_info["resources"],
+                "artifacts": artifacts,
+                "timings": trace.summary(),
             }
         )
         
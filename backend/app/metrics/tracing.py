@@ -0,0 +1,106 @@
+# timing spans recorded into /metrics histograms and the current request's trace
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+from app.metrics.registry import TOKEN_BUCKETS, registry
+
+logger = logging.getLogger(__name__)
+
+PHASE_SECONDS = registry.histogram(
+    "nuvio_phase_seconds",
+    "Time spent per pipeline phase",
+    ("phase", "detail"),
+)
+LLM_TOKENS = registry.histogram(
+    "nuvio_llm_tokens",
+    "Prompt and response tokens per model call",
+    ("stage", "kind"),
+    buckets=TOKEN_BUCKETS,
+)
+CACHE_EVENTS = registry.counter(
+    "nuvio_cache_events_total",
+    "Cache lookups by cache and result",
+    ("cache", "result"),
+)
+
+
+class Trace:
+    """Per-request totals of every span, token count and cache result
+
+    Shared by the request's tasks and browser threads, hence the lock.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.spans: Dict[str, float] = {}
+        self.tokens: Dict[str, Dict[str, int]] = {}
+        self.cache: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, key: str, seconds: float):
+        with self._lock:
+            self.spans[key] = self.spans.get(key, 0) + seconds
+
+    def add_tokens(self, stage: str, kind: str, count: int):
+        with self._lock:
+            stage_tokens = self.tokens.setdefault(stage, {})
+            stage_tokens[kind] = stage_tokens.get(kind, 0) + count
+
+    def add_cache(self, cache: str, result: str):
+        with self._lock:
+            results = self.cache.setdefault(cache, {})
+            results[result] = results.get(result, 0) + 1
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                "total_seconds": round(time.monotonic() - self.started, 3),
+                "spans": {key: round(value, 3) for key, value in self.spans.items()},
+                "tokens": {stage: dict(counts) for stage, counts in self.tokens.items()},
+                "cache": {cache: dict(results) for cache, results in self.cache.items()},
+            }
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def start_trace() -> Trace:
+    """Begin a trace for the current request; tasks and threads started after inherit it"""
+    trace = Trace()
+    current_trace.set(trace)
+    return trace
+
+
+@contextmanager
+def span(phase: str, detail: str = ""):
+    """Time a block into nuvio_phase_seconds and the current trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        PHASE_SECONDS.observe(seconds, phase, detail)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add_span(f"{phase}:{detail}" if detail else phase, seconds)
+
+
+def record_tokens(stage: str, prompt_tokens: Optional[int], response_tokens: Optional[int]):
+    for kind, count in (("prompt", prompt_tokens), ("response", response_tokens)):
+        if count is None:
+            continue
+        LLM_TOKENS.observe(count, stage, kind)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.add_tokens(stage, kind, count)
+
+
+def record_cache(cache: str, result: str):
+    CACHE_EVENTS.inc(cache, result)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_cache(cache, result)
@@ -0,0 +1,83 @@
+# single regex pass over stylesheet text collecting colors, fonts and sizes by property
+
+import re
+from collections import Counter
+from typing import Dict, List
+
+COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+DECLARATION_RE = re.compile(r"(--[\w-]+|[a-z-]+)\s*:\s*([^;{}]+)", re.I)
+COLOR_RE = re.compile(
+    r"#[0-9a-f]{8}\b|#[0-9a-f]{6}\b|#[0-9a-f]{3,4}\b|(?:rgb|hsl)a?\([^)]*\)", re.I
+)
+SIZE_RE = re.compile(r"-?\d*\.?\d+(?:px|r?em|%|vw|vh|pt)\b|\b(?:clamp|calc|min|max)\([^;]*\)", re.I)
+IMPORT_RE = re.compile(
+    r"""@import\s+(?:url\(\s*)?['"]?([^'")\s;]+)['"]?\s*\)?[^;]*;""", re.I
+)
+
+TEXT_COLOR_PROPERTIES = {"color", "fill", "stroke", "caret-color", "text-decoration-color"}
+BACKGROUND_PROPERTIES = {"background", "background-color", "background-image"}
+BORDER_PREFIXES = ("border", "outline")
+
+
+class CssTokens:
+    """Counts of the colors, font families and sizes declared in some CSS"""
+
+    def __init__(self):
+        self.text_colors: Counter = Counter()
+        self.background_colors: Counter = Counter()
+        self.border_colors: Counter = Counter()
+        self.other_colors: Counter = Counter()
+        self.font_families: Counter = Counter()
+        self.font_sizes: Counter = Counter()
+        self.custom_properties: Dict[str, str] = {}
+
+    def scan(self, css: str) -> "CssTokens":
+        css = COMMENT_RE.sub("", css)
+        for match in DECLARATION_RE.finditer(css):
+            name = match.group(1).lower()
+            value = match.group(2).replace("!important", "").strip()
+            if name.startswith("--"):
+                self.custom_properties.setdefault(name, value)
+                self.other_colors.update(color.lower() for color in COLOR_RE.findall(value))
+            elif name == "font-family":
+                self.font_families[" ".join(value.split())] += 1
+            elif name == "font-size":
+                self.font_sizes[value.lower()] += 1
+            elif name == "font":
+                self.font_sizes.update(size.lower() for size in SIZE_RE.findall(value)[:1])
+            else:
+                colors = [color.lower() for color in COLOR_RE.findall(value)]
+                if not colors:
+                    continue
+                if name in TEXT_COLOR_PROPERTIES:
+                    self.text_colors.update(colors)
+                elif name in BACKGROUND_PROPERTIES:
+                    self.background_colors.update(colors)
+                elif name.startswith(BORDER_PREFIXES):
+                    self.border_colors.update(colors)
+                else:
+                    self.other_colors.update(colors)
+        return self
+
+    def palette(self, limit: int = 12) -> List[str]:
+        """Most used colors across every property"""
+        combined = (
+            self.text_colors + self.background_colors + self.border_colors + self.other_colors
+        )
+        return [color for color, _ in combined.most_common(limit)]
+
+    def summary(self, limit: int = 12) -> Dict:
+        return {
+            "text_colors": dict(self.text_colors.most_common(limit)),
+            "background_colors": dict(self.background_colors.most_common(limit)),
+            "border_colors": dict(self.border_colors.most_common(limit)),
+            "palette": self.palette(limit),
+            "font_families": dict(self.font_families.most_common(limit)),
+            "font_sizes": dict(self.font_sizes.most_common(limit)),
+            "custom_properties": dict(list(self.custom_properties.items())[: limit * 2]),
+        }
+
+
+def import_urls(css: str) -> List[str]:
+    """Targets of the @import rules in a stylesheet, in order"""
+    return IMPORT_RE.findall(COMMENT_RE.sub("", css))
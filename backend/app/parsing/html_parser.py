@@ -0,0 +1,122 @@
+# pluggable HTML parser backends for turning page_source into a BeautifulSoup tree
+
+import importlib.util
+import logging
+import time
+from typing import Dict, List
+from bs4 import BeautifulSoup
+from app.metrics.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class ParserBackend:
+    """One way of building a BeautifulSoup tree; `module` must be importable to use it"""
+
+    name = ""
+    module = ""
+
+    def available(self) -> bool:
+        return importlib.util.find_spec(self.module) is not None
+
+    def parse(self, html: str) -> BeautifulSoup:
+        raise NotImplementedError
+
+
+class LxmlBackend(ParserBackend):
+    """libxml2 through bs4's lxml tree builder"""
+
+    name = "lxml"
+    module = "lxml"
+
+    def parse(self, html: str) -> BeautifulSoup:
+        return BeautifulSoup(html, "lxml")
+
+
+class Html5ParserBackend(ParserBackend):
+    """Gumbo-based HTML5 parser building the soup tree directly from C"""
+
+    name = "html5-parser"
+    module = "html5_parser"
+
+    def parse(self, html: str) -> BeautifulSoup:
+        from html5_parser import parse
+
+        return parse(html, treebuilder="soup")
+
+
+class PythonBackend(ParserBackend):
+    """The standard library parser; always available"""
+
+    name = "html.parser"
+    module = "html.parser"
+
+    def parse(self, html: str) -> BeautifulSoup:
+        return BeautifulSoup(html, "html.parser")
+
+
+BACKENDS: Dict[str, ParserBackend] = {
+    backend.name: backend
+    for backend in (LxmlBackend(), Html5ParserBackend(), PythonBackend())
+}
+
+# html5-parser is opt-in: its tree is not yet checked against the extractor
+AUTO_ORDER = ("lxml", "html.parser")
+
+
+class ParsedPage:
+    """A parsed document plus which backend built it and how long that took"""
+
+    def __init__(self, soup: BeautifulSoup, backend: str, seconds: float, size: int):
+        self.soup = soup
+        self.backend = backend
+        self.seconds = seconds
+        self.size = size
+
+    def summary(self) -> Dict:
+        return {
+            "backend": self.backend,
+            "seconds": round(self.seconds, 4),
+            "bytes": self.size,
+        }
+
+
+class HTMLParser:
+    """Parses HTML with the configured backend, or the fastest installed one for "auto" """
+
+    def __init__(self, preference: str = "auto"):
+        self.backend = self._select(preference)
+
+    def parse(self, html: str) -> ParsedPage:
+        start = time.perf_counter()
+        with span("parse", self.backend.name):
+            soup = self.backend.parse(html)
+        parsed = ParsedPage(soup, self.backend.name, time.perf_counter() - start, len(html))
+        logger.info(
+            f"Parsed {parsed.size} chars with {parsed.backend} in {parsed.seconds:.3f}s"
+        )
+        return parsed
+
+    def _select(self, preference: str) -> ParserBackend:
+        candidates: List[str] = list(AUTO_ORDER)
+        if preference != "auto":
+            if preference not in BACKENDS:
+                raise ValueError(
+                    f"Unknown HTML parser {preference!r}, expected one of: "
+                    f"auto, {', '.join(BACKENDS)}"
+                )
+            candidates = [preference, "html.parser"]
+
+        for name in candidates:
+            backend = BACKENDS[name]
+            if backend.available():
+                if name != candidates[0]:
+                    logger.warning(
+                        f"HTML parser {candidates[0]} is not installed, using {name}"
+                    )
+                return backend
+        return BACKENDS["html.parser"]
+
+
+def available_backends() -> List[str]:
+    return [name for name, backend in BACKENDS.items() if backend.available()]
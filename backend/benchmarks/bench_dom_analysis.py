@@ -0,0 +1,414 @@
+# micro-benchmark: single-pass DOM analysis vs the per-feature find_all helpers it replaced
+#
+#   uv run python -m benchmarks.bench_dom_analysis [fixture.html | fixture_dir ...]
+#
+# Save real pages (e.g. a browser's "Save page as" or driver.page_source dumps)
+# and pass them in; without arguments a synthetic page of --sections blocks is used.
+# Every installed parser backend is timed too, and its extractor output is
+# checked against the html.parser tree.
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Callable, List, Tuple
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.clone.analysis import analyze_design_context  # noqa: E402
+from app.parsing.html_parser import BACKENDS, available_backends  # noqa: E402
+
+
+# --- legacy reference: the helpers as they were on EnchancedWebsiteScraper ---
+
+
+def legacy_design_context(soup, base_url):
+    return {
+        "basic_info": {
+            "title": soup.title.string if soup.title else "",
+            "meta_description": _get_meta_description(soup),
+            "lang": soup.html.get("lang") if soup.html else "en",
+        },
+        "layout_analysis": _analyze_layout_comprehensive(soup),
+        "content_sections": _extract_content_sections(soup),
+        "navigation_structure": _extract_navigation_detailed(soup),
+        "visual_elements": _extract_visual_elements(soup, base_url),
+        "typography_system": _analyze_typography_system(soup),
+        "color_analysis": _analyze_colors_comprehensive(soup),
+        "responsive_indicators": _detect_responsive_patterns(soup),
+        "js_analysis": None,
+        "form_elements": _extract_forms(soup),
+        "interactive_elements": _extract_interactive_elements(soup),
+    }
+
+
+def _analyze_layout_comprehensive(soup):
+    """Comprehensive layout analysis"""
+    layout = {
+        "structure_type": "unknown",
+        "header": _analyze_header(soup),
+        "main_content": _analyze_main_content(soup),
+        "sidebar": _analyze_sidebar(soup),
+        "footer": _analyze_footer(soup),
+        "grid_systems": _detect_grid_systems(soup),
+        "container_patterns": _analyze_containers(soup),
+    }
+
+    if soup.find_all(class_=lambda x: x and "grid" in str(x).lower()):
+        layout["structure_type"] = "grid"
+    elif soup.find_all(class_=lambda x: x and "flex" in str(x).lower()):
+        layout["structure_type"] = "flexbox"
+    elif soup.find(
+        ["aside", "div"], class_=lambda x: x and "sidebar" in str(x).lower()
+    ):
+        layout["structure_type"] = "sidebar"
+    else:
+        layout["structure_type"] = "standard"
+
+    return layout
+
+def _extract_content_sections(soup):
+    """Extract and categorize content sections"""
+    sections = []
+
+    for section in soup.find_all(["section", "article", "div"], class_=True):
+        classes = " ".join(section.get("class", []))
+
+        section_data = {
+            "tag": section.name,
+            "classes": section.get("class", []),
+            "content_type": _classify_content_type(section, classes),
+            "text_content": section.get_text(strip=True)[:300],
+            "child_elements": [
+                child.name for child in section.find_all() if child.name
+            ][:10],
+            "has_background_image": bool(
+                section.find(style=lambda x: x and "background-image" in str(x))
+            ),
+            "estimated_importance": _estimate_section_importance(section),
+        }
+        sections.append(section_data)
+
+    return sections[:25]  
+
+def _classify_content_type(element, classes):
+    """Classify the type of content section"""
+    text = element.get_text().lower()
+    classes_lower = classes.lower()
+
+    if any(term in classes_lower for term in ["hero", "banner", "jumbotron"]):
+        return "hero"
+    elif any(term in classes_lower for term in ["card", "feature", "service"]):
+        return "feature_card"
+    elif any(term in classes_lower for term in ["testimonial", "review"]):
+        return "testimonial"
+    elif any(term in classes_lower for term in ["contact", "form"]):
+        return "contact"
+    elif any(term in text for term in ["about", "mission", "vision"]):
+        return "about"
+    elif element.find_all(["h1", "h2", "h3"]):
+        return "content_section"
+    else:
+        return "generic"
+
+def _analyze_typography_system(soup):
+    """Analyze typography patterns and hierarchy"""
+    typography = {
+        "headings": {},
+        "body_text": [],
+        "font_families": set(),
+        "font_sizes": set(),
+        "text_colors": set(),
+    }
+
+    for level in range(1, 7):
+        headings = soup.find_all(f"h{level}")
+        if headings:
+            typography["headings"][f"h{level}"] = []
+            for heading in headings[:3]:
+                typography["headings"][f"h{level}"].append(
+                    {
+                        "text": heading.get_text(strip=True),
+                        "classes": heading.get("class", []),
+                        "style": heading.get("style", ""),
+                    }
+                )
+
+    return typography
+
+def _analyze_colors_comprehensive(soup):
+    """Comprehensive color analysis"""
+    colors = {
+        "background_colors": [],
+        "text_colors": [],
+        "border_colors": [],
+        "dominant_palette": [],
+    }
+
+    for elem in soup.find_all(style=True):
+        style = elem.get("style", "")
+
+        bg_match = re.search(r"background-color:\s*([^;]+)", style)
+        if bg_match:
+            colors["background_colors"].append(bg_match.group(1).strip())
+
+        color_match = re.search(r"(?<![a-z])color:\s*([^;]+)", style)
+        if color_match:
+            colors["text_colors"].append(color_match.group(1).strip())
+
+    return colors
+
+def _get_meta_description(soup):
+    meta_desc = soup.find("meta", attrs={"name": "description"})
+    return meta_desc.get("content", "") if meta_desc else ""
+
+def _analyze_header(soup):
+    header = soup.find("header") or soup.find(
+        "div", class_=lambda x: x and "header" in str(x).lower()
+    )
+    return {
+        "exists": bool(header),
+        "content": header.get_text(strip=True)[:200] if header else "",
+    }
+
+def _analyze_main_content(soup):
+    main = soup.find("main") or soup.find(
+        "div", class_=lambda x: x and "main" in str(x).lower()
+    )
+    return {
+        "exists": bool(main),
+        "sections": len(main.find_all(["section", "div"])) if main else 0,
+    }
+
+def _analyze_sidebar(soup):
+    sidebar = soup.find("aside") or soup.find(
+        "div", class_=lambda x: x and "sidebar" in str(x).lower()
+    )
+    return {"exists": bool(sidebar)}
+
+def _analyze_footer(soup):
+    footer = soup.find("footer") or soup.find(
+        "div", class_=lambda x: x and "footer" in str(x).lower()
+    )
+    return {
+        "exists": bool(footer),
+        "content": footer.get_text(strip=True)[:200] if footer else "",
+    }
+
+def _detect_grid_systems(soup):
+    grid_elements = soup.find_all(
+        class_=lambda x: x
+        and any(term in str(x).lower() for term in ["grid", "col", "row"])
+    )
+    return {
+        "count": len(grid_elements),
+        "classes": [" ".join(el.get("class", [])) for el in grid_elements[:5]],
+    }
+
+def _analyze_containers(soup):
+    containers = soup.find_all(class_=lambda x: x and "container" in str(x).lower())
+    return {"count": len(containers)}
+
+def _extract_navigation_detailed(soup):
+    nav_elements = soup.find_all(
+        ["nav", "div"], class_=lambda x: x and "nav" in str(x).lower()
+    )
+    navigation = []
+    for nav in nav_elements[:3]:
+        links = [
+            {"text": a.get_text(strip=True), "href": a.get("href", "")}
+            for a in nav.find_all("a")[:10]
+        ]
+        navigation.append({"classes": nav.get("class", []), "links": links})
+    return navigation
+
+def _extract_visual_elements(soup, base_url):
+    images = []
+    for img in soup.find_all("img")[:10]:
+        images.append(
+            {
+                "src": urljoin(base_url, img.get("src", "")),
+                "alt": img.get("alt", ""),
+                "classes": img.get("class", []),
+            }
+        )
+    return {"images": images}
+
+def _detect_responsive_patterns(soup):
+    responsive_classes = soup.find_all(
+        class_=lambda x: x
+        and any(
+            term in str(x).lower()
+            for term in [
+                "responsive",
+                "mobile",
+                "tablet",
+                "desktop",
+                "sm",
+                "md",
+                "lg",
+                "xl",
+            ]
+        )
+    )
+    return {"count": len(responsive_classes)}
+
+def _extract_forms(soup):
+    forms = []
+    for form in soup.find_all("form")[:3]:
+        inputs = [
+            {"type": inp.get("type", ""), "name": inp.get("name", "")}
+            for inp in form.find_all("input")
+        ]
+        forms.append({"action": form.get("action", ""), "inputs": inputs})
+    return forms
+
+def _extract_interactive_elements(soup):
+    interactive = {
+        "buttons": len(soup.find_all("button")),
+        "links": len(soup.find_all("a")),
+        "modals": len(
+            soup.find_all(class_=lambda x: x and "modal" in str(x).lower())
+        ),
+        "dropdowns": len(
+            soup.find_all(class_=lambda x: x and "dropdown" in str(x).lower())
+        ),
+    }
+    return interactive
+
+def _estimate_section_importance(section):
+    # Simple importance scoring based on position and content
+    score = 0
+    if section.find(["h1", "h2"]):
+        score += 3
+    if any(
+        term in " ".join(section.get("class", [])).lower()
+        for term in ["hero", "main", "primary"]
+    ):
+        score += 5
+    if len(section.get_text(strip=True)) > 100:
+        score += 2
+    return score
+
+# --- fixtures ---
+
+
+def synthetic_page(sections: int) -> str:
+    """Marketing-style page: nav, hero, card grids, testimonials, forms, footer"""
+    nav_links = "".join(
+        f'<li class="nav-item"><a class="nav-link" href="/p{i}">Page {i}</a></li>'
+        for i in range(12)
+    )
+    blocks = []
+    for i in range(sections):
+        cards = "".join(
+            f'<div class="col-md-4 col-sm-12"><div class="card feature shadow-sm" '
+            f'style="background-color: #f{j}f{j}f{j}; border-radius: 8px">'
+            f'<img class="card-img" src="/img/{i}-{j}.png" alt="Feature {j}">'
+            f'<h3 class="card-title">Feature {i}.{j}</h3>'
+            f'<p class="card-text" style="color: #33{j}">Lorem ipsum dolor sit amet, '
+            f"consectetur adipiscing elit, sed do eiusmod tempor incididunt.</p>"
+            f'<a class="btn btn-primary" href="/f/{i}/{j}">Learn more</a></div></div>'
+            for j in range(6)
+        )
+        blocks.append(
+            f'<section class="section py-lg-5 {"bg-light" if i % 2 else ""}">'
+            f'<div class="container"><div class="row">'
+            f'<div class="col-12"><h2 class="display-6">Section {i}</h2>'
+            f"<p>Our mission and vision for block {i}.</p></div>{cards}</div>"
+            f'<div class="testimonial review"><blockquote><span>"Great"</span></blockquote>'
+            f'<button class="btn dropdown-toggle">More</button>'
+            f'<div class="dropdown-menu"><a href="#a{i}">A</a><a href="#b{i}">B</a></div>'
+            f"</div></div></section>"
+        )
+    return f"""<!DOCTYPE html>
+<html lang="en"><head><title>Benchmark page</title>
+<meta name="description" content="Synthetic page for the DOM analysis benchmark">
+<style>body {{ margin: 0 }}</style><script>window.dataLayer = [];</script></head>
+<body><header class="site-header sticky-top"><nav class="navbar navbar-expand-lg">
+<div class="container"><ul class="navbar-nav">{nav_links}</ul></div></nav></header>
+<main class="main-content"><section class="hero banner" style="background-image: url(/hero.jpg)">
+<h1 class="hero-title">Build faster</h1><p>About our product</p></section>
+{"".join(blocks)}
+<div class="contact"><form action="/subscribe"><input type="email" name="email">
+<input type="submit" name="go"></form></div>
+<div class="modal fade"><div class="modal-dialog"><button>Close</button></div></div>
+</main><footer class="footer"><p>&copy; Benchmark</p><!-- generated --></footer>
+</body></html>"""
+
+
+def load_fixtures(paths: List[str], sections: int) -> List[Tuple[str, str]]:
+    fixtures = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith((".html", ".htm")):
+                    fixtures.extend(load_fixtures([os.path.join(path, name)], sections))
+        else:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                fixtures.append((os.path.basename(path), f.read()))
+    if not fixtures:
+        fixtures.append((f"synthetic-{sections}-sections", synthetic_page(sections)))
+    return fixtures
+
+
+def best_of(fn: Callable, repeat: int) -> Tuple[float, float, object]:
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare single-pass DOM analysis with the legacy helpers"
+    )
+    parser.add_argument("fixtures", nargs="*", help="HTML files or directories")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--base-url", default="https://example.com/")
+    args = parser.parse_args()
+
+    failed = False
+    for name, html in load_fixtures(args.fixtures, args.sections):
+        soup = BACKENDS["html.parser"].parse(html)
+        nodes = sum(1 for _ in soup.descendants)
+
+        legacy_best, legacy_median, expected = best_of(
+            lambda: legacy_design_context(soup, args.base_url), args.repeat
+        )
+        engine_best, engine_median, actual = best_of(
+            lambda: analyze_design_context(soup, args.base_url), args.repeat
+        )
+
+        identical = expected == actual and list(expected) == list(actual)
+        failed = failed or not identical
+        print(
+            f"{name}: {len(html) / 1024:.0f} KiB, {nodes} nodes\n"
+            f"  legacy helpers   best {legacy_best * 1000:8.1f} ms  median {legacy_median * 1000:8.1f} ms\n"
+            f"  single pass      best {engine_best * 1000:8.1f} ms  median {engine_median * 1000:8.1f} ms\n"
+            f"  speedup {legacy_best / engine_best:.1f}x, output {'identical' if identical else 'DIFFERS'}"
+        )
+
+        for backend in available_backends():
+            parse_best, parse_median, parsed = best_of(
+                lambda: BACKENDS[backend].parse(html), args.repeat
+            )
+            same = analyze_design_context(parsed, args.base_url) == actual
+            failed = failed or not same
+            print(
+                f"  parse {backend:<14} best {parse_best * 1000:8.1f} ms  median {parse_median * 1000:8.1f} ms"
+                f"  extractor output {'identical' if same else 'DIFFERS'}"
+            )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
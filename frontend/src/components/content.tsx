@@ -15,6 +15,7 @@ interface ContentProps {
     };
   } | null;
   loading: boolean;
+  stage?: string | null;
   previewMode: "preview" | "code";
   setPreviewMode: (mode: "preview" | "code") => void;
   downloadHtml: () => void;
@@ -23,18 +24,19 @@ interface ContentProps {
 const Content = ({
   result,
   loading,
+  stage,
   previewMode,
   setPreviewMode,
   downloadHtml,
 }: ContentProps) => {
   return (
     <>
-      {loading && (
+      {loading && !result && (
         <div className="w-full max-w-6xl mt-8 bg-gray-900/50 backdrop-blur-sm border border-gray-800 rounded-xl shadow-2xl p-6">
           <div className="flex  flex-col items-center justify-center h-96">
             <Loader2 className="animate-spin text-cyan-500 w-12 h-12" />
           <div className="text-center text-gray-400 mt-4">
-            Cloning the website, please wait...
+            {stage || "Cloning the website, please wait..."}
           </div>
           </div>
         </div>
@@ -45,7 +47,14 @@ const Content = ({
             <>
               <div className="mb-6">
                 <div className="text-2xl font-bold text-white mb-4">
-                  Clone Generated Successfully!
+                  {loading ? (
+                    <span className="flex items-center gap-3">
+                      <Loader2 className="animate-spin text-cyan-500 w-6 h-6" />
+                      {stage || "Cloning the website, please wait..."}
+                    </span>
+                  ) : (
+                    "Clone Generated Successfully!"
+                  )}
                 </div>
                 {result.metadata && (
                   <div className="flex gap-6 text-sm text-gray-400">
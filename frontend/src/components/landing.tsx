@@ -3,11 +3,13 @@
 import { useState } from "react";
 import Form from "./form";
 import Content from "./content";
+import { readServerSentEvents } from "@/utils/stream";
 
 const Landing = () => {
   const [url, setUrl] = useState("");
   const [loading, setLoading] = useState(false);
   const [result, setResult] = useState<Clone | null>(null);
+  const [stage, setStage] = useState<string | null>(null);
   const [previewMode, setPreviewMode] = useState<"preview" | "code">("preview");
 
   const handleSubmit = async (e: React.FormEvent) => {
@@ -20,9 +22,10 @@ const Landing = () => {
 
     setLoading(true);
     setResult(null);
+    setStage("Analyzing the page...");
 
     try {
-      const response = await fetch("http://127.0.0.1:8000/clone", {
+      const response = await fetch("http://127.0.0.1:8000/clone/stream", {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -30,8 +33,33 @@ const Landing = () => {
         body: JSON.stringify({ url: url.trim() }),
       });
 
-      const data = await response.json();
-      setResult(data);
+      if (!response.body) throw new Error("Streaming is not supported");
+
+      // Each finished stage replaces the preview, so the skeleton shows early
+      await readServerSentEvents<Clone>(response.body, (event, data) => {
+        switch (event) {
+          case "dom_extracted":
+            setStage("Capturing screenshots...");
+            break;
+          case "screenshots_ready":
+            setStage("Generating layout structure...");
+            break;
+          case "structure_html":
+            setStage("Adding detailed styling...");
+            setResult({ success: true, html: data.html });
+            break;
+          case "styled_html":
+            setStage("Adding content and interactivity...");
+            setResult({ success: true, html: data.html });
+            break;
+          case "final_html":
+            setResult(data);
+            break;
+          case "error":
+            setResult({ success: false, error: data.error });
+            break;
+        }
+      });
     } catch (error) {
       console.error("Error cloning website:", error);
       setResult({
@@ -41,6 +69,7 @@ const Landing = () => {
       });
     } finally {
       setLoading(false);
+      setStage(null);
     }
   };
 
@@ -72,6 +101,7 @@ const Landing = () => {
         <Content
           result={result}
           loading={loading}
+          stage={stage}
           previewMode={previewMode}
           setPreviewMode={setPreviewMode}
           downloadHtml={downloadHtml}